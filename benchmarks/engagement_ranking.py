@@ -0,0 +1,76 @@
+"""
+Benchmark of the engagement ranking (GET /feed?rank=engagement) over 100k candidate posts.
+
+Run from the project root:
+    python -m benchmarks.engagement_ranking [candidates]
+"""
+import sys
+import time
+import random
+import numpy as np
+from types import SimpleNamespace
+from src.services.ranking_service import category_bits, engagement_scores, top_k
+from src.storage.indexes import ColumnIndex
+
+PAGE_SIZE = 20
+ROUNDS = 50
+
+
+def build_columns(count: int) -> ColumnIndex:
+    random.seed(0)
+    now = time.time()
+    index = ColumnIndex({
+        "user_id": (np.int64, lambda post: post.user_id),
+        "created_at": (np.float64, lambda post: post.created_at),
+        "likes_nbr": (np.int32, lambda post: post.likes_nbr),
+        "comments_nbr": (np.int32, lambda post: post.comments_nbr),
+        "categories": (np.int64, lambda post: category_bits(post.categories)),
+    })
+    index.build(
+        (post_id, SimpleNamespace(
+            user_id=random.randrange(10_000),
+            created_at=now - random.random() * 30 * 86400,
+            likes_nbr=int(random.paretovariate(1.2)) - 1,
+            comments_nbr=int(random.paretovariate(1.5)) - 1,
+            categories=random.sample(range(1, 21), 2),
+        ))
+        for post_id in range(count)
+    )
+    return index
+
+
+def rank(columns: dict, now: float, affinity_authors: np.ndarray) -> np.ndarray:
+    slots = np.flatnonzero(columns["live"])
+    scores = engagement_scores(
+        likes=columns["likes_nbr"][slots],
+        comments=columns["comments_nbr"][slots],
+        created_at=columns["created_at"][slots],
+        authors=columns["user_id"][slots],
+        categories=columns["categories"][slots],
+        now=now,
+        half_life_hours=24.0,
+        affinity_authors=affinity_authors,
+        category_mask=category_bits([1, 4, 16]),
+    )
+    return columns["key"][slots[top_k(scores, PAGE_SIZE)]]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    index = build_columns(count)
+    columns = index.view()
+    affinity_authors = np.array(sorted(random.sample(range(10_000), 300)), np.int64)
+    now = time.time()
+
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        rank(columns, now, affinity_authors)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{count} candidates, top {PAGE_SIZE}: "
+          f"p50 {timings[len(timings) // 2]:.2f} ms, p95 {timings[int(len(timings) * 0.95)]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
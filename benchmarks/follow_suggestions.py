@@ -0,0 +1,50 @@
+"""
+Benchmark of GET /users/suggestions on a synthetic follow graph.
+
+Run from the project root:
+    python -m benchmarks.follow_suggestions [users] [edges]
+"""
+import sys
+import time
+import numpy as np
+from src.services.suggestion_service import FollowSuggestions
+
+ROUNDS = 500
+LIMIT = 20
+
+
+def synthetic_edges(users: int, edges: int) -> bytes:
+    """Packed follow edges; who gets followed is skewed so some users are popular."""
+    rng = np.random.default_rng(0)
+    sources = rng.integers(0, users, edges, dtype=np.int64)
+    targets = (rng.pareto(1.1, edges) * users / 50).astype(np.int64) % users
+    values = np.unique((sources << 32) | targets)
+    values = values[(values >> 32) != (values & 0xFFFFFFFF)]
+    return values.tobytes()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    edges = int(sys.argv[2]) if len(sys.argv) > 2 else 1_200_000
+    packed = synthetic_edges(users, edges)
+    suggestions = FollowSuggestions(lambda: packed, refresh_interval=300)
+
+    start = time.perf_counter()
+    matrix = suggestions.matrix()
+    print(f"{users} users, {matrix.edges} edges: matrix built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = np.random.default_rng(1)
+    adjacency = matrix.adjacency
+    timings = []
+    for user_id in rng.integers(0, users, ROUNDS).tolist():
+        following = adjacency.indices[adjacency.indptr[user_id]:adjacency.indptr[user_id + 1]]
+        start = time.perf_counter()
+        suggestions.suggest(user_id, LIMIT, exclude=following.tolist())
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"suggest top {LIMIT}: p50 {timings[len(timings) // 2]:.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms, max {timings[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of GET /feed latency while a burst of logins hashes passwords.
+
+Compares the password hasher's process pool with hashing on the request threadpool
+(how login ran before). Runs the app in-process against a temporary database.
+
+Run from the project root:
+    python -m benchmarks.login_storm [logins] [feed readers]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from src.core.config import settings  # read .env before leaving the project root
+
+FEED_REQUESTS = 40  # per reader
+
+
+class ThreadpoolHasher:
+    """Hashing on the request threadpool, for comparison."""
+
+    async def hash(self, password: str) -> str:
+        from src.services.password_hashing import hash_password
+        return await run_in_threadpool(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        from src.services.password_hashing import check_password
+        return await run_in_threadpool(check_password, plain_password, hashed_password)
+
+
+def percentile(timings: list, fraction: float) -> float:
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))] if timings else 0.0
+
+
+async def read_feed(client: httpx.AsyncClient, headers: dict, timings: list):
+    for _ in range(FEED_REQUESTS):
+        start = time.perf_counter()
+        response = await client.get("/feed", headers=headers)
+        assert response.status_code == 200, response.text
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+async def log_in(client: httpx.AsyncClient, statuses: list):
+    response = await client.post("/auth/login", json={"email": "storm@example.com", "password": "password"})
+    statuses.append(response.status_code)
+
+
+async def run(client: httpx.AsyncClient, headers: dict, readers: int, logins: int, label: str):
+    timings, statuses = [], []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(read_feed(client, headers, timings) for _ in range(readers)),
+        *(log_in(client, statuses) for _ in range(logins)),
+    )
+    elapsed = time.perf_counter() - start
+    refused = sum(1 for code in statuses if code == 503)
+    print(f"{label}: feed p50 {percentile(timings, 0.5):.1f} ms, p95 {percentile(timings, 0.95):.1f} ms, "
+          f"max {max(timings):.1f} ms; {len(statuses) - refused} logins, {refused} refused, {elapsed:.1f} s")
+
+
+async def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("database")
+    os.makedirs("uploads")
+    os.environ.setdefault("UPLOAD_DIR", "uploads/")
+    os.environ.setdefault("UPLOAD_FILES_PREFIX", "/uploads/")
+    from src.main import app, rate_limiter
+    from src.routes import auth_route
+    from src.core.security import password_hasher
+    from src.storage.engines import storage
+
+    # All logins come from one client address; measure the hasher, not the rate limits
+    rate_limiter.routes.pop("POST /auth/login")
+    storage.build_indexes()
+    password_hasher.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        await client.post("/auth/register", json={"email": "storm@example.com", "username": "storm", "password": "password"})
+        response = await client.post("/auth/login", json={"email": "storm@example.com", "password": "password"})
+        headers = {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+        for i in range(20):
+            await client.post("/posts/create", data={"category_ids": "[1]", "content": f"post {i}"}, headers=headers)
+
+        print(f"{logins} concurrent logins, {readers} feed readers, {settings.PASSWORD_HASH_WORKERS} hashing processes")
+        await run(client, headers, readers, 0, "no logins")
+        await run(client, headers, readers, logins, "process pool")
+        print(f"  hasher: {password_hasher.stats()}")
+        auth_route.password_hasher = ThreadpoolHasher()
+        await run(client, headers, readers, logins, "threadpool  ")
+
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Benchmark of GET /posts/search on a synthetic corpus.
+
+Run from the project root:
+    python -m benchmarks.post_search [posts]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from src.storage.search_index import SearchIndex
+
+ROUNDS = 300
+LIMIT = 20
+VOCABULARY = 50_000
+WORDS_PER_POST = 25
+CATEGORIES = 20
+
+
+def synthetic_posts(posts: int) -> list:
+    """(post_id, content, categories) with word frequencies following Zipf's law, like real text."""
+    rng = np.random.default_rng(0)
+    words = np.array([f"word{i}" for i in range(VOCABULARY)])
+    ranks = (rng.zipf(1.2, posts * WORDS_PER_POST) - 1) % VOCABULARY
+    lengths = rng.integers(5, 2 * WORDS_PER_POST - 5, posts)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) % (len(ranks) - 2 * WORDS_PER_POST)
+    categories = rng.integers(1, CATEGORIES + 1, (posts, 2)).tolist()
+    return [
+        (post_id, " ".join(words[ranks[start:start + length]]), categories[post_id])
+        for post_id, (start, length) in enumerate(zip(starts.tolist(), lengths.tolist()))
+    ]
+
+
+def report(label: str, timings: list):
+    timings.sort()
+    print(f"{label}: p50 {timings[len(timings) // 2]:.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms, max {timings[-1]:.2f} ms")
+
+
+def main():
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    start = time.perf_counter()
+    corpus = synthetic_posts(posts)
+    print(f"{posts} posts generated in {time.perf_counter() - start:.1f} s")
+
+    path = os.path.join(tempfile.mkdtemp(), "post_search_segment.dat")
+    index = SearchIndex(path, documents=lambda: corpus)
+    start = time.perf_counter()
+    index.search("word1", LIMIT)
+    print(f"tokenized and indexed in {time.perf_counter() - start:.1f} s")
+    start = time.perf_counter()
+    index.save()
+    print(f"segment written in {time.perf_counter() - start:.1f} s ({os.path.getsize(path) / 2 ** 20:.0f} MiB)")
+
+    # A restart: the segment is loaded and checked against the posts instead of re-tokenizing them
+    index = SearchIndex(path, documents=lambda: corpus)
+    start = time.perf_counter()
+    index.search("word1", LIMIT)
+    print(f"segment loaded in {time.perf_counter() - start:.1f} s")
+
+    rng = np.random.default_rng(1)
+    queries = {
+        "1 common word": lambda: f"word{rng.integers(0, 10)}",
+        "1 rare word": lambda: f"word{rng.integers(1000, VOCABULARY)}",
+        "3 mixed words": lambda: " ".join(f"word{w}" for w in rng.zipf(1.2, 3) % VOCABULARY),
+    }
+    for label, query in queries.items():
+        for categories in (None, [int(rng.integers(1, CATEGORIES + 1))]):
+            timings = []
+            for _ in range(ROUNDS):
+                text = query()
+                start = time.perf_counter()
+                index.search(text, LIMIT, category_ids=categories)
+                timings.append((time.perf_counter() - start) * 1000)
+            report(f"{label}{', one category' if categories else ''}", timings)
+
+    # Writes land in the in-memory tail and are searchable at once
+    timings = []
+    for post_id in range(posts, posts + ROUNDS):
+        start = time.perf_counter()
+        index.add(post_id, f"fresh post word{post_id % 100}", [1])
+        timings.append((time.perf_counter() - start) * 1000)
+    report("index a new post", timings)
+
+
+if __name__ == "__main__":
+    main()
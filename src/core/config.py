@@ -1,10 +1,67 @@
 import os
+from typing import Dict
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
 
+    # Storage engine used by the crud modules: "pickle", "memory" or "sqlite"
+    STORAGE_ENGINE: str = "pickle"
+    SQLITE_DB_FILE: str = "database/social_media.sqlite3"
+    # Logged changes after which an append-only collection is compacted into its .dat snapshot
+    APPEND_LOG_COMPACT_EVERY: int = 1000
+    # "commit" (fsync before each write returns), "batch" (fsync each group commit) or "none"
+    DURABILITY: str = "batch"
+    # Writes arriving within this window are flushed together
+    GROUP_COMMIT_WINDOW_MS: int = 10
+    # Log the loads and saves of every request's storage session
+    LOG_STORAGE_SESSIONS: bool = False
+    # Posts kept in each precomputed home timeline
+    FEED_TIMELINE_LENGTH: int = 800
+    # Authors with more followers than this are merged into feeds on read instead of fanned out
+    FEED_FANOUT_MAX_FOLLOWERS: int = 10000
+    # Home timelines kept in memory, least recently read dropped first
+    FEED_CACHED_TIMELINES: int = 10000
+    # Entries kept across those timelines (about 200 bytes each), least recently read dropped first
+    FEED_CACHED_TIMELINE_ENTRIES: int = 400000
+    # Page size of paginated listings when the client gives no limit, and the largest it may ask for
+    PAGE_SIZE_DEFAULT: int = 20
+    PAGE_SIZE_MAX: int = 100
+    # Engagement ranking: hours after which a post's score has halved
+    RANK_HALF_LIFE_HOURS: float = 24.0
+    # Liked posts of the viewer (newest posts first) used to infer the authors and categories they engage with
+    RANK_RECENT_LIKES: int = 500
+    # Seconds between snapshots of the trending activity counters
+    TRENDING_SAVE_INTERVAL_SECONDS: float = 30.0
+    # Least seconds between rebuilds of the follow suggestions matrix after the follow graph changes
+    SUGGESTIONS_REFRESH_SECONDS: float = 300.0
+    # Fuzzy user search: records scored per query at most, and the least trigram similarity of a match
+    USER_SEARCH_MAX_CANDIDATES: int = 5000
+    USER_SEARCH_MIN_SIMILARITY: float = 0.3
+    # Least seconds between writes of the post search segment file after posts change
+    SEARCH_SAVE_INTERVAL_SECONDS: float = 60.0
+    # Verified access tokens cached in memory, and the longest an entry lives (it also ends when the token expires)
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: float = 300.0
+    # Processes hashing passwords for register and login, and the most hashes queued or running before refusing more
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # Revoked tokens the revocation Bloom filter is sized for (it grows past this if needed)
+    REVOKED_TOKENS_CAPACITY: int = 100000
+    # Limits of the expensive routes, keyed by "METHOD /path": requests per second and burst allowed to each user
+    # (each client address when signed out) and to the route as a whole, and the most requests running at once
+    RATE_LIMITS: Dict[str, Dict[str, float]] = {
+        "POST /auth/login": {"user_rate": 0.5, "user_burst": 5, "route_rate": 50, "route_burst": 100, "concurrency": 32},
+        "POST /posts/create": {"user_rate": 1, "user_burst": 10, "route_rate": 200, "route_burst": 400, "concurrency": 32},
+        "GET /feed/explore": {"user_rate": 5, "user_burst": 20, "route_rate": 500, "route_burst": 1000, "concurrency": 32},
+        "GET /users/search": {"user_rate": 5, "user_burst": 20, "route_rate": 500, "route_burst": 1000, "concurrency": 32},
+    }
+    # Longest a request waits for a slot under its route's concurrency limit before it is refused with a 503
+    RATE_LIMIT_QUEUE_TIMEOUT_MS: float = 100.0
+    # Per user buckets kept for each route before the idle ones are dropped
+    RATE_LIMIT_MAX_KEYS: int = 100000
+
     class Config:
         env_file = ".env"
 
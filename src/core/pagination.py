@@ -0,0 +1,94 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from src.core.config import settings
+from src.schemas.generic_response import GenericResponse
+from src.schemas.pagination import CursorPage
+
+# Position of an item in a newest-first listing: its (created_at, id).
+# Pages are keyed on it rather than on offsets, so items posted while a client
+# scrolls neither repeat nor go missing.
+Cursor = Tuple[datetime, int]
+
+# Kinds of cursor. Ranked listings carry (time of the first page, offset of the next)
+# instead of a position; a cursor is only accepted by the kind of listing that issued it.
+CURSOR_POSITION = "position"
+CURSOR_ENGAGEMENT = "engagement"
+CURSOR_SEARCH = "search"
+
+
+def encode_cursor(created_at: datetime, item_id: int, kind: str = CURSOR_POSITION) -> str:
+    raw = json.dumps([kind, created_at.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str = CURSOR_POSITION) -> Cursor:
+    """Inverse of `encode_cursor`; raises ValueError on anything it did not produce for `kind`."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_kind, created_at, item_id = json.loads(raw)
+        if cursor_kind != kind:
+            raise ValueError(f"Not a {kind} cursor")
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class PageParams:
+    """`limit` and decoded `cursor` query parameters of a paginated route."""
+
+    def __init__(self, limit: int, before: Optional[Cursor]):
+        self.limit = limit
+        self.before = before
+
+
+def page_query(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+) -> Tuple[int, Optional[str]]:
+    """FastAPI dependency reading the pagination query parameters, as given."""
+    return limit, cursor
+
+
+def parse_page(query: Tuple[int, Optional[str]], kind: str) -> PageParams:
+    """Decode the pagination query parameters of a listing whose cursors are of `kind` (400 if invalid)."""
+    limit, cursor = query
+    if not cursor:
+        return PageParams(limit, None)
+    try:
+        return PageParams(limit, decode_cursor(cursor, kind))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=jsonable_encoder(GenericResponse(
+                success=False,
+                message="Invalid pagination cursor",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+
+def page_params(query: Tuple[int, Optional[str]] = Depends(page_query)) -> PageParams:
+    """FastAPI dependency parsing the pagination query parameters of a newest-first listing."""
+    return parse_page(query, CURSOR_POSITION)
+
+
+def search_page_params(query: Tuple[int, Optional[str]] = Depends(page_query)) -> PageParams:
+    """FastAPI dependency parsing the pagination query parameters of search results."""
+    return parse_page(query, CURSOR_SEARCH)
+
+
+def make_page(items: List[Any], limit: int, position: Callable[[Any], Cursor],
+              kind: str = CURSOR_POSITION) -> CursorPage:
+    """
+    Build a page from up to `limit + 1` items fetched in order.
+    The extra item only tells whether there is a next page; it is not returned.
+    """
+    if len(items) <= limit:
+        return CursorPage(items=items, next_cursor=None)
+    items = items[:limit]
+    return CursorPage(items=items, next_cursor=encode_cursor(*position(items[-1]), kind))
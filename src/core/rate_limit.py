@@ -0,0 +1,297 @@
+import math
+import time
+import asyncio
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from jose import jwt, JWTError
+from src.core.config import settings
+from src.core.security import token_cache
+from src.schemas.generic_response import GenericResponse
+
+# Latency above this multiple of the route's baseline latency shrinks its concurrency limit
+LATENCY_TOLERANCE = 2.0
+# Rounds after which the baseline latency is re-measured, so it follows slow drifts
+BASELINE_ROUNDS = 100
+
+
+class RouteLimit:
+    """Limits of one route; per user and route-wide rates are in requests per second."""
+
+    def __init__(self, user_rate: float, user_burst: float, route_rate: float, route_burst: float, concurrency: int):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self.concurrency = int(concurrency)
+
+
+class TokenBuckets:
+    """
+    Token buckets sharing a rate and burst, one per key, stored as two float arrays
+    indexed through a key -> slot dict.
+
+    Once `max_keys` buckets exist, buckets that have refilled (they behave exactly like
+    new ones) are dropped; if none has, the least recently used half is.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._slots: Dict[Hashable, int] = {}
+        self._tokens = array("d")
+        self._stamps = array("d")
+        self._free: List[int] = []
+
+    def take(self, key: Hashable, now: float) -> float:
+        """Take a token from the key's bucket: 0 if there was one, otherwise seconds until there is."""
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._allocate(key, now)
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, self._tokens[slot] + (now - self._stamps[slot]) * self.rate)
+        self._stamps[slot] = now
+        if tokens >= 1:
+            self._tokens[slot] = tokens - 1
+            return 0.0
+        self._tokens[slot] = tokens
+        return (1 - tokens) / self.rate
+
+    def _allocate(self, key: Hashable, now: float) -> int:
+        if len(self._slots) >= self.max_keys:
+            self._sweep(now)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._tokens)
+            self._tokens.append(0.0)
+            self._stamps.append(0.0)
+        self._slots[key] = slot
+        return slot
+
+    def _sweep(self, now: float):
+        refill_seconds = self.burst / self.rate
+        dropped = [key for key, slot in self._slots.items() if now - self._stamps[slot] >= refill_seconds]
+        if not dropped:
+            by_use = sorted(self._slots, key=lambda key: self._stamps[self._slots[key]])
+            dropped = by_use[:len(by_use) // 2]
+        for key in dropped:
+            self._free.append(self._slots.pop(key))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+class ConcurrencyLimiter:
+    """
+    Adaptive cap on the requests of a route running at once.
+
+    After each round of as many requests as the cap, the cap grows by one if the
+    fastest of them ran near the baseline (lowest recent) latency. If even the fastest
+    took over LATENCY_TOLERANCE times that, requests are queueing inside the app rather
+    than just varying in cost, and the cap shrinks in proportion (at most by half).
+    Requests over the cap wait for a slot, but at most `queue_timeout` seconds; once one
+    times out, new requests are refused at once for the next `queue_timeout` instead
+    of joining the queue. Runs on the event loop only, so it needs no lock.
+    """
+
+    def __init__(self, max_limit: int, queue_timeout: float):
+        self.max_limit = max_limit
+        self.queue_timeout = queue_timeout
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._shed_until = 0.0
+        self._baseline: Optional[float] = None
+        self._round_min = math.inf
+        self._round_count = 0
+        self._rounds = 0
+        self._rounds_min = math.inf
+        self.shed = 0
+        self.queued = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting for one if needed; False if the request should be refused."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        if time.monotonic() < self._shed_until or len(self._waiters) >= self.max_limit:
+            self.shed += 1
+            return False
+
+        self.queued += 1
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        timer = loop.call_later(self.queue_timeout, self._time_out, waiter)
+        try:
+            granted = await waiter
+        except asyncio.CancelledError:
+            # The client went away; leave the queue, or pass on a slot handed over meanwhile
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled() and waiter.result():
+                self._release_slot()
+            raise
+        finally:
+            timer.cancel()
+        if not granted:
+            self.shed += 1
+        return granted
+
+    def _time_out(self, waiter: asyncio.Future):
+        if waiter.done():
+            return
+        waiter.set_result(False)
+        self._waiters.remove(waiter)
+        self._shed_until = time.monotonic() + self.queue_timeout
+
+    def release(self, latency: float):
+        self._adapt(latency)
+        self._release_slot()
+
+    def _release_slot(self):
+        # Hand the slot straight to the next waiter while under the cap
+        while self._waiters and self.in_flight <= int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def _adapt(self, latency: float):
+        self._round_min = min(self._round_min, latency)
+        self._round_count += 1
+        if self._round_count < int(self.limit):
+            return
+        round_min, self._round_min, self._round_count = self._round_min, math.inf, 0
+
+        self._rounds_min = min(self._rounds_min, round_min)
+        self._rounds += 1
+        if self._baseline is None or self._rounds >= BASELINE_ROUNDS:
+            self._baseline = self._rounds_min
+            self._rounds_min = math.inf
+            self._rounds = 0
+        else:
+            self._baseline = min(self._baseline, round_min)
+
+        tolerated = self._baseline * LATENCY_TOLERANCE
+        if round_min > tolerated:
+            self.limit = max(1.0, self.limit * max(0.5, tolerated / round_min))
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+
+
+class RouteLimiter:
+    """Per user buckets, a route-wide bucket and a concurrency limiter for one route."""
+
+    def __init__(self, limit: RouteLimit, queue_timeout: float, max_keys: int):
+        self.user_buckets = TokenBuckets(limit.user_rate, limit.user_burst, max_keys)
+        self.route_bucket = TokenBuckets(limit.route_rate, limit.route_burst, 1)
+        self.concurrency = ConcurrencyLimiter(limit.concurrency, queue_timeout)
+        self.allowed = 0
+        self.user_limited = 0
+        self.route_limited = 0
+
+    def stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "user_limited": self.user_limited,
+            "route_limited": self.route_limited,
+            "shed": self.concurrency.shed,
+            "queued": self.concurrency.queued,
+            "in_flight": self.concurrency.in_flight,
+            "concurrency_limit": self.concurrency.limit,
+            "users": len(self.user_buckets),
+        }
+
+
+def client_key(scope) -> Tuple[str, str]:
+    """The user a request is limited as: its token's user, or its client address when signed out."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                break
+            cached = token_cache.get(token)
+            if cached is not None:
+                return "user", str(cached[0].get("sub"))
+            try:
+                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            except JWTError:
+                break
+            if payload.get("sub") is not None:
+                return "user", str(payload["sub"])
+            break
+    client = scope.get("client")
+    return "address", client[0] if client else ""
+
+
+def limited_response(status_code: int, message: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        content=jsonable_encoder(GenericResponse(
+            success=False,
+            message=message,
+            timestamp=datetime.utcnow()
+        ))
+    )
+
+
+class RateLimiter:
+    """
+    Limits of the routes listed in `limits` ("METHOD /path" -> RouteLimit arguments).
+
+    A request over its user's rate gets a 429; one over the route-wide rate, or refused
+    by the route's concurrency limiter, gets a 503. Both come with a Retry-After header.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], queue_timeout: float, max_keys: int):
+        self.routes = {
+            route: RouteLimiter(RouteLimit(**limit), queue_timeout, max_keys)
+            for route, limit in limits.items()
+        }
+
+    def stats(self) -> dict:
+        return {route: limiter.stats() for route, limiter in self.routes.items()}
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying a RateLimiter; other routes and websockets pass straight through."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = self.limiter.routes.get(f"{scope['method']} {scope['path']}")
+        if route is None:
+            return await self.app(scope, receive, send)
+
+        now = time.monotonic()
+        wait = route.user_buckets.take(client_key(scope), now)
+        if wait:
+            route.user_limited += 1
+            return await limited_response(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", wait)(scope, receive, send)
+        wait = route.route_bucket.take(None, now)
+        if wait:
+            route.route_limited += 1
+            return await limited_response(status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, try again later", wait)(scope, receive, send)
+        if not await route.concurrency.acquire():
+            return await limited_response(status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, try again later", 1)(scope, receive, send)
+
+        route.allowed += 1
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route.concurrency.release(time.monotonic() - start)
@@ -1,15 +1,20 @@
+from uuid import uuid4
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from src.core.config import settings
 from fastapi import Depends, HTTPException, status
 from datetime import datetime
 from jose import jwt, JWTError
-from src.crud.users_crud import get_user_by_id
+from src.crud.users_crud import get_user_by_id, user_change_listeners
+from src.core.token_cache import TokenCache
+from src.storage.revoked_tokens import RevokedTokens
+from src.services.password_hashing import PasswordHasher, pwd_context
 from src.schemas.users import UserSchema
+from src.storage.session import StorageSession, get_storage_session
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Used by register and login, so hashing never runs on the request threads
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
 
 
 def get_password_hash(password: str) -> str:
@@ -23,16 +28,48 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def create_access_token(data: dict, expires_delta: int = 36000):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(seconds=expires_delta)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")  # URL of your login endpoint
 
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+user_change_listeners.append(token_cache.invalidate_user)
 
-def get_current_user_from_token(token: str = Depends(oauth2_scheme)) -> UserSchema:
+REVOKED_TOKENS_FILE = "database/revoked_tokens.bin"
+revoked_tokens = RevokedTokens(REVOKED_TOKENS_FILE, settings.REVOKED_TOKENS_CAPACITY)
+
+
+def is_token_revoked(payload: dict) -> bool:
+    """Whether the token was logged out (tokens issued without a jti cannot be revoked)."""
+    jti = payload.get("jti")
+    return jti is not None and revoked_tokens.is_revoked(jti)
+
+
+def revoke_token(payload: dict):
+    """Revoke a decoded token until it expires."""
+    jti = payload.get("jti")
+    if jti is not None:
+        revoked_tokens.revoke(jti, int(payload["exp"]))
+
+
+def get_current_user_from_token(
+    token: str = Depends(oauth2_scheme),
+    session: StorageSession = Depends(get_storage_session)
+) -> UserSchema:
     """Decode JWT token and return the current user object."""
+    cached = token_cache.get(token)
+    if cached is not None:
+        if is_token_revoked(cached[0]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+            )
+        return cached[1]
+
+    version = token_cache.version()
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: str = payload.get("sub")
@@ -41,13 +78,19 @@ def get_current_user_from_token(token: str = Depends(oauth2_scheme)) -> UserSche
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
             )
-        
-        user = get_user_by_id(int(user_id))
+        if is_token_revoked(payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+            )
+
+        user = get_user_by_id(int(user_id), session=session)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found",
             )
+        token_cache.put(token, payload, user, version)
         return user
     except JWTError:
         raise HTTPException(
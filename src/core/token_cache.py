@@ -0,0 +1,96 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class TokenCache:
+    """
+    Decoded access tokens and the users they resolve to, keyed by the raw token, so
+    repeated requests with the same token skip signature checking and the user lookup.
+
+    An entry lasts until the token expires, but no longer than `ttl` seconds; only the
+    `max_entries` most recently used tokens are kept. `invalidate_user` drops a user's
+    entries when their profile changes.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # token -> (expires at, claims, user)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any], Any]]" = OrderedDict()
+        self._tokens_of_user: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a user read before one is not cached after it
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def version(self) -> int:
+        """Pass to `put` for a user looked up after this call."""
+        return self._version
+
+    def get(self, token: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """(claims, user) cached for the token, or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.time():
+                self._drop(token)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, token: str, claims: Dict[str, Any], user: Any, version: int):
+        expires_at = min(float(claims.get("exp", 0)), time.time() + self.ttl)
+        with self._lock:
+            if version != self._version or expires_at <= time.time():
+                return
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (expires_at, claims, user)
+            self._tokens_of_user.setdefault(user.user_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, token: str):
+        _, _, user = self._entries.pop(token)
+        tokens = self._tokens_of_user.get(user.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_of_user[user.user_id]
+
+    def invalidate_user(self, user_id: Optional[int]):
+        """Forget the cached tokens of a user whose profile changed (of every user if None)."""
+        with self._lock:
+            self._version += 1
+            if user_id is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._tokens_of_user.clear()
+                return
+            for token in list(self._tokens_of_user.get(user_id, ())):
+                self._drop(token)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,36 +1,39 @@
-import pickle
 from datetime import datetime
 from typing import Dict, List
 from collections import defaultdict
 from src.schemas.chats import PrivateMessage, Conversation
+from src.storage.engines import storage
+from src.storage.collections import register_collection
 
 MESSAGES_DB_FILE = "database/messages_database.dat"
+MESSAGES_LOG_FILE = "database/messages_database.log"
+
+# Messages are append-heavy: each insert is one record appended to the log
+MESSAGES = register_collection(
+    "messages",
+    MESSAGES_DB_FILE,
+    key=lambda msg: (msg.sender_id, msg.recipient_id, msg.timestamp),
+    log_path=MESSAGES_LOG_FILE
+)
 
 
 def load_messages() -> List[PrivateMessage]:
-    """Load all messages from the file."""
-    try:
-        with open(MESSAGES_DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    """Load all messages from the storage engine."""
+    return storage.load(MESSAGES)
 
 def save_messages(messages: List[PrivateMessage]):
-    """Save all messages to the file."""
-    with open(MESSAGES_DB_FILE, "wb") as f:
-        pickle.dump(messages, f)
+    """Replace all messages in the storage engine."""
+    storage.save(MESSAGES, messages)
 
 def insert_message(sender_id: int, recipient_id: int, content: str) -> PrivateMessage:
     """Insert a new message between users."""
-    messages = load_messages()
     message = PrivateMessage(
         sender_id=sender_id,
         recipient_id=recipient_id,
         content=content,
         timestamp=datetime.utcnow()
     )
-    messages.append(message)
-    save_messages(messages)
+    storage.insert(MESSAGES, message)
     return message
 
 def get_conversation(user_1: int, user_2: int) -> List[PrivateMessage]:
@@ -89,13 +92,12 @@ def set_message_is_read(sender_id: int, recipient_id: int):
         recipient_id (int): The ID of the recipient whose messages should be marked as read.
     """
     messages = load_messages()
-    updated = False
 
-    for msg in messages:
-        # Only mark messages received by recipient_id from sender_id
-        if msg.sender_id == sender_id and msg.recipient_id == recipient_id and not msg.is_read:
-            msg.is_read = True
-            updated = True
+    # Only mark messages received by recipient_id from sender_id
+    updated = [
+        msg.model_copy(update={"is_read": True}) for msg in messages
+        if msg.sender_id == sender_id and msg.recipient_id == recipient_id and not msg.is_read
+    ]
 
     if updated:
-        save_messages(messages)
+        storage.update_many(MESSAGES, updated)
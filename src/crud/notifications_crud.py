@@ -1,39 +1,38 @@
-import pickle
 from typing import List, Optional
 from datetime import datetime
 from src.schemas.notification import NotificationSchema
+from src.storage.engines import storage
+from src.storage.collections import register_collection
+from src.storage.session import StorageSession
 
 NOTIFICATIONS_DB_FILE = "database/notifications_database.dat"
 
+NOTIFICATIONS = register_collection("notifications", NOTIFICATIONS_DB_FILE, key=lambda notif: notif.id)
+
 # ======================
 # Notifications CRUD
 # ======================
 
 def load_notifications() -> List[NotificationSchema]:
-    """Load notifications from the file."""
-    try:
-        with open(NOTIFICATIONS_DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    """Load notifications from the storage engine."""
+    return storage.load(NOTIFICATIONS)
 
 def save_notifications(notifications: List[NotificationSchema]):
-    """Save notifications to the file."""
-    with open(NOTIFICATIONS_DB_FILE, "wb") as f:
-        pickle.dump(notifications, f)
-
-def generate_new_notification_id() -> int:
-    """Generate a new notification ID."""
-    notifications = load_notifications()
-    return len(notifications) + 1
+    """Replace all notifications in the storage engine."""
+    storage.save(NOTIFICATIONS, notifications)
 
 def create_new_notification(user_id: int, actor_id: int, type: str, post_id: Optional[int] = None,
-                            comment_id: Optional[int] = None, message: Optional[str] = None) -> NotificationSchema:
+                            comment_id: Optional[int] = None, message: Optional[str] = None,
+                            session: Optional[StorageSession] = None) -> NotificationSchema:
     """Create and save a new notification."""
-    notifications = load_notifications()
+    def apply(mutation) -> NotificationSchema:
+        # The id is allocated on the writer, so concurrent notifications get distinct ids
+        notif = new_notif.model_copy(update={"id": mutation.new_id()})
+        mutation.insert(notif)
+        return notif
 
     new_notif = NotificationSchema(
-        id=generate_new_notification_id(),
+        id=0,
         user_id=user_id,
         actor_id=actor_id,
         type=type,
@@ -44,9 +43,36 @@ def create_new_notification(user_id: int, actor_id: int, type: str, post_id: Opt
         created_at=datetime.now()
     )
 
-    notifications.append(new_notif)
-    save_notifications(notifications)
-    return new_notif
+    return (session or storage).mutate(NOTIFICATIONS, apply)
+
+def create_notifications(user_ids: List[int], actor_id: int, type: str, post_id: Optional[int] = None,
+                         comment_id: Optional[int] = None, message: Optional[str] = None) -> List[NotificationSchema]:
+    """Create and save the same notification for several users in one write."""
+    def apply(mutation) -> List[NotificationSchema]:
+        notifs = [
+            template.model_copy(update={"id": mutation.new_id(), "user_id": user_id})
+            for user_id in user_ids
+        ]
+        for notif in notifs:
+            mutation.insert(notif)
+        return notifs
+
+    if not user_ids:
+        return []
+
+    template = NotificationSchema(
+        id=0,
+        user_id=0,
+        actor_id=actor_id,
+        type=type,
+        post_id=post_id,
+        comment_id=comment_id,
+        message=message or "",
+        is_read=False,
+        created_at=datetime.now()
+    )
+
+    return storage.mutate(NOTIFICATIONS, apply)
 
 def get_notifs_of_user(user_id: int) -> List[NotificationSchema]:
     """Retrieve all notifications for a given user, sorted by newest first."""
@@ -56,10 +82,13 @@ def get_notifs_of_user(user_id: int) -> List[NotificationSchema]:
 
 def mark_notification_as_read(notification_id: int) -> Optional[NotificationSchema]:
     """Mark a specific notification as read."""
-    notifications = load_notifications()
-    for notif in notifications:
-        if notif.id == notification_id:
-            notif.is_read = True
-            save_notifications(notifications)
-            return notif
-    return None
+    def apply(mutation) -> Optional[NotificationSchema]:
+        notif = mutation.get(notification_id)
+        if notif is None:
+            return None
+
+        notif = notif.model_copy(update={"is_read": True})
+        mutation.update(notif)
+        return notif
+
+    return storage.mutate(NOTIFICATIONS, apply)
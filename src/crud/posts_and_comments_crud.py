@@ -1,9 +1,22 @@
-import pickle
+import time
+import atexit
+import numpy as np
 from datetime import datetime
 from typing import List, Optional, Tuple
 from src.schemas.posts import PostSchema, CommentProfile
-from src.crud.users_crud import get_user_by_id, USERS_DB_FILE
+from src.core.config import settings
+from src.crud.users_crud import get_user_by_id, adjust_user_counter, follow_graph, follow_listeners
 from src.crud.users_crud import check_following_status
+from src.storage.engines import storage
+from src.storage.collections import register_collection, get_collection_name_by_path, read_pickle_file, write_pickle_file
+from src.storage.indexes import ColumnIndex, SortedGroupIndex, SortedMultiGroupIndex
+from src.storage.like_store import LikeStore
+from src.storage.session import StorageSession
+from src.storage.timelines import TimelineStore, TimelineEntry
+from src.storage.activity_counters import ActivityCounters
+from src.storage.search_index import SearchIndex
+from src.core.pagination import Cursor
+from src.services.ranking_service import category_bits, engagement_scores, epoch_seconds, top_k
 
 
 # ====================================================
@@ -16,6 +29,111 @@ COMMENTS_DB = "database/comments_database.dat"
 FOLLOWERS_DB = "database/followers_database.dat"
 COMMENTS_DB_FILE = "database/comments_database.dat"
 LIKES_DB_FILE = "database/comments_likes_database.dat"
+POST_LIKES_STORE_FILE = "database/likes_store.bin"
+COMMENT_LIKES_STORE_FILE = "database/comments_likes_store.bin"
+TRENDING_COUNTERS_FILE = "database/trending_counters.dat"
+POST_SEARCH_SEGMENT_FILE = "database/post_search_segment.dat"
+
+POSTS = register_collection(
+    "posts", POSTS_DB, key=lambda post: post.post_id,
+    indexes={
+        "author": lambda: SortedGroupIndex(lambda post: post.user_id, order=lambda post: post.created_at),
+        # Every post in a single group, for listings across all authors
+        "recent": lambda: SortedGroupIndex(lambda post: None, order=lambda post: post.created_at),
+        "category": lambda: SortedMultiGroupIndex(lambda post: post.categories or (), order=lambda post: post.created_at),
+        # Features the engagement ranking scores posts on
+        "columns": lambda: ColumnIndex({
+            "user_id": (np.int64, lambda post: post.user_id),
+            "created_at": (np.float64, lambda post: epoch_seconds(post.created_at)),
+            "likes_nbr": (np.int32, lambda post: post.likes_nbr),
+            "comments_nbr": (np.int32, lambda post: post.comments_nbr),
+            "categories": (np.int64, lambda post: category_bits(post.categories)),
+        }),
+    }
+)
+LIKES = register_collection("likes", LIKES_DB, key=lambda like: like)
+COMMENTS = register_collection(
+    "comments", COMMENTS_DB, key=lambda comment: comment.comment_id,
+    indexes={"post": lambda: SortedGroupIndex(lambda comment: comment.post_id, order=lambda comment: comment.created_at)}
+)
+COMMENT_LIKES = register_collection("comment_likes", LIKES_DB_FILE, key=lambda like: like)
+
+# Likes live in packed like stores; the .dat collections above are only read to migrate them
+post_likes = LikeStore(POST_LIKES_STORE_FILE, legacy=lambda: storage.load(LIKES))
+comment_likes = LikeStore(
+    COMMENT_LIKES_STORE_FILE,
+    legacy=lambda: [(user_id, comment_id) for comment_id, user_id in storage.load(COMMENT_LIKES)]
+)
+
+
+def recent_timeline_entries(author_id: int, limit: int, before: Optional[Cursor] = None) -> List[TimelineEntry]:
+    """The author's newest posts below `before` as timeline entries, newest first."""
+    posts = storage.page(POSTS, "author", author_id, before, limit)
+    return [(post.created_at, post.post_id, post.user_id) for post in posts]
+
+
+timelines = TimelineStore(
+    size=settings.FEED_TIMELINE_LENGTH,
+    fanout_limit=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    max_users=settings.FEED_CACHED_TIMELINES,
+    max_entries=settings.FEED_CACHED_TIMELINE_ENTRIES,
+    following=follow_graph.following,
+    followers=follow_graph.followers,
+    followers_count=follow_graph.followers_count,
+    recent_posts=recent_timeline_entries,
+)
+
+
+def update_timelines_on_follow(follower_id: int, following_id: int, followed: bool):
+    if followed:
+        timelines.follow(follower_id, following_id)
+    else:
+        timelines.unfollow(follower_id, following_id)
+
+
+follow_listeners.append(update_timelines_on_follow)
+
+
+# Trending windows: name -> (length in seconds, number of buckets)
+TRENDING_WINDOWS = {"1h": (3600, 60), "24h": (86400, 96)}
+# How much each kind of activity counts towards trending
+LIKE_ACTIVITY = 1
+COMMENT_ACTIVITY = 2
+COMMENT_LIKE_ACTIVITY = 1
+
+
+def replay_recent_comments():
+    """Activity events of the comments written within the longest trending window."""
+    since = time.time() - max(window for window, _ in TRENDING_WINDOWS.values())
+    for comment in storage.load(COMMENTS):
+        at = epoch_seconds(comment.created_at)
+        post = storage.get(POSTS, comment.post_id) if at >= since else None
+        if post is not None:
+            yield (at, post.post_id, post.categories or (), COMMENT_ACTIVITY)
+
+
+# Likes carry no timestamp, so after losing the snapshot only comments can be replayed
+activity = ActivityCounters(
+    TRENDING_COUNTERS_FILE, TRENDING_WINDOWS,
+    save_interval=settings.TRENDING_SAVE_INTERVAL_SECONDS,
+    rebuild=replay_recent_comments,
+)
+atexit.register(activity.save)
+
+
+def record_activity(post_id: int, weight: int):
+    post = storage.get(POSTS, post_id)
+    if post is not None:
+        activity.record(post_id, post.categories or (), weight)
+
+
+# Full-text search over post contents
+post_search = SearchIndex(
+    POST_SEARCH_SEGMENT_FILE,
+    documents=lambda: ((post.post_id, post.content, post.categories) for post in storage.load(POSTS)),
+    save_interval=settings.SEARCH_SAVE_INTERVAL_SECONDS,
+)
+atexit.register(post_search.save)
 
 
 # ====================================================
@@ -23,78 +141,111 @@ LIKES_DB_FILE = "database/comments_likes_database.dat"
 # ====================================================
 
 def load_data_from_dat_file(file_path: str):
-    try:
-        with open(file_path, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    collection = get_collection_name_by_path(file_path)
+    if collection is None:
+        return read_pickle_file(file_path)
+    return storage.load(collection)
 
 
 def save_data_to_dat_file(file_path: str, data):
-    with open(file_path, "wb") as f:
-        pickle.dump(data, f)
+    collection = get_collection_name_by_path(file_path)
+    if collection is None:
+        write_pickle_file(file_path, data)
+    else:
+        storage.save(collection, data)
 
 
 # ====================================================
 # 🔹 Post CRUD
 # ====================================================
 
-def get_post_by_id(post_id: int) -> Optional[PostSchema]:
-    posts = load_data_from_dat_file(POSTS_DB)
-    return next((p for p in posts if p.post_id == post_id), None)
+def get_post_by_id(post_id: int, session: Optional[StorageSession] = None) -> Optional[PostSchema]:
+    post = (session or storage).get(POSTS, post_id)
+    return post.model_copy() if post else None
 
 
 
 def create_new_post(post: PostSchema) -> Optional[PostSchema]:
 
-    posts = load_data_from_dat_file(POSTS_DB)
-    post.post_id = len(posts) + 1
-    posts.append(post)
+    def insert(mutation) -> PostSchema:
+        # The id is allocated on the writer, so concurrent posts get distinct ids
+        post.post_id = mutation.new_id()
+        mutation.insert(post)
+        return post
+
+    storage.mutate(POSTS, insert)
 
     increment_posts_count_of_user(user_id=post.user_id)
+    timelines.add_post(post.user_id, post.post_id, post.created_at)
+    post_search.add(post.post_id, post.content, post.categories)
 
-    save_data_to_dat_file(POSTS_DB, posts)
-    return post
+    return post.model_copy()
 
 
 
-def get_posts_of_user(current_user_id: int, target_user_id: int) -> List[PostSchema]:
+def get_posts_of_user(current_user_id: int, target_user_id: int, session: Optional[StorageSession] = None,
+                      limit: int = 20, before: Optional[Cursor] = None) -> List[PostSchema]:
+    """Up to `limit` posts of the target user, newest first, below the cursor position `before`."""
 
-    posts = load_data_from_dat_file(POSTS_DB)
-    user_posts = [p for p in posts if p.user_id == target_user_id]
+    user_posts = [p.model_copy() for p in (session or storage).page(POSTS, "author", target_user_id, before, limit)]
     
-    for post in user_posts:
-        post.is_liked_by_me = is_post_liked_by_me(current_user_id, post.post_id)
+    liked = post_likes.has_liked_many(current_user_id, [post.post_id for post in user_posts])
+    for post, is_liked in zip(user_posts, liked):
+        post.is_liked_by_me = is_liked
     
     return user_posts
 
 
 def delete_a_post(post_id: int) -> bool:
 
-    posts = load_data_from_dat_file(POSTS_DB)
-    new_posts = [p for p in posts if p.post_id != post_id]
+    def delete(mutation) -> Optional[PostSchema]:
+        post = mutation.get(post_id)
+        if post is not None:
+            mutation.delete(post_id)
+        return post
 
-    if len(new_posts) == len(posts):
+    post = storage.mutate(POSTS, delete)
+    if post is None:
         return False
     
-    decrement_posts_count_of_user(user_id=get_post_by_id(post_id).user_id)
-    
-    save_data_to_dat_file(POSTS_DB, new_posts)
+    decrement_posts_count_of_user(user_id=post.user_id)
+    timelines.remove_post(post.user_id, post.post_id)
+    post_search.remove(post.post_id)
+    # Drop what hangs off the post, so nothing outlives it (or lands on a later post with its id)
+    post_likes.remove_item(post.post_id)
+    activity.forget_post(post.post_id)
+    for comment_id in delete_comments_of_post(post.post_id):
+        comment_likes.remove_item(comment_id)
     return True
 
 
+def delete_comments_of_post(post_id: int) -> List[int]:
+    """Delete every comment of a post. Returns their ids."""
+    def delete(mutation) -> List[int]:
+        comment_ids = list(mutation.collection.index("post").get(post_id))
+        for comment_id in comment_ids:
+            mutation.delete(comment_id)
+        return comment_ids
+
+    return storage.mutate(COMMENTS, delete)
+
+
 
 def update_a_post(post_id: int, payload: str) -> Optional[PostSchema]:
 
-    posts = load_data_from_dat_file(POSTS_DB)
+    def update(mutation) -> Optional[PostSchema]:
+        post = mutation.get(post_id)
+        if post is None:
+            return None
 
-    for p in posts:
-        if p.post_id == post_id:
-            p.content = payload
-            save_data_to_dat_file(POSTS_DB, posts)
-            return p
+        post = post.model_copy(update={"content": payload})
+        mutation.update(post)
+        return post
 
-    return None
+    post = storage.mutate(POSTS, update)
+    if post is not None:
+        post_search.add(post.post_id, post.content, post.categories)
+    return post
 
 
 # ====================================================
@@ -106,22 +257,7 @@ def increment_posts_count_of_user(user_id: int) -> bool:
     Increment the number of posts for a given user.
     Returns True if successful, False otherwise.
     """
-    users = load_data_from_dat_file(USERS_DB_FILE)
-
-    user = get_user_by_id(user_id)
-    if not user:
-        return False
-
-    user.posts_count += 1
-
-    # Update user in list
-    for i, u in enumerate(users):
-        if u.user_id == user_id:
-            users[i] = user
-            break
-
-    save_data_to_dat_file(USERS_DB_FILE, users)
-    return True
+    return adjust_user_counter(user_id, "posts_count", 1) is not None
 
 
 def decrement_posts_count_of_user(user_id: int) -> bool:
@@ -130,23 +266,7 @@ def decrement_posts_count_of_user(user_id: int) -> bool:
     Ensures the count does not go below zero.
     Returns True if successful, False otherwise.
     """
-    users = load_data_from_dat_file(USERS_DB_FILE)
-
-    user = get_user_by_id(user_id)
-    if not user:
-        return False
-
-    if user.posts_count > 0:
-        user.posts_count -= 1
-
-    # Update user in list
-    for i, u in enumerate(users):
-        if u.user_id == user_id:
-            users[i] = user
-            break
-
-    save_data_to_dat_file(USERS_DB_FILE, users)
-    return True
+    return adjust_user_counter(user_id, "posts_count", -1) is not None
 
 
 # ====================================================
@@ -154,8 +274,7 @@ def decrement_posts_count_of_user(user_id: int) -> bool:
 # ====================================================
 
 def is_post_liked_by_me(user_id: int, post_id: int) -> bool:
-    likes = load_data_from_dat_file(LIKES_DB)
-    return (user_id, post_id) in likes
+    return post_likes.has_liked(user_id, post_id)
 
 
 # ====================================================
@@ -163,60 +282,44 @@ def is_post_liked_by_me(user_id: int, post_id: int) -> bool:
 # ====================================================
 
 from src.schemas.users import UserProfileSimplified
-from src.crud.users_crud import get_user_by_id
+from src.crud.users_crud import get_user_by_id, get_simplified_users_by_ids
 
 def get_all_likes_of_post(post_id: int, current_user_id: int) -> list[UserProfileSimplified]:
     """
     Returns a list of simplified user profiles who liked the given post.
     """
-    likes = load_data_from_dat_file(LIKES_DB)
-    user_ids = [user_id for user_id, liked_post_id in likes if liked_post_id == post_id]
+    user_ids = post_likes.likers(post_id)
+    users = get_simplified_users_by_ids(user_ids)
+    following = follow_graph.is_following_many(current_user_id, user_ids)
 
     liked_users: list[UserProfileSimplified] = []
 
-    for uid in user_ids:
-        user = get_user_by_id(uid)
+    for uid, is_following in zip(user_ids, following):
+        user = users.get(uid)
         if user:
-            liked_users.append(
-                UserProfileSimplified(
-                    user_id=user.user_id,
-                    email=user.email,
-                    username=user.username,
-                    profile_picture=user.profile_picture,
-                    is_following=check_following_status(user_1=current_user_id, user_2=uid)
-                )
-            )
+            liked_users.append(user.model_copy(update={"is_following": is_following}))
 
     return liked_users
 
 
 
 
-def like_post(user_id: int, post_id: int) -> bool:
+def like_post(user_id: int, post_id: int, session: Optional[StorageSession] = None) -> bool:
 
-    if is_post_liked_by_me(user_id, post_id):
+    if not post_likes.add(user_id, post_id, session=session):
         return False
-    
-    likes = load_data_from_dat_file(LIKES_DB)
-    likes.append((user_id, post_id))
-
-    save_data_to_dat_file(LIKES_DB, likes)
 
-    increment_likes_count_of_post(post_id=post_id)
+    increment_likes_count_of_post(post_id=post_id, session=session)
+    record_activity(post_id, LIKE_ACTIVITY)
     return True
 
 
-def dislike_post(user_id: int, post_id: int) -> bool:
+def dislike_post(user_id: int, post_id: int, session: Optional[StorageSession] = None) -> bool:
 
-    likes = load_data_from_dat_file(LIKES_DB)
-    if (user_id, post_id) not in likes:
+    if not post_likes.remove(user_id, post_id, session=session):
         return False
     
-    likes.remove((user_id, post_id))
-
-    save_data_to_dat_file(LIKES_DB, likes)
-    
-    decrement_likes_count_of_post(post_id=post_id)
+    decrement_likes_count_of_post(post_id=post_id, session=session)
     return True
 
 
@@ -233,9 +336,14 @@ def add_comment_to_post(user_id: int, post_id: int, comment_payload: str) -> Opt
     if user is None:
         return None
     
-    comments = load_data_from_dat_file(COMMENTS_DB)
+    def insert(mutation) -> CommentProfile:
+        # The id is allocated on the writer, so concurrent comments get distinct ids
+        comment = new_comment.model_copy(update={"comment_id": mutation.new_id()})
+        mutation.insert(comment)
+        return comment
+
     new_comment = CommentProfile(
-        comment_id=len(comments) + 1,
+        comment_id=0,
         post_id=post_id,
         user_id=user_id,
         username=user.username,
@@ -246,26 +354,18 @@ def add_comment_to_post(user_id: int, post_id: int, comment_payload: str) -> Opt
         is_liked_by_me=False
     )
 
-    print(f"the actual comment is : {new_comment.comment_payload}")
-    
-    comments.append(new_comment)
-    save_data_to_dat_file(COMMENTS_DB, comments)
+    new_comment = storage.mutate(COMMENTS, insert)
     
     increment_comments_count_of_post(post_id)
+    record_activity(post_id, COMMENT_ACTIVITY)
     return new_comment
 
 
 
 def remove_comment_from_post(comment_id: int, post_id: int) -> bool:
 
-    comments = load_data_from_dat_file(COMMENTS_DB)
-    target_comment = get_comment_by_id(comment_id=comment_id)
-
-    if not target_comment:
+    if not storage.delete(COMMENTS, comment_id):
         return False
-    
-    comments = [c for c in comments if c.comment_id != comment_id]
-    save_data_to_dat_file(COMMENTS_DB, comments)
 
     decrement_comments_count_of_post(post_id)
     return True
@@ -273,57 +373,39 @@ def remove_comment_from_post(comment_id: int, post_id: int) -> bool:
 
 
 def get_comments_of_post(post_id: int) -> List[CommentProfile]:
-    comments = load_data_from_dat_file(COMMENTS_DB)
-    return [c for c in comments if getattr(c, "post_id", None) == post_id]
+    return storage.find(COMMENTS, "post", post_id)
 
 
 # ====================================================
 # 🔹 Count Utilities (Posts)
 # ====================================================
 
-def increment_comments_count_of_post(post_id: int) -> bool:
-    posts = load_data_from_dat_file(POSTS_DB)
-    for p in posts:
-        if p.post_id == post_id:
-            p.comments_nbr += 1
-            save_data_to_dat_file(POSTS_DB, posts)
-            return True
-    return False
+def adjust_counter_of_post(post_id: int, field: str, delta: int, session: Optional[StorageSession] = None) -> bool:
+    """Add `delta` to a counter field of a post, never going below zero."""
+    def adjust(mutation) -> bool:
+        post = mutation.get(post_id)
+        if post is None:
+            return False
 
+        return mutation.update(post.model_copy(update={field: max(0, getattr(post, field) + delta)}))
 
-def decrement_comments_count_of_post(post_id: int) -> bool:
-    posts = load_data_from_dat_file(POSTS_DB)
-    for p in posts:
-        if p.post_id == post_id:
-            if p.comments_nbr > 0:
-                p.comments_nbr -= 1
-            save_data_to_dat_file(POSTS_DB, posts)
-            return True
-    return False
+    return (session or storage).mutate(POSTS, adjust)
+
+
+def increment_comments_count_of_post(post_id: int) -> bool:
+    return adjust_counter_of_post(post_id, "comments_nbr", 1)
 
 
-def increment_likes_count_of_post(post_id: int) -> bool:
+def decrement_comments_count_of_post(post_id: int) -> bool:
+    return adjust_counter_of_post(post_id, "comments_nbr", -1)
 
-    posts = load_data_from_dat_file(POSTS_DB)
 
-    for p in posts:
-        if p.post_id == post_id:
-            p.likes_nbr += 1
-            save_data_to_dat_file(POSTS_DB, posts)
-            return True
-        
-    return False
+def increment_likes_count_of_post(post_id: int, session: Optional[StorageSession] = None) -> bool:
+    return adjust_counter_of_post(post_id, "likes_nbr", 1, session=session)
 
 
-def decrement_likes_count_of_post(post_id: int) -> bool:
-    posts = load_data_from_dat_file(POSTS_DB)
-    for p in posts:
-        if p.post_id == post_id:
-            if p.likes_nbr > 0:
-                p.likes_nbr -= 1
-            save_data_to_dat_file(POSTS_DB, posts)
-            return True
-    return False
+def decrement_likes_count_of_post(post_id: int, session: Optional[StorageSession] = None) -> bool:
+    return adjust_counter_of_post(post_id, "likes_nbr", -1, session=session)
 
 
 # ====================================================
@@ -331,48 +413,109 @@ def decrement_likes_count_of_post(post_id: int) -> bool:
 # ====================================================
 
 def load_posts() -> list[PostSchema]:
-    try:
-        with open(POSTS_DB, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    return storage.load(POSTS)
 
 
-def load_follows() -> list[dict]:
-    try:
-        with open(FOLLOWERS_DB, "rb") as f:
-            return pickle.load(f)
-        
-    except (FileNotFoundError, EOFError):
-        return []
+def load_follows() -> list[Tuple[int, int]]:
+    return follow_graph.pairs()
 
 
-def load_feed_of_user(user_id: int) -> list[PostSchema]:
+def load_feed_of_user(user_id: int, limit: int = 20, before: Optional[Cursor] = None) -> list[PostSchema]:
+    """Up to `limit` posts of the user and everyone they follow, newest first, below the cursor position `before`."""
+    post_ids = [entry[1] for entry in timelines.read(user_id, limit, before)]
+    posts = storage.get_many(POSTS, post_ids)
+    return [posts[post_id].model_copy() for post_id in post_ids if post_id in posts]
+
+
+def load_recent_posts(limit: int = 2000, before: Optional[Cursor] = None,
+                      exclude_user_id: Optional[int] = None) -> list[PostSchema]:
+    """Up to `limit` posts of all users, newest first, below the cursor position `before`."""
+    posts = []
+    while len(posts) < limit:
+        chunk = storage.page(POSTS, "recent", None, before, limit)
+        if not chunk:
+            break
+        posts += [post for post in chunk if post.user_id != exclude_user_id]
+        before = (chunk[-1].created_at, chunk[-1].post_id)
+    return [post.model_copy() for post in posts[:limit]]
+
+
+def load_posts_of_category(category_id: int, limit: int = 20, before: Optional[Cursor] = None) -> list[PostSchema]:
+    """Up to `limit` posts in the category, newest first, below the cursor position `before`."""
+    return [post.model_copy() for post in storage.page(POSTS, "category", category_id, before, limit)]
+
+
+def count_posts_of_category(category_id: int) -> int:
+    return storage.count(POSTS, "category", category_id)
+
+
+def load_trending_posts(window: str, limit: int) -> list[Tuple[PostSchema, int]]:
+    """The most active posts over the trending window, with their activity, most active first."""
+    # Ask for a few extra in case some of the top posts were deleted since
+    top = activity.top_posts(window, limit + 10)
+    posts = storage.get_many(POSTS, [post_id for post_id, _ in top])
+    return [(posts[post_id].model_copy(), score) for post_id, score in top if post_id in posts][:limit]
+
+
+def search_posts(current_user_id: int, query: str, limit: int, offset: int = 0,
+                 category_ids: Optional[List[int]] = None) -> list[PostSchema]:
+    """Posts matching the query best (BM25 over their content), optionally only in some categories."""
+    matches = post_search.search(query, limit, offset, category_ids)
+    posts = storage.get_many(POSTS, [post_id for post_id, _ in matches])
+    found = [posts[post_id].model_copy() for post_id, _ in matches if post_id in posts]
+
+    liked = post_likes.has_liked_many(current_user_id, [post.post_id for post in found])
+    for post, is_liked in zip(found, liked):
+        post.is_liked_by_me = is_liked
+    return found
+
+
+def load_trending_categories(window: str, limit: int) -> list[Tuple[int, int]]:
+    """(category_id, activity) of the most active categories over the trending window."""
+    return activity.top_categories(window, limit)
 
-    posts = load_posts()
-    follows = load_follows()
-    following_ids = []
-    
-    for f in follows:
-        if isinstance(f, dict):
-            if f["follower_id"] == user_id:
-                following_ids.append(f["following_id"])
-        elif isinstance(f, (tuple, list)) and len(f) >= 2:
-            follower_id, following_id = f[0], f[1]
-            if follower_id == user_id:
-                following_ids.append(following_id)
-    
-    user_and_following_ids = [user_id] + following_ids
-    user_feed_posts = [post for post in posts if post.user_id in user_and_following_ids]
-    user_feed_posts.sort(key=lambda p: p.created_at, reverse=True)
-    
-    return user_feed_posts
 
+def load_ranked_posts(user_id: int, following_only: bool, limit: int, offset: int = 0,
+                      ranked_at: Optional[datetime] = None) -> list[PostSchema]:
+    """
+    Posts ranked by engagement for the user, best first, skipping the first `offset`.
+    Candidates are the posts of the user and the users they follow (`following_only`),
+    or everyone else's posts (explore). Recency is measured from `ranked_at`, so the
+    pages of one ranking stay consistent.
+    """
+    index = storage.index(POSTS, "columns")
+    columns = index.view()
+    authors = columns["user_id"]
+    following = np.array(follow_graph.following(user_id), np.int64)
+
+    if following_only:
+        candidates = columns["live"] & np.isin(authors, np.append(following, user_id))
+    else:
+        candidates = columns["live"] & (authors != user_id)
+    slots = np.flatnonzero(candidates)
+
+    # The viewer's interests: authors and categories of the posts they liked or wrote
+    liked = index.slots_of(post_likes.liked_by(user_id)[-settings.RANK_RECENT_LIKES:], columns)
+    own = np.flatnonzero(columns["live"] & (authors == user_id))
+    affinity_authors = np.union1d(authors[liked], following)
+    category_mask = int(np.bitwise_or.reduce(columns["categories"][np.append(liked, own)], initial=0))
+
+    scores = engagement_scores(
+        likes=columns["likes_nbr"][slots],
+        comments=columns["comments_nbr"][slots],
+        created_at=columns["created_at"][slots],
+        authors=authors[slots],
+        categories=columns["categories"][slots],
+        now=epoch_seconds(ranked_at or datetime.utcnow()),
+        half_life_hours=settings.RANK_HALF_LIFE_HOURS,
+        affinity_authors=affinity_authors,
+        category_mask=category_mask,
+    )
+    ranked = slots[top_k(scores, offset + limit)[offset:]]
 
-def load_recent_posts(limit: int = 2000) -> list[PostSchema]:
-    posts = load_posts()
-    posts.sort(key=lambda p: p.created_at, reverse=True)
-    return posts[:limit]
+    post_ids = columns["key"][ranked].tolist()
+    posts = storage.get_many(POSTS, post_ids)
+    return [posts[post_id].model_copy() for post_id in post_ids if post_id in posts]
 
 
 # ====================================================
@@ -380,24 +523,21 @@ def load_recent_posts(limit: int = 2000) -> list[PostSchema]:
 # ====================================================
 
 def load_comments() -> List[CommentProfile]:
-    try:
-        with open(COMMENTS_DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    return storage.load(COMMENTS)
 
 
 def save_comments(comments: List[CommentProfile]):
-    with open(COMMENTS_DB_FILE, "wb") as f:
-        pickle.dump(comments, f)
+    storage.save(COMMENTS, comments)
 
 
-def get_comments_of_post(post_id: int, current_user_id: int) -> List[CommentProfile]:
-    all_comments = load_comments()
-    needed_comments = [c for c in all_comments if c.post_id == post_id]
+def get_comments_of_post(post_id: int, current_user_id: int,
+                         limit: int = 20, before: Optional[Cursor] = None) -> List[CommentProfile]:
+    """Up to `limit` comments of the post, newest first, below the cursor position `before`."""
+    needed_comments = [c.model_copy() for c in storage.page(COMMENTS, "post", post_id, before, limit)]
 
-    for c in needed_comments:
-        c.is_liked_by_me = is_comment_liked_by_me(comment_id=c.comment_id, user_id=current_user_id)
+    liked = comment_likes.has_liked_many(current_user_id, [c.comment_id for c in needed_comments])
+    for c, is_liked in zip(needed_comments, liked):
+        c.is_liked_by_me = is_liked
 
     return needed_comments
 
@@ -407,106 +547,75 @@ def get_comments_of_post(post_id: int, current_user_id: int) -> List[CommentProf
 # ====================================================
 
 def load_comment_likes() -> List[Tuple[int, int]]:
-    try:
-        with open(LIKES_DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    return [(comment_id, user_id) for user_id, comment_id in comment_likes.pairs()]
 
 
 def save_likes(likes: List[Tuple[int, int]]):
-    with open(LIKES_DB_FILE, "wb") as f:
-        pickle.dump(likes, f)
+    comment_likes.replace((user_id, comment_id) for comment_id, user_id in likes)
 
 
 def like_comment_of_post(comment_id: int, user_id: int) -> bool:
 
-    likes = load_comment_likes()  # or load_comment_likes() if you have that
-    if (comment_id, user_id) in likes:
+    comment = storage.get(COMMENTS, comment_id)
+    if comment is None:
         return False
 
-    comment = get_comment_by_id(comment_id)
-    if not comment:
+    if not comment_likes.add(user_id, comment_id):
         return False
-
-    likes.append((comment_id, user_id))
-    save_likes(likes)
     increment_likes_count_of_comment(comment_id=comment_id)
+    record_activity(comment.post_id, COMMENT_LIKE_ACTIVITY)
     return True
 
 
 def dislike_comment_of_post(comment_id: int, user_id: int) -> bool:
 
-    likes = load_comment_likes()  # or load_comment_likes() if that's what you're using
-    if (comment_id, user_id) not in likes:
+    if storage.get(COMMENTS, comment_id) is None:
         return False
 
-    comment = get_comment_by_id(comment_id)
-    if not comment:
+    if not comment_likes.remove(user_id, comment_id):
         return False
-
-    likes.remove((comment_id, user_id))
-    save_likes(likes)
     decrement_likes_count_of_comment(comment_id=comment_id)
     return True
 
 
 
 def get_likes_of_comment(comment_id: int) -> int:
-    comments = load_comments()
-    comment = next((c for c in comments if c.comment_id == comment_id), None)
+    comment = storage.get(COMMENTS, comment_id)
     return comment.likes_nbr if comment else 0
 
 
 
 def is_comment_liked_by_me(comment_id: int, user_id: int) -> bool:
-    likes = load_comment_likes()
-    return (comment_id, user_id) in likes
+    return comment_likes.has_liked(user_id, comment_id)
+
+
+def adjust_likes_count_of_comment(comment_id: int, delta: int) -> bool:
+    """Add `delta` to the likes counter of a comment, never going below zero."""
+    def adjust(mutation) -> bool:
+        comment = mutation.get(comment_id)
+        if not comment:
+            return False
+
+        return mutation.update(comment.model_copy(update={"likes_nbr": max(0, comment.likes_nbr + delta)}))
+
+    return storage.mutate(COMMENTS, adjust)
 
 
 def increment_likes_count_of_comment(comment_id: int) -> bool:
-    comments = load_comments()
-    comment = next((c for c in comments if c.comment_id == comment_id), None)
-    if not comment:
-        return False
-    comment.likes_nbr += 1
-    save_comments(comments)
-    return True
+    return adjust_likes_count_of_comment(comment_id, 1)
 
 
 def decrement_likes_count_of_comment(comment_id: int) -> bool:
-    comments = load_comments()
-    comment = next((c for c in comments if c.comment_id == comment_id), None)
-    if not comment:
-        return False
-    if comment.likes_nbr > 0:
-        comment.likes_nbr -= 1
-    save_comments(comments)
-    return True
+    return adjust_likes_count_of_comment(comment_id, -1)
 
 
 def get_comment_by_id(comment_id: int) -> CommentProfile | None:
-    comments = load_comments()
-    return next((c for c in comments if c.comment_id == comment_id), None)
+    comment = storage.get(COMMENTS, comment_id)
+    return comment.model_copy() if comment else None
 
 
 def get_posts_count(user_id: int) -> int:
     """
     Returns the number of posts created by a given user.
     """
-    posts = load_data_from_dat_file(POSTS_DB)
-    user_posts = [p for p in posts if p.user_id == user_id]
-    return len(user_posts)
-
-
-
-def generate_id_for_new_post() -> int:
-    """
-    Generate a globally unique post_id by finding the highest existing ID and adding 1.
-    This ensures no conflicts even if posts are deleted or created by different users.
-    """
-    posts = load_data_from_dat_file(POSTS_DB)
-    if not posts:
-        return 1
-    max_id = max(p.post_id for p in posts)
-    return max_id + 1
\ No newline at end of file
+    return storage.count(POSTS, "author", user_id)
@@ -1,143 +1,228 @@
 import pickle
-from typing import List, Tuple, Optional
-from src.schemas.users import UserSchema, UserProfileSchema, UpdateBioRequest, UpdateProfilePictureRequest
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple, Optional
+from src.schemas.users import UserSchema, UserProfileSchema, UpdateBioRequest, UpdateProfilePictureRequest, UserSuggestion
+from src.core.config import settings
+from src.storage.engines import storage
+from src.storage.collections import register_collection, write_pickle_file
+from src.storage.indexes import HashIndex, PrefixIndex, TrigramIndex
+from src.storage.follow_graph import FollowGraph
+from src.storage.session import StorageSession
+from src.services.suggestion_service import FollowSuggestions
 
 USERS_DB_FILE = "database/users_database.dat"
 DB_FILE = "database/followers_database.dat"
 USERS_IDS_DB_FILE = "database/users_ids_database.dat"
+FOLLOW_GRAPH_FILE = "database/follow_graph.bin"
+
+# Serializes user id allocation (the counter file is read, incremented and rewritten)
+_user_id_lock = threading.Lock()
+
+# Fuzzy search ranks a bio match below an equally close username match
+BIO_MATCH_WEIGHT = 0.5
+
+
+def follow_edge_key(edge) -> Tuple[int, int]:
+    """Key of a follow edge, stored either as a (follower_id, following_id) tuple or as a dict."""
+    if isinstance(edge, dict):
+        return (edge["follower_id"], edge["following_id"])
+    return (edge[0], edge[1])
+
+
+def email_index_key(email: str) -> str:
+    """Emails are indexed case-insensitively."""
+    return email.strip().lower()
+
+
+USERS = register_collection(
+    "users", USERS_DB_FILE, key=lambda user: user.user_id,
+    indexes={
+        "email": lambda: HashIndex(lambda user: email_index_key(user.email)),
+        # Lowercase usernames in order, for prefix search
+        "username": lambda: PrefixIndex(lambda user: user.username.lower()),
+        # Trigrams of usernames and bios, for fuzzy search
+        "username_trigrams": lambda: TrigramIndex(lambda user: user.username),
+        "bio_trigrams": lambda: TrigramIndex(lambda user: user.bio, containment=True),
+    }
+)
+FOLLOWERS = register_collection("followers", DB_FILE, key=follow_edge_key)
+
+# Follow edges live in the follow graph; the followers .dat collection is only read to migrate it
+follow_graph = FollowGraph(FOLLOW_GRAPH_FILE, legacy=lambda: [follow_edge_key(edge) for edge in storage.load(FOLLOWERS)])
+
+# Called as listener(follower_id, following_id, followed) after every follow and unfollow
+follow_listeners: List[Callable[[int, int, bool], None]] = []
+
+# Called as listener(user_id) after a user's record changes (with None after all users are replaced)
+user_change_listeners: List[Callable[[Optional[int]], None]] = []
+
+follow_suggestions = FollowSuggestions(follow_graph.packed, refresh_interval=settings.SUGGESTIONS_REFRESH_SECONDS)
+follow_listeners.append(lambda follower_id, following_id, followed: follow_suggestions.mark_changed())
 
 # ======================
 # Users CRUD
 # ======================
 
 def load_users() -> list[UserSchema]:
-    """Load users from the file."""
-    try:
-        with open(USERS_DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    """Load users from the storage engine."""
+    return storage.load(USERS)
     
 def generate_new_user_id() -> int:
     """Generate a new user ID, stored persistently in a file."""
-    try:
-        with open(USERS_IDS_DB_FILE, "rb") as f:
-            last_id = pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        last_id = -1  # No IDs yet, first ID will be 0
+    with _user_id_lock:
+        try:
+            with open(USERS_IDS_DB_FILE, "rb") as f:
+                last_id = pickle.load(f)
+        except (FileNotFoundError, EOFError):
+            last_id = -1  # No IDs yet, first ID will be 0
 
-    new_id = last_id + 1
+        new_id = last_id + 1
 
-    with open(USERS_IDS_DB_FILE, "wb") as f:
-        pickle.dump(new_id, f)
+        write_pickle_file(USERS_IDS_DB_FILE, new_id)
 
     return new_id
 
 def save_users(users: list[UserSchema]):
-    """Save users to the file."""
-    with open(USERS_DB_FILE, "wb") as f:
-        pickle.dump(users, f)
+    """Replace all users in the storage engine."""
+    storage.save(USERS, users)
+    notify_user_changed(None)
+
+def notify_user_changed(user_id: Optional[int]):
+    for listener in user_change_listeners:
+        listener(user_id)
 
 def get_user_by_email(email: str) -> Optional[UserSchema]:
-    """Find user by email in the file-based users list."""
-    users = load_users()
-    return next((user for user in users if user.email == email), None)
+    """Find user by email (case-insensitive) through the email index."""
+    return storage.lookup(USERS, "email", email_index_key(email))
 
-def get_user_by_id(user_id: int) -> Optional[UserSchema]:
-    """Find user by ID in the file-based users list."""
-    users = load_users()
-    return next((user for user in users if user.user_id == user_id), None)
+def get_user_by_id(user_id: int, session: Optional[StorageSession] = None) -> Optional[UserSchema]:
+    """Find user by ID."""
+    return (session or storage).get(USERS, user_id)
 
 from src.schemas.users import UserSchema, UserProfileSimplified
 from typing import Optional
 
-def get_simplified_user_obj_by_id(user_id: int) -> Optional[UserProfileSimplified]:
+def get_simplified_user_obj_by_id(user_id: int, session: Optional[StorageSession] = None) -> Optional[UserProfileSimplified]:
     """
     Retrieve a simplified user profile by user_id.
     Returns UserProfileSimplified or None if user not found.
     """
-    user: UserSchema = get_user_by_id(user_id)
+    user: UserSchema = get_user_by_id(user_id, session=session)
     if not user:
         return None
 
-    simplified_user = UserProfileSimplified(
+    return simplify_user(user)
+
+def simplify_user(user: UserSchema) -> UserProfileSimplified:
+    return UserProfileSimplified(
         user_id=user.user_id,
         email=user.email,
         username=user.username,
         profile_picture=user.profile_picture,
         is_following=user.is_following
     )
-    return simplified_user
 
+def get_users_by_ids(user_ids: Iterable[int], session: Optional[StorageSession] = None) -> Dict[int, UserSchema]:
+    """Resolve several users in one pass; each distinct id is looked up once and unknown ids are left out."""
+    return (session or storage).get_many(USERS, user_ids)
+
+def get_simplified_users_by_ids(user_ids: Iterable[int],
+                                session: Optional[StorageSession] = None) -> Dict[int, UserProfileSimplified]:
+    """Simplified profiles of several users, by user id, resolved in one pass."""
+    return {user_id: simplify_user(user) for user_id, user in get_users_by_ids(user_ids, session=session).items()}
+
+
+def update_user_fields(user_id: int, **changes) -> Optional[UserSchema]:
+    """Persist a copy of the user with the given fields changed."""
+    def apply(mutation) -> Optional[UserSchema]:
+        user = mutation.get(user_id)
+        if user is None:
+            return None  # User not found
+
+        user = user.model_copy(update=changes)
+        mutation.update(user)
+        return user
+
+    user = storage.mutate(USERS, apply)
+    if user is not None:
+        notify_user_changed(user_id)
+    return user
+
+def adjust_user_counter(user_id: int, field: str, delta: int, session: Optional[StorageSession] = None) -> Optional[UserSchema]:
+    """Add `delta` to one of the user's counters (not below 0), atomically."""
+    def apply(mutation) -> Optional[UserSchema]:
+        user = mutation.get(user_id)
+        if user is None:
+            return None  # User not found
+
+        user = user.model_copy(update={field: max(0, getattr(user, field) + delta)})
+        mutation.update(user)
+        return user
+
+    user = (session or storage).mutate(USERS, apply)
+    if user is not None:
+        notify_user_changed(user_id)
+    return user
+
+def insert_new_user(user: UserSchema) -> bool:
+    """Insert a new user into the storage engine. Returns False if the email is already taken."""
+    def insert(mutation) -> bool:
+        if mutation.collection.index("email").get(email_index_key(user.email)) is not None:
+            return False
+        mutation.insert(user)
+        return True
 
-def insert_new_user(user: UserSchema):
-    """Insert a new user into the file-based database."""
-    users = load_users()
-    users.append(user)
-    save_users(users)
+    return storage.mutate(USERS, insert)
 
 def update_user_bio(user_id: int, payload: UpdateBioRequest) -> Optional[UserSchema]:
-    """Update a user's bio and save to file."""
-    users = load_users()
-    for user in users:
-        if user.user_id == user_id:
-            user.bio = payload
-            save_users(users)
-            return user
-    return None  # User not found
+    """Update a user's bio."""
+    return update_user_fields(user_id, bio=payload)
 
 def update_user_profile_picture(user_id: int, payload: UpdateProfilePictureRequest) -> Optional[UserSchema]:
-    """Update a user's profile picture and save to file."""
-    users = load_users()
-    for user in users:
-        if user.user_id == user_id:
-            user.profile_picture = payload.profile_picture
-            save_users(users)
-            return user
-    return None  # User not found
-
-def find_matching_username(current_user: int, username: str) -> List[UserSchema]:
-    """Search for users whose username starts with the search string (case-insensitive)."""
-    username = username.lower()
-    users = load_users()
-    matching_users = [
-        user for user in users if user.username.lower().startswith(username)
-    ]
+    """Update a user's profile picture."""
+    return update_user_fields(user_id, profile_picture=payload.profile_picture)
+
+def find_matching_username(current_user: int, username: str, limit: Optional[int] = None) -> List[UserSchema]:
+    """Search for users whose username starts with the search string (case-insensitive), in username order."""
+    user_ids = storage.index(USERS, "username").prefix(username.lower(), limit)
+    users = get_users_by_ids(user_ids)
+    matching_users = [users[user_id].model_copy() for user_id in user_ids if user_id in users]
+
+    following = follow_graph.is_following_many(current_user, [user.user_id for user in matching_users])
+    for user, is_following in zip(matching_users, following):
+        user.is_following = is_following
 
-    for user in matching_users:
-        user.is_following = check_following_status(user_1=current_user, user_2=user.user_id)
+    return matching_users
+
+def find_similar_users(current_user: int, query: str, limit: int) -> List[UserSchema]:
+    """Typo-tolerant search: users whose username or bio is close to the query, most similar first."""
+    options = dict(limit=limit, max_candidates=settings.USER_SEARCH_MAX_CANDIDATES,
+                   min_score=settings.USER_SEARCH_MIN_SIMILARITY)
+    scores: Dict[int, float] = dict(storage.index(USERS, "username_trigrams").similar(query, **options))
+    for user_id, score in storage.index(USERS, "bio_trigrams").similar(query, **options):
+        scores[user_id] = max(scores.get(user_id, 0.0), BIO_MATCH_WEIGHT * score)
+
+    user_ids = sorted(scores, key=lambda user_id: (-scores[user_id], user_id))[:limit]
+    users = get_users_by_ids(user_ids)
+    matching_users = [users[user_id].model_copy() for user_id in user_ids if user_id in users]
+
+    following = follow_graph.is_following_many(current_user, [user.user_id for user in matching_users])
+    for user, is_following in zip(matching_users, following):
+        user.is_following = is_following
 
     return matching_users
 
 def increment_posts_count_of_user(user_id: int) -> Optional[UserSchema]:
     """Increment the post count of a user by 1."""
-    users = load_users()
-    for user in users:
-        if user.user_id == user_id:
-            user.posts_count += 1
-            save_users(users)
-            return user
-    return None  # User not found
+    return adjust_user_counter(user_id, "posts_count", 1)
 
 def decrement_posts_count_of_user(user_id: int) -> Optional[UserSchema]:
     """Decrement the post count of a user by 1 (not below 0)."""
-    users = load_users()
-    for user in users:
-        if user.user_id == user_id:
-            user.posts_count = max(0, user.posts_count - 1)
-            save_users(users)
-            return user
-    return None  # User not found
+    return adjust_user_counter(user_id, "posts_count", -1)
 
 def update_user_profile_picture(file: str, user_id: int) -> Optional[UserSchema]:
     """Update a user's profile picture with the given file path or filename."""
-    users = load_users()
-    for user in users:
-        if user.user_id == user_id:
-            user.profile_picture = file
-            save_users(users)
-            return user
-    return None  # User not found
+    return update_user_fields(user_id, profile_picture=file)
 
 
 # ======================
@@ -145,22 +230,22 @@ def update_user_profile_picture(file: str, user_id: int) -> Optional[UserSchema]
 # ======================
 
 def load_followers() -> List[Tuple[int, int]]:
-    """Load the followers database from file."""
-    try:
-        with open(DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError):
-        return []
+    """Load every (follower_id, following_id) edge of the follow graph."""
+    return follow_graph.pairs()
 
 def save_followers(followers: List[Tuple[int, int]]):
-    """Save the followers database to file."""
-    with open(DB_FILE, "wb") as f:
-        pickle.dump(followers, f)
+    """Replace every edge of the follow graph."""
+    follow_graph.replace(follow_edge_key(edge) for edge in followers)
 
 def check_following_status(user_1: int, user_2: int) -> bool:
     """Check if user_1 is following user_2."""
-    followers = load_followers()
-    return (user_1, user_2) in followers
+    return follow_graph.is_following(user_1, user_2)
+
+def count_followers_of_user(user_id: int) -> int:
+    return follow_graph.followers_count(user_id)
+
+def count_followings_of_user(user_id: int) -> int:
+    return follow_graph.following_count(user_id)
 
 
 def follow(user_1: int, user_2: int) -> bool:
@@ -168,37 +253,33 @@ def follow(user_1: int, user_2: int) -> bool:
     if user_1 == user_2:
         return False  # Cannot follow oneself
     
-    followers = load_followers()
-    if (user_1, user_2) in followers:
+    if not follow_graph.add(user_1, user_2):
         return False  # Already following
 
-    followers.append((user_1, user_2))
-    save_followers(followers)
-
     increment_followers_count_of_user(user_2)
+    for listener in follow_listeners:
+        listener(user_1, user_2, True)
     return True
 
 def unfollow(user_1: int, user_2: int) -> bool:
     """Make user_1 unfollow user_2."""
-    followers = load_followers()
-    if (user_1, user_2) not in followers:
+    if not follow_graph.remove(user_1, user_2):
         return False  # Not following
-    
-    followers.remove((user_1, user_2))
-    save_followers(followers)
 
     decrement_followers_count_of_user(user_2)
+    for listener in follow_listeners:
+        listener(user_1, user_2, False)
     return True
 
 def get_followers_of_user(user_id: int) -> List[UserProfileSchema]:
     """Get all users who are following the given user."""
-    followers_list = load_followers()
-    follower_ids = [follower_id for (follower_id, following_id) in followers_list if following_id == user_id]
+    follower_ids = follow_graph.followers(user_id)
+    users = get_users_by_ids(follower_ids)
 
     followers_data: List[UserProfileSchema] = []
 
     for fid in follower_ids:
-        user = get_user_by_id(fid)
+        user = users.get(fid)
         if user:
             followers_data.append(UserProfileSchema(
                 user_id=user.user_id,
@@ -217,13 +298,13 @@ def get_followers_of_user(user_id: int) -> List[UserProfileSchema]:
 
 def get_followings_of_user(user_id: int) -> List[UserProfileSchema]:
     """Get all users that the given user is following."""
-    followers_list = load_followers()
-    following_ids = [following_id for (follower_id, following_id) in followers_list if follower_id == user_id]
+    following_ids = follow_graph.following(user_id)
+    users = get_users_by_ids(following_ids)
 
     following_data: List[UserProfileSchema] = []
 
     for fid in following_ids:
-        user = get_user_by_id(fid)
+        user = users.get(fid)
         if user:
             following_data.append(UserProfileSchema(
                 user_id=user.user_id,
@@ -235,41 +316,27 @@ def get_followings_of_user(user_id: int) -> List[UserProfileSchema]:
                 following_count=user.following_count,
                 posts_count=user.posts_count,
                 created_at=user.created_at,
-                is_following=check_following_status(user_1=user_id, user_2=fid)
+                is_following=True
             ))
             
     return following_data
 
-def increment_followers_count_of_user(user_id: int) -> bool:
-    """Increment the followers_count of a user by 1."""
-    users = load_users()
-    user_found = False
+def get_suggested_users(user_id: int, limit: int) -> List[UserSuggestion]:
+    """Users the given user may want to follow, with how many of their followings follow each."""
+    suggestions = follow_suggestions.suggest(user_id, limit, exclude=follow_graph.following(user_id))
+    users = get_users_by_ids(suggested_id for suggested_id, _ in suggestions)
 
-    for user in users:
-        if user.user_id == user_id:
-            user.followers_count += 1
-            user_found = True
-            break
+    return [
+        UserSuggestion(**simplify_user(users[suggested_id]).model_dump(), mutual_followings=mutuals)
+        for suggested_id, mutuals in suggestions
+        if suggested_id in users
+    ]
 
-    if user_found:
-        save_users(users)
-        return True
-    
-    return False
+def increment_followers_count_of_user(user_id: int) -> bool:
+    """Increment the followers_count of a user by 1."""
+    return adjust_user_counter(user_id, "followers_count", 1) is not None
 
 def decrement_followers_count_of_user(user_id: int) -> bool:
     """Decrement the followers_count of a user by 1 (if > 0)."""
-    users = load_users()
-    user_found = False
-
-    for user in users:
-        if user.user_id == user_id:
-            if user.followers_count > 0:
-                user.followers_count -= 1
-            user_found = True
-            break
-
-    if user_found:
-        save_users(users)
-        return True
-    return False
+    return adjust_user_counter(user_id, "followers_count", -1) is not None
+
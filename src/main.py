@@ -1,7 +1,17 @@
+import logging
 from fastapi import FastAPI
 from src.routes import users_route, posts_route, profile_route, feed_route, auth_route, notifications_route, ws_route, chats_route, categories_route
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from src.storage.engines import storage
+from src.crud.posts_and_comments_crud import post_search
+from src.core.security import password_hasher
+from src.core.rate_limit import RateLimiter, RateLimitMiddleware
+from src.core.config import settings
+
+# The app's own modules log at INFO (storage sessions, migrations, index rebuilds); other libraries stay at WARNING
+logging.basicConfig(format="%(levelname)s:     %(name)s: %(message)s")
+logging.getLogger("src").setLevel(logging.INFO)
 
 app = FastAPI(title="My Backend")
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -18,6 +28,29 @@ app.include_router(ws_route.router, prefix="/ws")
 app.include_router(categories_route.router, prefix="/categories")
 
 
+@app.on_event("startup")
+def build_indexes():
+    # Build the secondary indexes from the stored records before serving requests
+    storage.build_indexes()
+    # Load the post search index too, so the first search does not pay for it
+    post_search.load()
+
+
+@app.on_event("startup")
+def start_password_hasher():
+    password_hasher.start()
+
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
+
+
+# Rate limits and load shedding of the expensive routes (inside CORS, so refusals carry its headers)
+rate_limiter = RateLimiter(settings.RATE_LIMITS, settings.RATE_LIMIT_QUEUE_TIMEOUT_MS / 1000, settings.RATE_LIMIT_MAX_KEYS)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 
 # Allow your frontend origin
 origins = [
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 from src.schemas.auth import RegisterUserRequest, LoginRequest
 from src.schemas.generic_response import GenericResponse
-from src.core.security import get_password_hash, verify_password, create_access_token
+from src.core.security import create_access_token, password_hasher
+from src.services.password_hashing import PasswordHasherBusy
 from src.services.auth_service import logout_user
 from src.crud.users_crud import insert_new_user, get_user_by_email, generate_new_user_id
 from src.schemas.users import UserSchema
@@ -13,8 +15,21 @@ from src.services.input_checker_for_bad_words import is_text_clean
 router = APIRouter(prefix="", tags=["Authentication"])
 
 
+def busy_response() -> JSONResponse:
+    """Response when too many password hashes are already pending."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+        content=jsonable_encoder(GenericResponse(
+            success=False,
+            message="Too many sign-ins right now, please try again",
+            timestamp=datetime.utcnow()
+        ))
+    )
+
+
 @router.post("/register", response_model=GenericResponse, status_code=status.HTTP_201_CREATED)
-def register_user(payload: RegisterUserRequest):
+async def register_user(payload: RegisterUserRequest):
     
     try:
 
@@ -28,7 +43,7 @@ def register_user(payload: RegisterUserRequest):
                 ))
             )
 
-        existing_user = get_user_by_email(payload.email)
+        existing_user = await run_in_threadpool(get_user_by_email, payload.email)
         if existing_user:
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -40,11 +55,12 @@ def register_user(payload: RegisterUserRequest):
             )
 
         # Create new user
+        password = await password_hasher.hash(payload.password)
         user = UserSchema(
-            user_id=generate_new_user_id(),
+            user_id=await run_in_threadpool(generate_new_user_id),
             email=payload.email,
             username=payload.username,
-            password=get_password_hash(payload.password),
+            password=password,
             created_at=datetime.utcnow(),
             bio="",
             profile_picture="",
@@ -54,7 +70,16 @@ def register_user(payload: RegisterUserRequest):
             is_following=False
         )
 
-        insert_new_user(user=user)
+        if not await run_in_threadpool(insert_new_user, user=user):
+            # Another registration took the email since the check above
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=jsonable_encoder(GenericResponse(
+                    success=False,
+                    message="Email already exists",
+                    timestamp=datetime.utcnow()
+                ))
+            )
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -64,6 +89,8 @@ def register_user(payload: RegisterUserRequest):
                 timestamp=datetime.utcnow()
             ))
         )
+    except PasswordHasherBusy:
+        return busy_response()
     except Exception as e:
         print(e)
         raise HTTPException(
@@ -77,9 +104,9 @@ def register_user(payload: RegisterUserRequest):
 
 
 @router.post("/login", response_model=GenericResponse)
-def login(payload: LoginRequest):
+async def login(payload: LoginRequest):
     try:
-        user = get_user_by_email(payload.email)
+        user = await run_in_threadpool(get_user_by_email, payload.email)
         if not user:
             return JSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -90,7 +117,7 @@ def login(payload: LoginRequest):
                 ))
             )
 
-        if not verify_password(payload.password, user.password):
+        if not await password_hasher.verify(payload.password, user.password):
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content=jsonable_encoder(GenericResponse(
@@ -121,6 +148,8 @@ def login(payload: LoginRequest):
                 timestamp=datetime.utcnow()
             ))
         )
+    except PasswordHasherBusy:
+        return busy_response()
     except Exception as e:
         print(e)
         raise HTTPException(
@@ -134,8 +163,8 @@ def login(payload: LoginRequest):
 
 
 @router.post("/logout", response_model=GenericResponse)
-def logout(token: str = Depends(logout_user)):
-    """Logout user by invalidating the token."""
+def logout(revoked: bool = Depends(logout_user)):
+    """Logout user by revoking the token until it expires."""
     try:
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from src.schemas.posts import PostSchema
+from src.crud.posts_and_comments_crud import count_posts_of_category
 
 router = APIRouter()
 
@@ -25,15 +26,17 @@ categories = [
     {"id": 19, "name": "☁️ Cloud Computing"},
     {"id": 20, "name": "👥 Leadership"},
 ]
+category_names = {cat["id"]: cat["name"] for cat in categories}
+
 
 @router.get("/")
 def get_categories():
-    return categories
+    return [{**cat, "posts_count": count_posts_of_category(cat["id"])} for cat in categories]
 
 
 def get_post_categories(post: PostSchema):
-    # Filter global categories where the ID is inside post.categories
-    post_cats = [[cat["id"], cat["name"]] for cat in categories if cat["id"] in post.categories]
+    # [id, name] of each known category of the post, by id
+    post_cats = [[cat_id, category_names[cat_id]] for cat_id in sorted(set(post.categories or ())) if cat_id in category_names]
 
     return post_cats
 
@@ -5,7 +5,7 @@ from src.crud.messages_crud import get_conversation, get_conversations, insert_m
 from src.crud.users_crud import get_user_by_id
 from src.schemas.chats import PrivateMessage, Conversation, SendMessageRequest
 from src.schemas.users import UserProfileSimplified
-from src.crud.users_crud import get_simplified_user_obj_by_id
+from src.crud.users_crud import get_simplified_users_by_ids
 
 router = APIRouter(prefix="", tags=["Messages"])
 
@@ -47,10 +47,11 @@ def get_my_conversations(current_user=Depends(get_current_user_from_token)):
     Fetch all users the current user has had conversations with.
     """
     raw_conversations = get_conversations(current_user.user_id)  # Should return participant_ids
+    participants = get_simplified_users_by_ids(conversation.participant_id for conversation in raw_conversations)
     users = []
 
     for conversation in raw_conversations:
-        user = get_simplified_user_obj_by_id(user_id=conversation.participant_id)
+        user = participants.get(conversation.participant_id)
         if user:
             users.append(user)
 
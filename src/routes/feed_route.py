@@ -1,23 +1,53 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Query, status, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 from datetime import datetime
-from src.routes.categories_route import get_post_categories
-from src.crud.posts_and_comments_crud import load_feed_of_user, load_recent_posts
-from src.crud.users_crud import get_simplified_user_obj_by_id
+from typing import Optional, Tuple
+from src.routes.categories_route import category_names, get_post_categories
+from src.crud.posts_and_comments_crud import load_feed_of_user, load_posts_of_category, load_ranked_posts, load_recent_posts
+from src.crud.posts_and_comments_crud import load_trending_categories, load_trending_posts
+from src.crud.users_crud import get_simplified_users_by_ids
 from src.schemas.generic_response import GenericResponse
 from src.core.security import get_current_user_from_token
+from src.core.config import settings
+from src.core.pagination import CURSOR_ENGAGEMENT, CURSOR_POSITION, PageParams, make_page, page_params, page_query, parse_page
 
 router = APIRouter(prefix="", tags=["Profile Management"])
 
+RANK_QUERY = Query("recent", pattern="^(recent|engagement)$",
+                   description='"recent" (newest first) or "engagement" (ranked by likes, comments, recency and interests)')
+
+
+def feed_page_params(rank: str = RANK_QUERY, query: Tuple[int, Optional[str]] = Depends(page_query)) -> PageParams:
+    """Pagination of a feed: the cursor must come from a page of the same `rank`."""
+    return parse_page(query, CURSOR_ENGAGEMENT if rank == "engagement" else CURSOR_POSITION)
+
+
+def load_ranked_page(user_id: int, following_only: bool, page: PageParams):
+    """One page of posts ranked by engagement; the cursor carries the ranking time and offset."""
+    ranked_at, offset = page.before or (datetime.utcnow(), 0)
+    posts = load_ranked_posts(user_id, following_only, limit=page.limit + 1, offset=offset, ranked_at=ranked_at)
+    return make_page(posts, page.limit, lambda _: (ranked_at, offset + page.limit), CURSOR_ENGAGEMENT)
+
 
 @router.get("", response_model=GenericResponse, status_code=status.HTTP_200_OK)
-async def get_user_feed(current_user=Depends(get_current_user_from_token)):
+async def get_user_feed(
+    current_user=Depends(get_current_user_from_token),
+    page: PageParams = Depends(feed_page_params),
+    rank: str = RANK_QUERY
+):
     try:
-        feed = load_feed_of_user(user_id=current_user.user_id)
+        if rank == "engagement":
+            feed = load_ranked_page(current_user.user_id, following_only=True, page=page)
+        else:
+            feed = make_page(
+                load_feed_of_user(user_id=current_user.user_id, limit=page.limit + 1, before=page.before),
+                page.limit, lambda post: (post.created_at, post.post_id)
+            )
+        owners = get_simplified_users_by_ids(item.user_id for item in feed.items)
 
-        for item in feed:
-            post_owner = get_simplified_user_obj_by_id(user_id=item.user_id)
+        for item in feed.items:
+            post_owner = owners.get(item.user_id)
             item.category_objects = get_post_categories(item)
 
             if post_owner is not None:
@@ -47,20 +77,27 @@ async def get_user_feed(current_user=Depends(get_current_user_from_token)):
 
 @router.get("/explore", response_model=GenericResponse, status_code=status.HTTP_200_OK)
 async def get_explore_feed(
-    current_user=Depends(get_current_user_from_token)
+    current_user=Depends(get_current_user_from_token),
+    page: PageParams = Depends(feed_page_params),
+    rank: str = RANK_QUERY
 ):
     """
-    Get the most recent posts from all users (Explore feed), excluding the current user's posts.
+    Get the most recent (or, with rank=engagement, the highest ranked) posts from all users
+    (Explore feed), excluding the current user's posts.
     """
     try:
-        posts = load_recent_posts()
-
-        # Exclude current user's posts
-        posts = [post for post in posts if post.user_id != current_user.user_id]
+        if rank == "engagement":
+            posts = load_ranked_page(current_user.user_id, following_only=False, page=page)
+        else:
+            posts = make_page(
+                load_recent_posts(limit=page.limit + 1, before=page.before, exclude_user_id=current_user.user_id),
+                page.limit, lambda post: (post.created_at, post.post_id)
+            )
 
         #? attach user object with each post
-        for item in posts:
-            post_owner = get_simplified_user_obj_by_id(user_id=item.user_id)
+        owners = get_simplified_users_by_ids(item.user_id for item in posts.items)
+        for item in posts.items:
+            post_owner = owners.get(item.user_id)
             item.category_objects = get_post_categories(item)
             if post_owner is not None:
                 item.user = post_owner
@@ -85,3 +122,105 @@ async def get_explore_feed(
                 timestamp=datetime.utcnow()
             ))
         )
+
+
+@router.get("/trending", response_model=GenericResponse, status_code=status.HTTP_200_OK)
+async def get_trending(
+    current_user=Depends(get_current_user_from_token),
+    window: str = Query("24h", pattern="^(1h|24h)$", description="Activity window: 1h or 24h"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX, description="Number of posts")
+):
+    """
+    Get the posts and categories with the most likes and comments over the last hour or day.
+    """
+    try:
+        trending = load_trending_posts(window, limit)
+        posts = [post for post, _ in trending]
+
+        owners = get_simplified_users_by_ids(item.user_id for item in posts)
+        for item in posts:
+            post_owner = owners.get(item.user_id)
+            item.category_objects = get_post_categories(item)
+            if post_owner is not None:
+                item.user = post_owner
+
+        categories = [
+            {"id": category_id, "name": category_names[category_id], "activity": score}
+            for category_id, score in load_trending_categories(window, len(category_names))
+            if category_id in category_names
+        ]
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content=jsonable_encoder(GenericResponse(
+                success=True,
+                data={"posts": posts, "categories": categories},
+                message="Trending posts loaded successfully",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    except Exception as e:
+        print(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=jsonable_encoder(GenericResponse(
+                success=False,
+                message="An error occurred while loading trending posts",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+
+@router.get("/category/{category_id}", response_model=GenericResponse, status_code=status.HTTP_200_OK)
+async def get_category_feed(
+    category_id: int,
+    current_user=Depends(get_current_user_from_token),
+    page: PageParams = Depends(page_params)
+):
+    """
+    Get the most recent posts of one category, from all users.
+    """
+    if category_id not in category_names:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=jsonable_encoder(GenericResponse(
+                success=False,
+                message=f"Category with ID {category_id} not found",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    try:
+        posts = make_page(
+            load_posts_of_category(category_id, limit=page.limit + 1, before=page.before),
+            page.limit, lambda post: (post.created_at, post.post_id)
+        )
+
+        owners = get_simplified_users_by_ids(item.user_id for item in posts.items)
+        for item in posts.items:
+            post_owner = owners.get(item.user_id)
+            item.category_objects = get_post_categories(item)
+            if post_owner is not None:
+                item.user = post_owner
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content=jsonable_encoder(GenericResponse(
+                success=True,
+                data=posts,
+                message="Category feed loaded successfully",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    except Exception as e:
+        print(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=jsonable_encoder(GenericResponse(
+                success=False,
+                message="An error occurred while loading the category feed",
+                timestamp=datetime.utcnow()
+            ))
+        )
@@ -3,15 +3,19 @@ from datetime import datetime
 import re
 from typing import List
 from fastapi import APIRouter, Depends, Form, File, Query, UploadFile, status, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from src.crud.notifications_crud import create_new_notification
-from src.crud.users_crud import get_followers_of_user, get_simplified_user_obj_by_id
-from src.crud.posts_and_comments_crud import add_comment_to_post, generate_id_for_new_post, get_all_likes_of_post, remove_comment_from_post, dislike_comment_of_post, get_comment_by_id, get_comments_of_post, is_comment_liked_by_me, like_comment_of_post
+from src.crud.notifications_crud import create_new_notification, create_notifications
+from src.crud.users_crud import get_followers_of_user, get_simplified_user_obj_by_id, get_simplified_users_by_ids
+from src.crud.posts_and_comments_crud import add_comment_to_post, get_all_likes_of_post, remove_comment_from_post, dislike_comment_of_post, get_comment_by_id, get_comments_of_post, is_comment_liked_by_me, like_comment_of_post
 from src.crud.posts_and_comments_crud import delete_a_post, dislike_post, get_post_by_id, get_posts_of_user, create_new_post, is_post_liked_by_me, like_post, update_a_post
+from src.crud.posts_and_comments_crud import search_posts
 from src.schemas.generic_response import GenericResponse
 from src.schemas.posts import CommentProfile, CreateOrUpdateCommentSchema, PostSchema, UpdatePostSchema
 from src.core.security import get_current_user_from_token
+from src.core.pagination import CURSOR_SEARCH, PageParams, page_params, make_page, search_page_params
+from src.storage.session import StorageSession, get_storage_session
 from src.services.input_checker_for_bad_words import is_text_clean
 import json
 from src.routes.categories_route import get_post_categories
@@ -65,9 +69,6 @@ async def create_post(
                 ))
             )
 
-        # Determine post ID
-        post_id = generate_id_for_new_post()
-
         media_url = ""
         if media_file:
             # Sanitize filename
@@ -91,8 +92,9 @@ async def create_post(
             print(f"📌 Saved media file, URL: {media_url}")
 
         # Create PostSchema object
+        # The post ID is allocated when the post is saved
         new_post = PostSchema(
-            post_id=post_id,
+            post_id=0,
             user_id=current_user.user_id,
             content=content,
             media_url=media_url,
@@ -104,20 +106,20 @@ async def create_post(
         )
 
         # Save post to database
-        saved_post = create_new_post(new_post)
+        saved_post = await run_in_threadpool(create_new_post, new_post)
         print(f"📌 Post saved: {saved_post.post_id}, media_url: {saved_post.media_url}")
 
 
-        my_followers = get_followers_of_user(current_user.username)
+        my_followers = await run_in_threadpool(get_followers_of_user, current_user.user_id)
 
-        if my_followers is not None or len(my_followers) > 0:
-            for follower in my_followers:
-                notif = create_new_notification(
-                    user_id=follower.user_id,
-                    actor_id=current_user.user_id,
-                    type="create post",
-                    message=f"{current_user.username} shared a new post"
-                )
+        # Notify every follower with a single write
+        await run_in_threadpool(
+            create_notifications,
+            user_ids=[follower.user_id for follower in my_followers or []],
+            actor_id=current_user.user_id,
+            type="create post",
+            message=f"{current_user.username} shared a new post"
+        )
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -251,24 +253,79 @@ def get_user_post(
 
 
 
+@router.get("/search", response_model=GenericResponse)
+def search_posts_by_content(
+    q: str = Query(..., min_length=1, description="Words to search post contents for"),
+    category_ids: List[int] = Query([], description="Only posts in at least one of these categories"),
+    current_user=Depends(get_current_user_from_token),
+    page: PageParams = Depends(search_page_params)
+):
+    """
+    Search posts by content, best matches first.
+    The cursor carries the time of the first page and the offset of the next one.
+    """
+    try:
+        searched_at, offset = page.before or (datetime.utcnow(), 0)
+        posts = make_page(
+            search_posts(current_user.user_id, q, limit=page.limit + 1, offset=offset, category_ids=category_ids),
+            page.limit, lambda _: (searched_at, offset + page.limit), CURSOR_SEARCH
+        )
+
+        owners = get_simplified_users_by_ids(item.user_id for item in posts.items)
+        for item in posts.items:
+            post_owner = owners.get(item.user_id)
+            item.category_objects = get_post_categories(item)
+            if post_owner is not None:
+                item.user = post_owner
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content=jsonable_encoder(GenericResponse(
+                success=True,
+                data=posts,
+                message="Posts retrieved successfully",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    except Exception as e:
+        print(f"Error searching posts: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=jsonable_encoder(GenericResponse(
+                success=False,
+                data=None,
+                message="An unexpected error occurred while searching posts.",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+
 @router.get("/{user_id}", response_model=GenericResponse)
-def get_user_posts(user_id: int, current_user=Depends(get_current_user_from_token)):
+def get_user_posts(
+    user_id: int,
+    current_user=Depends(get_current_user_from_token),
+    session: StorageSession = Depends(get_storage_session),
+    page: PageParams = Depends(page_params)
+):
     """
-    Retrieve all posts for a specific user.
+    Retrieve one page of posts for a specific user.
     Requires a valid JWT token.
     Ordered from most recent to oldest.
     """
     try:
-        # Load the posts for the given user
-        posts = get_posts_of_user(current_user_id=current_user.user_id, target_user_id=user_id)
-
-        # Sort posts by created_at (newest first)
-        posts.sort(key=lambda p: p.created_at, reverse=True)
+        # Load one page of posts for the given user (newest first)
+        posts = make_page(
+            get_posts_of_user(current_user_id=current_user.user_id, target_user_id=user_id, session=session,
+                              limit=page.limit + 1, before=page.before),
+            page.limit, lambda post: (post.created_at, post.post_id)
+        )
 
         # Attach user info to each post
-        for item in posts:
+        owners = get_simplified_users_by_ids((item.user_id for item in posts.items), session=session)
+        for item in posts.items:
             item.category_objects = get_post_categories(item)
-            post_owner = get_simplified_user_obj_by_id(user_id=item.user_id)
+            post_owner = owners.get(item.user_id)
             if post_owner is not None:
                 item.user = post_owner
 
@@ -452,7 +509,8 @@ def delete_post(
 @router.post("/like-deslike/{post_id}", response_model=GenericResponse)
 def like_or_dislike_post(
     post_id: int,
-    current_user=Depends(get_current_user_from_token)
+    current_user=Depends(get_current_user_from_token),
+    session: StorageSession = Depends(get_storage_session)
 ):
     """
     Like or dislike a post.
@@ -460,7 +518,7 @@ def like_or_dislike_post(
     - If not liked → like.
     """
     try:
-        post = get_post_by_id(post_id)
+        post = get_post_by_id(post_id, session=session)
         if not post:
             return JSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -475,11 +533,11 @@ def like_or_dislike_post(
 
         if is_post_liked_by_me(user_id, post_id):
             # Already liked → remove like
-            success = dislike_post(user_id, post_id)
+            success = dislike_post(user_id, post_id, session=session)
             is_liked = False
         else:
             # Not liked → add like
-            success = like_post(user_id, post_id)
+            success = like_post(user_id, post_id, session=session)
             is_liked = True
 
         if not success:
@@ -503,7 +561,8 @@ def like_or_dislike_post(
                     actor_id=current_user.user_id,
                     type="like post",
                     post_id=post.post_id,
-                    message=f"{current_user.username} liked your post"
+                    message=f"{current_user.username} liked your post",
+                    session=session
                 )
 
             return JSONResponse(
@@ -753,21 +812,24 @@ def toggle_like_comment(
 @router.get("/comments/all", response_model=GenericResponse)
 def get_comments(
     post_id: int = Query(..., description="ID of the post to retrieve comments for"),
-    current_user=Depends(get_current_user_from_token)
+    current_user=Depends(get_current_user_from_token),
+    page: PageParams = Depends(page_params)
 ):
     """
-    Get all comments of a given post as CommentProfile objects,
+    Get one page of comments of a given post as CommentProfile objects,
     ordered from most recent to oldest.
     """
     try:
-        comments: List[CommentProfile] = get_comments_of_post(post_id, current_user_id=current_user.user_id)
-
-        # Sort comments by creation date (newest first)
-        comments.sort(key=lambda c: c.created_at, reverse=True)
+        comments = make_page(
+            get_comments_of_post(post_id, current_user_id=current_user.user_id,
+                                 limit=page.limit + 1, before=page.before),
+            page.limit, lambda c: (c.created_at, c.comment_id)
+        )
 
         # Attach user info for each comment
-        for item in comments:
-            comment_owner = get_simplified_user_obj_by_id(user_id=item.user_id)
+        owners = get_simplified_users_by_ids(item.user_id for item in comments.items)
+        for item in comments.items:
+            comment_owner = owners.get(item.user_id)
             if comment_owner is not None:
                 item.user = comment_owner
 
@@ -3,14 +3,17 @@ from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
 from datetime import datetime
 import os
 import shutil
+from typing import List
 
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from src.crud.notifications_crud import create_new_notification
+from src.crud.notifications_crud import create_notifications
+from src.core.ws_manager import manager
 from src.schemas.generic_response import GenericResponse
 from src.core.security import get_current_user_from_token
 from src.crud.users_crud import get_followers_of_user, update_user_profile_picture
-# from src.routes.ws import broadcast_to_followers_of_user
+from src.schemas.notification import NotificationSchema
 
 router = APIRouter(prefix="", tags=["Profile Management"])
 
@@ -19,6 +22,16 @@ UPLOAD_FILE_PREFIX = "url"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+async def broadcast_to_followers_of_user(notifications: List[NotificationSchema]):
+    """Push each notification to its follower over the websocket, if they are connected."""
+    for notif in notifications:
+        if notif.user_id in manager.active_connections:
+            await manager.send_personal_message({
+                "type": "notification",
+                "notification": jsonable_encoder(notif)
+            }, notif.user_id)
+
+
 @router.post("/update-profile-picture", response_model=GenericResponse, status_code=status.HTTP_200_OK)
 async def update_profile_picture(
     file: UploadFile = File(..., description="Profile picture to upload"),
@@ -55,21 +68,20 @@ async def update_profile_picture(
 
         file_url = f"{UPLOAD_FILE_PREFIX}/{filename}"
 
-        update_user_profile_picture(file=file_url, user_id=current_user.user_id)
+        await run_in_threadpool(update_user_profile_picture, file=file_url, user_id=current_user.user_id)
 
-        
-        my_followers = get_followers_of_user(current_user.username)
+        my_followers = await run_in_threadpool(get_followers_of_user, current_user.user_id)
 
-        if my_followers is not None or len(my_followers) > 0:
-            for follower in my_followers:
-                notif = create_new_notification(
-                    user_id=follower.user_id,
-                    actor_id=current_user.user_id,
-                    type="update profile picture",
-                    message=f"{current_user.username} updated his profile picture"
-                )
+        # Notify every follower with a single write
+        notifications = await run_in_threadpool(
+            create_notifications,
+            user_ids=[follower.user_id for follower in my_followers or []],
+            actor_id=current_user.user_id,
+            type="update profile picture",
+            message=f"{current_user.username} updated his profile picture"
+        )
 
-        broadcast_to_followers_of_user(followers=my_followers, notification=notif)
+        await broadcast_to_followers_of_user(notifications)
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
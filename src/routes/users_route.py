@@ -10,7 +10,9 @@ from src.services.input_checker_for_bad_words import is_text_clean
 from src.crud.notifications_crud import create_new_notification
 from src.core.security import get_current_user_from_token
 from src.schemas.generic_response import GenericResponse
-from src.crud.users_crud import get_simplified_user_obj_by_id, get_user_by_id, update_user_bio, update_user_profile_picture, find_matching_username, check_following_status, follow, get_followers_of_user, get_followings_of_user, unfollow
+from src.crud.users_crud import get_simplified_user_obj_by_id, get_user_by_id, update_user_bio, update_user_profile_picture, find_matching_username, find_similar_users, check_following_status, follow, get_followers_of_user, get_followings_of_user, unfollow
+from src.crud.users_crud import count_followers_of_user, count_followings_of_user, get_suggested_users
+from src.core.config import settings
 from src.schemas.users import UpdateBioRequest, UserProfileSchema
 
 
@@ -39,8 +41,8 @@ def get_user_profile(user_id: int, current_user=Depends(get_current_user_from_to
             username=user.username,
             bio=user.bio,
             profile_picture=user.profile_picture,
-            followers_count=len(get_followers_of_user(user_id=user_id)),
-            following_count=len(get_followings_of_user(user_id=user_id)),
+            followers_count=count_followers_of_user(user_id=user_id),
+            following_count=count_followings_of_user(user_id=user_id),
             posts_count=user.posts_count,
             created_at=user.created_at,
             is_following=check_following_status(user_1=current_user.user_id, user_2=user_id)
@@ -180,11 +182,14 @@ async def update_profile_picture(
 @router.get("/search", response_model=GenericResponse)
 def search_users(
     username: str = Query(..., min_length=1, description="Username to search for"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX, description="Maximum number of users"),
+    fuzzy: bool = Query(False, description="Typo-tolerant search over usernames and bios, most similar first"),
     current_user=Depends(get_current_user_from_token)
 ):
     """
     Search for users by username.
-    Returns users whose username contains the search username (case-insensitive).
+    Returns users whose username starts with the search username (case-insensitive),
+    or with fuzzy=true, users whose username or bio is similar to it.
     """
     try:
 
@@ -198,7 +203,10 @@ def search_users(
                 ))
             )
 
-        matching_users = find_matching_username(current_user=current_user.user_id, username=username)
+        if fuzzy:
+            matching_users = find_similar_users(current_user=current_user.user_id, query=username, limit=limit)
+        else:
+            matching_users = find_matching_username(current_user=current_user.user_id, username=username, limit=limit)
         
         if not matching_users:
             return JSONResponse(
@@ -248,6 +256,41 @@ def search_users(
         )
 
 
+@router.get("/suggestions", response_model=GenericResponse)
+def get_user_suggestions(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX, description="Number of suggestions"),
+    current_user=Depends(get_current_user_from_token)
+):
+    """
+    Suggest users to follow: people followed by the users you follow, ranked by how many
+    of them follow each one, then the most followed users.
+    """
+    try:
+        suggestions = get_suggested_users(current_user.user_id, limit)
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content=jsonable_encoder(GenericResponse(
+                success=True,
+                data=suggestions,
+                message="Suggestions retrieved successfully",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+    except Exception as e:
+        print(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=jsonable_encoder(GenericResponse(
+                success=False,
+                data=None,
+                message="Failed to retrieve suggestions",
+                timestamp=datetime.utcnow()
+            ))
+        )
+
+
 @router.post("/follow-unfollow", response_model=GenericResponse)
 def follow_unfollow(
     target_user_id: int,
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi.concurrency import run_in_threadpool
 from src.core.ws_manager import manager
 
 
@@ -22,9 +23,9 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int = Query(...)):
 
                 print(f"sender : {user_id}, receiver : {recipient_id}")
 
-                # 1. Save message to database/pickle
+                # 1. Save message to database/pickle (off the event loop, compaction may hit the disk)
                 from src.crud.messages_crud import insert_message
-                insert_message(sender_id=user_id, recipient_id=recipient_id, content=content)
+                await run_in_threadpool(insert_message, sender_id=user_id, recipient_id=recipient_id, content=content)
                 print("message is inserted")
 
                 # 2. Send to recipient
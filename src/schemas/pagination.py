@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from typing import Optional, Any, List
+
+
+class CursorPage(BaseModel):
+    items: List[Any]
+    next_cursor: Optional[str] = None
@@ -45,3 +45,7 @@ class UserProfileSimplified(BaseModel):
     username: str
     profile_picture: Optional[str] = ""
     is_following: bool = False
+
+
+class UserSuggestion(UserProfileSimplified):
+    mutual_followings: int = 0
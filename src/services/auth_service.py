@@ -1,4 +1,17 @@
-def logout_user():
-    # Stub function — In production, you’d blacklist or invalidate the token
-    # For now, just accept the request and return success
+from fastapi import Depends, HTTPException, status
+from jose import jwt, JWTError
+from src.core.config import settings
+from src.core.security import oauth2_scheme, revoke_token
+
+
+def logout_user(token: str = Depends(oauth2_scheme)):
+    # Revoke the token's jti until it expires; every later request with it gets a 401
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+        )
+    revoke_token(payload)
     return True
@@ -0,0 +1,104 @@
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from passlib.context import CryptContext
+
+# Imported by the worker processes too, so this module only depends on passlib
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when `max_pending` hashes are already queued or running."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a pool of worker processes, so a burst of logins neither holds the
+    request threadpool nor competes with request threads for the GIL.
+
+    At most `max_pending` hashes are queued or running at once; beyond that, callers
+    get PasswordHasherBusy right away instead of waiting behind the queue. Workers are
+    spawned rather than forked, as the server process runs writer threads.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.seconds = 0.0  # total time from submit to result, queueing included
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy(f"{self.pending} password hashes already pending")
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        start = time.perf_counter()
+        pool = None
+        try:
+            pool = self._executor()
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next callers
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.seconds += time.perf_counter() - start
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(check_password, plain_password, hashed_password)
+
+    def start(self):
+        """Spawn the workers ahead of the first request, which would otherwise wait for them."""
+        executor = self._executor()
+        for _ in range(self.workers):
+            executor.submit(hash_password, "")
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "average_seconds": self.seconds / self.completed if self.completed else 0.0,
+        }
@@ -0,0 +1,111 @@
+import time
+import threading
+import numpy as np
+import scipy.sparse as sp
+from typing import Callable, Iterable, List, Optional, Tuple
+from src.storage.pair_store import LOW_MASK
+
+
+class FollowGraphMatrix:
+    """One immutable copy of the follow graph as a CSR adjacency matrix (row follows column)."""
+
+    def __init__(self, packed_edges: bytes, popular_count: int):
+        values = np.frombuffer(packed_edges, dtype=np.int64)
+        sources = (values >> 32).astype(np.int32)
+        targets = (values & LOW_MASK).astype(np.int32)
+        size = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+
+        self.adjacency = sp.csr_matrix(
+            (np.ones(len(values), dtype=np.int32), (sources, targets)), shape=(size, size)
+        )
+        followers = np.bincount(targets, minlength=size)
+        popular = np.argsort(-followers, kind="stable")[:popular_count]
+        self.popular = popular[followers[popular] > 0]
+        self.edges = len(values)
+
+    def friends_of_friends(self, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Users followed by the people `user_id` follows, and how many of them follow each."""
+        if user_id >= self.adjacency.shape[0]:
+            return np.zeros(0, np.int32), np.zeros(0, np.int32)
+        two_hops = self.adjacency[user_id] @ self.adjacency
+        return two_hops.indices, two_hops.data
+
+
+class FollowSuggestions:
+    """
+    "People you may know": users followed by the people a user follows, ranked by how
+    many of them do (mutual followings), topped up with the most followed users.
+
+    Suggestions come from a FollowGraphMatrix snapshot. After the graph changes, the
+    snapshot is rebuilt in a background thread at most every `refresh_interval` seconds;
+    requests keep using the previous one meanwhile. Users already followed are excluded
+    by the caller from the live graph, so suggestions never lag behind a follow.
+    """
+
+    def __init__(self, packed_edges: Callable[[], bytes], refresh_interval: float, popular_count: int = 200):
+        self.packed_edges = packed_edges
+        self.refresh_interval = refresh_interval
+        self.popular_count = popular_count
+        self._matrix: Optional[FollowGraphMatrix] = None
+        self._built_at = 0.0
+        self._changed = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def mark_changed(self):
+        self._changed = True
+
+    def _build(self) -> FollowGraphMatrix:
+        matrix = FollowGraphMatrix(self.packed_edges(), self.popular_count)
+        self.builds += 1
+        return matrix
+
+    def _refresh(self):
+        try:
+            matrix = self._build()
+            with self._lock:
+                self._matrix, self._built_at = matrix, time.time()
+        except Exception as e:
+            print(f"[!] Refreshing follow suggestions failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def matrix(self) -> FollowGraphMatrix:
+        """The current snapshot, building the first one inline and later ones in the background."""
+        with self._lock:
+            if self._matrix is None:
+                self._changed = False
+                self._matrix, self._built_at = self._build(), time.time()
+            elif self._changed and not self._refreshing and time.time() - self._built_at >= self.refresh_interval:
+                self._changed = False
+                self._refreshing = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+            return self._matrix
+
+    def suggest(self, user_id: int, limit: int, exclude: Iterable[int]) -> List[Tuple[int, int]]:
+        """Up to `limit` (user_id, mutual followings) suggestions, best first."""
+        matrix = self.matrix()
+        excluded = np.fromiter(set(exclude) | {user_id}, np.int64)
+
+        candidates, mutuals = matrix.friends_of_friends(user_id)
+        keep = ~np.isin(candidates, excluded)
+        candidates, mutuals = candidates[keep], mutuals[keep]
+        # Most mutual followings first, ties broken by lowest user id
+        rank = -(mutuals.astype(np.int64) << 32) + candidates
+        if len(candidates) > limit:
+            top = np.argpartition(rank, limit - 1)[:limit]
+            candidates, mutuals, rank = candidates[top], mutuals[top], rank[top]
+        order = np.argsort(rank)
+        suggestions = list(zip(candidates[order].tolist(), mutuals[order].tolist()))
+
+        if len(suggestions) < limit:
+            # Fall back to the most followed users
+            taken = np.append(excluded, candidates)
+            for popular_id in matrix.popular[~np.isin(matrix.popular, taken)][:limit - len(suggestions)].tolist():
+                suggestions.append((popular_id, 0))
+        return suggestions
+
+    def stats(self) -> dict:
+        matrix = self._matrix
+        return {"builds": self.builds, "edges": matrix.edges if matrix is not None else 0}
@@ -0,0 +1,222 @@
+import os
+import time
+import heapq
+import pickle
+import logging
+import threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from src.storage.collections import write_pickle_file
+from src.storage.group_commit import group_committer, DURABILITY_NONE
+
+logger = logging.getLogger(__name__)
+
+# One activity event: (unix time, post id, category ids of the post, weight)
+ActivityEvent = Tuple[float, int, Iterable[int], int]
+
+
+# ======================
+# Sliding window counts
+# ======================
+
+class SlidingWindowCounter:
+    """
+    Event counts per key over the last `window` seconds.
+
+    Counts are kept in a ring of `buckets` time buckets, plus a running total per key.
+    A bucket that falls out of the window is subtracted from the totals and reused, so
+    memory is bounded by the keys active within the window, and top-K only looks at them.
+    """
+
+    def __init__(self, window: float, buckets: int):
+        self.window = window
+        self.width = window / buckets
+        self.ring: List[Dict[Hashable, int]] = [{} for _ in range(buckets)]
+        self.ring_ids: List[int] = [-1] * buckets  # absolute bucket number held by each slot
+        self.totals: Dict[Hashable, int] = {}
+        self.latest = -1  # newest bucket number seen
+
+    def _bucket(self, at: float) -> int:
+        return int(at // self.width)
+
+    def _expire(self, slot: int):
+        totals = self.totals
+        for key, count in self.ring[slot].items():
+            remaining = totals[key] - count
+            if remaining > 0:
+                totals[key] = remaining
+            else:
+                del totals[key]
+        self.ring[slot] = {}
+
+    def advance(self, now: float):
+        """Drop the buckets that are older than the window at `now`."""
+        oldest = self._bucket(now) - len(self.ring) + 1
+        for slot, bucket_id in enumerate(self.ring_ids):
+            if 0 <= bucket_id < oldest:
+                self._expire(slot)
+                self.ring_ids[slot] = -1
+
+    def add(self, key: Hashable, amount: int, at: float):
+        bucket_id = self._bucket(at)
+        if bucket_id <= self.latest - len(self.ring):
+            return  # Already out of the window
+        self.latest = max(self.latest, bucket_id)
+
+        slot = bucket_id % len(self.ring)
+        if self.ring_ids[slot] != bucket_id:
+            self._expire(slot)
+            self.ring_ids[slot] = bucket_id
+
+        bucket = self.ring[slot]
+        bucket[key] = bucket.get(key, 0) + amount
+        self.totals[key] = self.totals.get(key, 0) + amount
+
+    def discard(self, key: Hashable):
+        """Forget every event counted for `key`."""
+        for bucket in self.ring:
+            bucket.pop(key, None)
+        self.totals.pop(key, None)
+
+    def count(self, key: Hashable) -> int:
+        return self.totals.get(key, 0)
+
+    def top(self, k: int) -> List[Tuple[Hashable, int]]:
+        """The `k` keys with the highest counts, highest first (call `advance` first)."""
+        return heapq.nlargest(k, self.totals.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+
+# ======================
+# Trending activity
+# ======================
+
+class ActivityCounters:
+    """
+    Recent like and comment activity per post and per category, over several windows
+    (e.g. "1h" and "24h"), for ranking what is trending.
+
+    The counters are snapshotted to `path` at most every `save_interval` seconds and on
+    exit. When there is no snapshot, `rebuild` is asked for past events to replay.
+    """
+
+    def __init__(self, path: str, windows: Dict[str, Tuple[float, int]], save_interval: float = 30.0,
+                 rebuild: Optional[Callable[[], Iterable[ActivityEvent]]] = None):
+        """`windows` maps each window name to its (length in seconds, number of buckets)."""
+        self.path = path
+        self.windows = windows
+        self.save_interval = save_interval
+        self.rebuild = rebuild
+        self._posts: Optional[Dict[str, SlidingWindowCounter]] = None
+        self._categories: Optional[Dict[str, SlidingWindowCounter]] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.time()
+        self.events = 0
+
+    def _counters(self) -> Tuple[Dict[str, SlidingWindowCounter], Dict[str, SlidingWindowCounter]]:
+        if self._posts is None:
+            self._load()
+        return self._posts, self._categories
+
+    def _load(self):
+        fresh = lambda: {name: SlidingWindowCounter(window, buckets) for name, (window, buckets) in self.windows.items()}
+        posts, categories = fresh(), fresh()
+
+        state = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        layout = {name: list(window) for name, window in self.windows.items()}
+
+        if state is not None and state["layout"] == layout:
+            for counters, saved in ((posts, state["posts"]), (categories, state["categories"])):
+                for name, counter in counters.items():
+                    counter.ring, counter.ring_ids, counter.totals = saved[name]
+                    counter.latest = max(counter.ring_ids)
+        elif self.rebuild is not None:
+            # No snapshot, or one taken with other window settings
+            replayed = 0
+            for at, post_id, category_ids, weight in self.rebuild():
+                for name in self.windows:
+                    posts[name].add(post_id, weight, at)
+                    for category_id in category_ids:
+                        categories[name].add(category_id, weight, at)
+                replayed += 1
+            if replayed:
+                logger.info("Rebuilt trending counters from %d events", replayed)
+
+        self._posts, self._categories = posts, categories
+
+    def record(self, post_id: int, category_ids: Iterable[int], weight: int = 1, at: Optional[float] = None):
+        """Count one like or comment on `post_id` (and on each of its categories)."""
+        now = time.time()
+        at = now if at is None else at
+        with self._lock:
+            posts, categories = self._counters()
+            for name in self.windows:
+                posts[name].add(post_id, weight, at)
+                for category_id in category_ids:
+                    categories[name].add(category_id, weight, at)
+            self.events += 1
+            self._dirty = True
+            save = now - self._saved_at >= self.save_interval
+            if save:
+                self._saved_at = now
+
+        if save:
+            group_committer.commit(self.path, self._flush)
+
+    def forget_post(self, post_id: int):
+        """Drop the activity of a deleted post (its categories keep theirs)."""
+        with self._lock:
+            posts, _ = self._counters()
+            for counter in posts.values():
+                counter.discard(post_id)
+            self._dirty = True
+
+    def top_posts(self, window: str, k: int) -> List[Tuple[int, int]]:
+        """The `k` most active posts over the window, as (post_id, activity), most active first."""
+        return self._top(window, k, categories=False)
+
+    def top_categories(self, window: str, k: int) -> List[Tuple[int, int]]:
+        return self._top(window, k, categories=True)
+
+    def _top(self, window: str, k: int, categories: bool) -> List[Tuple[int, int]]:
+        with self._lock:
+            counter = self._counters()[1 if categories else 0][window]
+            counter.advance(time.time())
+            return counter.top(k)
+
+    def _state(self) -> dict:
+        posts, categories = self._counters()
+        dump = lambda counters: {
+            name: ([dict(bucket) for bucket in counter.ring], list(counter.ring_ids), dict(counter.totals))
+            for name, counter in counters.items()
+        }
+        return {
+            "layout": {name: list(window) for name, window in self.windows.items()},
+            "posts": dump(posts),
+            "categories": dump(categories),
+        }
+
+    def _flush(self, fsync: bool):
+        with self._lock:
+            if not self._dirty:
+                return
+            state = self._state()
+            self._dirty = False
+        write_pickle_file(self.path, state, fsync=fsync)
+
+    def save(self):
+        """Write the snapshot now if anything changed since the last one."""
+        self._flush(fsync=group_committer.durability != DURABILITY_NONE)
+
+    def stats(self) -> dict:
+        posts, categories = self._counters()
+        return {
+            "events": self.events,
+            **{f"posts_{name}": len(counter) for name, counter in posts.items()},
+            **{f"categories_{name}": len(counter) for name, counter in categories.items()},
+        }
@@ -0,0 +1,140 @@
+import os
+import pickle
+import struct
+import threading
+from typing import Any, List, Tuple
+from src.storage.collections import CollectionSpec, ResidentCollection, read_pickle_file, write_pickle_file
+from src.storage.group_commit import group_committer, DURABILITY_NONE
+
+# Every record is a 4-byte big-endian length followed by a pickled (op, payload) tuple
+RECORD_HEADER = struct.Struct(">I")
+
+
+def read_log_records(path: str, offset: int = 0) -> Tuple[List[Tuple[str, Any]], int]:
+    """
+    Read the complete records stored after `offset`.
+    Returns the records and the offset just past the last complete one; a torn
+    record at the end (crash mid-append) is left out.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    records = []
+    position = 0
+    while position + RECORD_HEADER.size <= len(data):
+        (length,) = RECORD_HEADER.unpack_from(data, position)
+        end = position + RECORD_HEADER.size + length
+        if end > len(data):
+            break
+        records.append(pickle.loads(data[position + RECORD_HEADER.size:end]))
+        position = end
+
+    return records, offset + position
+
+
+def read_collection_files(spec: CollectionSpec) -> list:
+    """Current items of a collection on disk: its snapshot plus any logged changes."""
+    items = read_pickle_file(spec.path)
+    if not spec.log_path:
+        return items
+
+    collection = ResidentCollection(spec, items)
+    records, _ = read_log_records(spec.log_path)
+    for op, payload in records:
+        collection.apply(op, payload)
+    return collection.items()
+
+
+def write_collection_files(spec: CollectionSpec, items: list, fsync: bool = False):
+    """Write a full snapshot of a collection and drop the changes it now contains."""
+    write_pickle_file(spec.path, items, fsync=fsync)
+    if spec.log_path and os.path.exists(spec.log_path):
+        with open(spec.log_path, "wb") as f:
+            if fsync:
+                os.fsync(f.fileno())
+
+
+class AppendLog:
+    """
+    Append-only change log for one collection, on top of its pickled snapshot.
+
+    A change costs one small record append instead of rewriting the whole .dat file.
+    The state is the snapshot plus the log replayed in order; once `compact_every`
+    records have piled up, the log is folded into a fresh snapshot so replay on
+    startup stays short. Replaying a record twice is harmless, so a crash between
+    writing the snapshot and truncating the log loses nothing.
+    """
+
+    def __init__(self, spec: CollectionSpec, compact_every: int):
+        self.spec = spec
+        self.path = spec.log_path
+        self.compact_every = compact_every
+        self.offset = 0  # bytes of the log already applied to the resident collection
+        self.pending = 0  # records appended since the last snapshot
+        self._lock = threading.Lock()
+
+    def load(self) -> ResidentCollection:
+        """Rebuild the collection from the snapshot and the whole log."""
+        with self._lock:
+            collection = ResidentCollection(self.spec, read_pickle_file(self.spec.path))
+            self.offset = 0
+            self.pending = 0
+            self._replay(collection)
+            return collection
+
+    def catch_up(self, collection: ResidentCollection):
+        """Apply records appended to the log since it was last read (e.g. by another process)."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= self.offset:
+            return
+
+        with self._lock:
+            self._replay(collection)
+
+    def _replay(self, collection: ResidentCollection):
+        records, self.offset = read_log_records(self.path, self.offset)
+        for op, payload in records:
+            collection.apply(op, payload)
+        self.pending += len(records)
+
+        # Drop a torn record left by a crash so new records are not appended after it
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.offset:
+            with open(self.path, "r+b") as f:
+                f.truncate(self.offset)
+
+    def append(self, changes: List[Tuple[str, Any]]):
+        """Append one record per change; the fsync is left to the group committer."""
+        data = b"".join(
+            RECORD_HEADER.pack(len(record)) + record
+            for record in (pickle.dumps(change) for change in changes)
+        )
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self.offset += len(data)
+            self.pending += len(changes)
+
+    def sync(self, fsync: bool):
+        """Make appended records durable."""
+        if not fsync or not os.path.exists(self.path):
+            return
+        with open(self.path, "ab") as f:
+            os.fsync(f.fileno())
+
+    def needs_compaction(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def compact(self, collection: ResidentCollection):
+        """Write the collection as the new snapshot and empty the log."""
+        with self._lock:
+            write_collection_files(self.spec, collection.items(), fsync=group_committer.durability != DURABILITY_NONE)
+            self.offset = 0
+            self.pending = 0
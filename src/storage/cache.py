@@ -0,0 +1,107 @@
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from src.storage.collections import CollectionSpec, ResidentCollection, read_pickle_file
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identify the current version of a file by inode, mtime and size (None if missing)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class CacheEntry:
+    def __init__(self, collection: ResidentCollection, signature: Optional[Tuple[int, int, int]]):
+        self.collection = collection
+        self.signature = signature
+
+
+class CollectionCache:
+    """
+    Process-wide cache of unpickled collections.
+
+    Each collection is unpickled once and kept resident. It is reloaded only when the
+    .dat file changes on disk (another process wrote it) or after `invalidate`.
+    Writes made through this process refresh the stored signature, so they do not
+    count as external changes.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.invalidations = 0
+
+    def get(self, spec: CollectionSpec, loader: Optional[Callable[[], ResidentCollection]] = None) -> ResidentCollection:
+        """
+        Return the resident collection, unpickling the file only if it changed.
+        `loader` builds the collection when the default (unpickle the .dat file) is not enough.
+        """
+        signature = file_signature(spec.path)
+        entry = self._entries.get(spec.path)
+
+        if entry is not None and entry.signature == signature:
+            self.hits += 1
+            return entry.collection
+
+        with self._lock:
+            # Re-read the signature: our own write may have landed since the check above
+            signature = file_signature(spec.path)
+            entry = self._entries.get(spec.path)
+            if entry is not None and entry.signature == signature:
+                self.hits += 1
+                return entry.collection
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+
+            if loader is not None:
+                collection = loader()
+            else:
+                collection = ResidentCollection(spec, read_pickle_file(spec.path))
+            self._entries[spec.path] = CacheEntry(collection, signature)
+            return collection
+
+    def store(self, spec: CollectionSpec, collection: ResidentCollection):
+        """Record a collection this process just wrote, along with the file's new signature."""
+        with self._lock:
+            self._entries[spec.path] = CacheEntry(collection, file_signature(spec.path))
+
+    def persist(self, spec: CollectionSpec, collection: ResidentCollection, write: Callable[[], None]):
+        """
+        Run `write` (which rewrites the collection's file) and record the new signature
+        atomically, so readers never mistake our own write for an external change.
+        """
+        with self._lock:
+            write()
+            self._entries[spec.path] = CacheEntry(collection, file_signature(spec.path))
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop one cached collection (or all of them) so the next read reloads it."""
+        with self._lock:
+            if path is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(path, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.reloads
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "resident_collections": len(self._entries),
+        }
+
+
+collection_cache = CollectionCache()
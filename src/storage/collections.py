@@ -0,0 +1,201 @@
+import os
+import pickle
+import tempfile
+from typing import Any, BinaryIO, Callable, Dict, Hashable, List, Optional
+from src.storage.indexes import Index
+
+
+# ======================
+# Collections registry
+# ======================
+
+class CollectionSpec:
+    """
+    Describes one persistent collection: its name, legacy .dat file and record key.
+    Collections with a `log_path` record changes in an append-only log next to the .dat file.
+    `indexes` maps index names to factories building the secondary indexes kept on the records.
+    """
+
+    def __init__(self, name: str, path: str, key: Callable[[Any], Hashable], log_path: Optional[str] = None,
+                 indexes: Optional[Dict[str, Callable[[], Index]]] = None):
+        self.name = name
+        self.path = path
+        self.key = key
+        self.log_path = log_path
+        self.indexes = indexes or {}
+
+
+COLLECTIONS: Dict[str, CollectionSpec] = {}
+
+
+def register_collection(name: str, path: str, key: Callable[[Any], Hashable], log_path: Optional[str] = None,
+                        indexes: Optional[Dict[str, Callable[[], Index]]] = None) -> str:
+    """Register a collection so every engine knows where it lives and how to key its records."""
+    COLLECTIONS[name] = CollectionSpec(name=name, path=path, key=key, log_path=log_path, indexes=indexes)
+    return name
+
+
+def get_collection_spec(name: str) -> CollectionSpec:
+    if name not in COLLECTIONS:
+        raise KeyError(f"Unknown collection: {name}")
+    return COLLECTIONS[name]
+
+
+def get_collection_name_by_path(path: str) -> Optional[str]:
+    """Map a legacy .dat file path to the collection stored in it."""
+    for spec in COLLECTIONS.values():
+        if spec.path == path:
+            return spec.name
+    return None
+
+
+def read_pickle_file(path: str) -> list:
+    """Unpickle a legacy .dat file, treating a missing or empty file as an empty collection."""
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError):
+        return []
+
+
+def write_pickle_file(path: str, items: Any, fsync: bool = False):
+    """
+    Pickle `items` into a temp file next to `path` and rename it over `path`,
+    so a crash mid-write never leaves a truncated .dat file behind.
+    """
+    write_file_atomically(path, lambda f: pickle.dump(items, f), fsync=fsync)
+
+
+def write_file_atomically(path: str, write: Callable[[BinaryIO], None], fsync: bool = False):
+    """Run `write` on a temp file next to `path`, then rename the temp file over `path`."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    if fsync:
+        fsync_directory(directory)
+
+
+def fsync_directory(directory: str):
+    """Make a rename in `directory` durable."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ======================
+# Resident state
+# ======================
+
+class ResidentCollection:
+    """
+    In-memory state of one collection: records by key, kept in insertion order,
+    plus the secondary indexes registered for it, updated on every change.
+    `last_id` is the highest integer key held since the collection was loaded,
+    deleted records included, so ids allocated above it are never reused.
+    """
+
+    def __init__(self, spec: CollectionSpec, items: list):
+        self.spec = spec
+        self.records, self.indexes = self._build(items)
+        self.last_id = self._max_id(self.records)
+
+    @staticmethod
+    def _max_id(records: Dict[Hashable, Any]) -> int:
+        return max((key for key in records if isinstance(key, int)), default=0)
+
+    def _build(self, items: list):
+        records: Dict[Hashable, Any] = {}
+        for item in items:
+            records[self.spec.key(item)] = item
+
+        indexes: Dict[str, Index] = {name: factory() for name, factory in self.spec.indexes.items()}
+        for index in indexes.values():
+            index.build(records.items())
+        return records, indexes
+
+    def _reindex(self, key: Hashable, old: Optional[Any], new: Optional[Any]):
+        for index in self.indexes.values():
+            if old is not None and new is not None and not index.changed(old, new):
+                continue
+            if old is not None:
+                index.remove(key, old)
+            if new is not None:
+                index.add(key, new)
+
+    def items(self) -> list:
+        return list(self.records.values())
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self.records.get(key)
+
+    def index(self, name: str) -> Index:
+        return self.indexes[name]
+
+    def rebuild_indexes(self):
+        """Rebuild every index from the records."""
+        _, self.indexes = self._build(self.items())
+
+    def check_indexes(self) -> List[str]:
+        """Names of the indexes that differ from a rebuild from the records."""
+        _, rebuilt = self._build(self.items())
+        return [name for name, index in self.indexes.items() if index.snapshot() != rebuilt[name].snapshot()]
+
+    def insert(self, item: Any):
+        key = self.spec.key(item)
+        old = self.records.get(key)
+        self.records[key] = item
+        self._reindex(key, old, item)
+        if isinstance(key, int) and key > self.last_id:
+            self.last_id = key
+
+    def update(self, item: Any) -> bool:
+        key = self.spec.key(item)
+        old = self.records.get(key)
+        if old is None:
+            return False
+        self.records[key] = item
+        self._reindex(key, old, item)
+        return True
+
+    def delete(self, key: Hashable) -> bool:
+        old = self.records.pop(key, None)
+        if old is None:
+            return False
+        self._reindex(key, old, None)
+        return True
+
+    def apply(self, op: str, payload: Any) -> bool:
+        """
+        Apply one recorded change: ("insert", item), ("update", item),
+        ("delete", key) or ("replace", items).
+        """
+        if op == "insert":
+            self.insert(payload)
+            return True
+        if op == "update":
+            return self.update(payload)
+        if op == "delete":
+            return self.delete(payload)
+        if op == "replace":
+            self.replace(payload)
+            return True
+        raise ValueError(f"Unknown change: {op}")
+
+    def replace(self, items: list):
+        # Readers keep using the old records and indexes until both are swapped in
+        self.records, self.indexes = self._build(items)
+        self.last_id = max(self.last_id, self._max_id(self.records))
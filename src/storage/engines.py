@@ -0,0 +1,365 @@
+import os
+import pickle
+import sqlite3
+import atexit
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from src.core.config import settings
+from src.storage.collections import COLLECTIONS, CollectionSpec, ResidentCollection, get_collection_spec, write_pickle_file
+from src.storage.cache import collection_cache
+from src.storage.indexes import Index
+from src.storage.append_log import AppendLog, read_collection_files, write_collection_files
+from src.storage.group_commit import CommitBatch, group_committer, DURABILITY_COMMIT, DURABILITY_NONE
+from src.storage.writer import CollectionWriter, Mutation, WriteShortcuts
+
+
+# ======================
+# Engine interface
+# ======================
+
+class StorageEngine(WriteShortcuts):
+    """
+    Interface the crud modules go through instead of touching .dat files directly.
+
+    Reads are served from a resident copy of each collection. Every change to a
+    collection goes through its single writer (`mutate`), which applies changes in
+    order and hands each batch to the engine to persist.
+
+    Records are addressed by the key registered for their collection. Objects returned
+    by `load` and `get` may be shared with other requests: copy a record before
+    annotating it for a response, and pass it to `update` when it should be persisted.
+    """
+
+    def __init__(self):
+        self._writers: Dict[str, CollectionWriter] = {}
+        self._writers_lock = threading.Lock()
+
+    def _collection(self, name: str) -> ResidentCollection:
+        """Return the resident state of a collection."""
+        raise NotImplementedError
+
+    def _persist(self, spec: CollectionSpec, collection: ResidentCollection,
+                 changes: List[Tuple[str, Any]]) -> Optional[CommitBatch]:
+        """Persist a batch of changes already applied to `collection`."""
+        raise NotImplementedError
+
+    def _discard(self, name: str):
+        """Drop the resident state after a failed write so it is reloaded."""
+
+    def _writer(self, name: str) -> CollectionWriter:
+        writer = self._writers.get(name)
+        if writer is not None:
+            return writer
+
+        with self._writers_lock:
+            if name not in self._writers:
+                spec = get_collection_spec(name)
+                self._writers[name] = CollectionWriter(
+                    name,
+                    collection=lambda: self._collection(name),
+                    persist=lambda collection, changes: self._persist(spec, collection, changes),
+                    discard=lambda: self._discard(name),
+                )
+            return self._writers[name]
+
+    def load(self, name: str) -> list:
+        """Return every record of the collection, in insertion order."""
+        return self._collection(name).items()
+
+    def get(self, name: str, key: Hashable) -> Optional[Any]:
+        """Return the record stored under `key`, or None."""
+        return self._collection(name).get(key)
+
+    def get_many(self, name: str, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Return the records stored under `keys` (each distinct key once), skipping missing ones."""
+        collection = self._collection(name)
+        records = {}
+        for key in keys:
+            if key not in records:
+                record = collection.get(key)
+                if record is not None:
+                    records[key] = record
+        return records
+
+    def lookup(self, name: str, index: str, value: Hashable) -> Optional[Any]:
+        """Return the record a unique index maps `value` to, or None."""
+        collection = self._collection(name)
+        key = collection.index(index).get(value)
+        return collection.get(key) if key is not None else None
+
+    def find(self, name: str, index: str, value: Hashable) -> list:
+        """Return the records a group index maps `value` to, in index order."""
+        collection = self._collection(name)
+        records = (collection.get(key) for key in collection.index(index).get(value))
+        return [record for record in records if record is not None]
+
+    def page(self, name: str, index: str, value: Hashable,
+             before: Optional[Tuple[Any, Hashable]] = None, limit: int = 20) -> list:
+        """Return up to `limit` records of a sorted group index, in descending order, below the position `before`."""
+        collection = self._collection(name)
+        records = (collection.get(key) for key in collection.index(index).page(value, before, limit))
+        return [record for record in records if record is not None]
+
+    def count(self, name: str, index: str, value: Hashable) -> int:
+        """Return how many records a group index maps `value` to."""
+        return self._collection(name).index(index).count(value)
+
+    def index(self, name: str, index: str) -> Index:
+        """Return one of the collection's indexes, for index types queried through their own methods."""
+        return self._collection(name).index(index)
+
+    def rebuild_indexes(self, name: str):
+        """Rebuild the collection's indexes from its records."""
+        self.mutate(name, lambda mutation: mutation.collection.rebuild_indexes())
+
+    def build_indexes(self):
+        """Load every collection that has indexes, so they are built from the records up front."""
+        for spec in list(COLLECTIONS.values()):
+            if spec.indexes:
+                self._collection(spec.name)
+
+    def check_indexes(self, name: str) -> List[str]:
+        """Names of the collection's indexes that disagree with its records."""
+        return self.mutate(name, lambda mutation: mutation.collection.check_indexes())
+
+    def submit(self, name: str, fn: Callable[[Mutation], Any]) -> Tuple[Any, Optional[CommitBatch]]:
+        """Run `fn(mutation)` on the collection's writer; returns its result and the commit batch to wait on."""
+        return self._writer(name).submit(fn).result()
+
+    def mutate(self, name: str, fn: Callable[[Mutation], Any]) -> Any:
+        """
+        Run `fn(mutation)` on the collection's writer and return its result.
+        Read-modify-write sequences done through `mutation` never interleave with other writes.
+        """
+        result, batch = self.submit(name, fn)
+        group_committer.wait(batch)
+        return result
+
+    def flush(self):
+        """Persist any buffered state."""
+        group_committer.flush()
+
+    def close(self):
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            name: {"mutations": writer.mutations, "batches": writer.batches}
+            for name, writer in self._writers.items()
+        }
+
+
+# ======================
+# Pickle engine
+# ======================
+
+class PickleEngine(StorageEngine):
+    """
+    The original layout: one pickled list per collection.
+    Unpickled collections are kept in the process-wide cache and only reloaded when
+    the file changes on disk. Each batch of changes is applied to the resident copy
+    and the file is rewritten atomically by the group committer, once per commit window.
+    Collections registered with a log path append each change to their log instead
+    and are compacted into the .dat file periodically.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._logs: Dict[str, AppendLog] = {}
+
+    def _log(self, spec: CollectionSpec) -> Optional[AppendLog]:
+        if not spec.log_path:
+            return None
+        if spec.name not in self._logs:
+            self._logs[spec.name] = AppendLog(spec, compact_every=settings.APPEND_LOG_COMPACT_EVERY)
+        return self._logs[spec.name]
+
+    def _collection(self, name: str) -> ResidentCollection:
+        spec = get_collection_spec(name)
+        log = self._log(spec)
+        if log is None:
+            return collection_cache.get(spec)
+
+        collection = collection_cache.get(spec, loader=log.load)
+        log.catch_up(collection)
+        return collection
+
+    def _persist(self, spec: CollectionSpec, collection: ResidentCollection,
+                 changes: List[Tuple[str, Any]]) -> Optional[CommitBatch]:
+        log = self._log(spec)
+        if log is None:
+            # Rewrites of the same file within the commit window collapse into one
+            def flush(fsync: bool):
+                collection_cache.persist(
+                    spec, collection, lambda: write_pickle_file(spec.path, collection.items(), fsync=fsync)
+                )
+            return group_committer.commit(spec.path, flush)
+
+        # Replacing the whole collection is written as a fresh snapshot
+        if any(op == "replace" for op, _ in changes):
+            collection_cache.persist(spec, collection, lambda: log.compact(collection))
+            return None
+
+        log.append(changes)
+        if log.needs_compaction():
+            collection_cache.persist(spec, collection, lambda: log.compact(collection))
+        return group_committer.commit(log.path, log.sync)
+
+    def _discard(self, name: str):
+        collection_cache.invalidate(get_collection_spec(name).path)
+
+
+# ======================
+# Memory engine
+# ======================
+
+class MemoryEngine(StorageEngine):
+    """
+    Keeps every collection resident and updates it in place.
+    Collections are seeded from their .dat file on first use and written back on flush.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._collections: Dict[str, ResidentCollection] = {}
+        self._dirty: set = set()
+        self._lock = threading.RLock()
+
+    def _collection(self, name: str) -> ResidentCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    spec = get_collection_spec(name)
+                    collection = ResidentCollection(spec, read_collection_files(spec))
+                    self._collections[name] = collection
+        return collection
+
+    def _persist(self, spec: CollectionSpec, collection: ResidentCollection,
+                 changes: List[Tuple[str, Any]]) -> Optional[CommitBatch]:
+        with self._lock:
+            self._dirty.add(spec.name)
+        return None
+
+    def flush(self):
+        # The stores committing through the group committer (follow graph, likes) too
+        super().flush()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for name in dirty:
+            write_collection_files(
+                get_collection_spec(name),
+                self._collections[name].items(),
+                fsync=group_committer.durability != DURABILITY_NONE
+            )
+
+
+# ======================
+# SQLite engine
+# ======================
+
+class SQLiteEngine(StorageEngine):
+    """
+    Stores each collection as a table with one row per record, so a change touches one row.
+    Tables are created on first use and populated from the collection's .dat file if it exists.
+    Reads are served from a resident copy loaded once per collection.
+    """
+
+    def __init__(self, db_file: str):
+        super().__init__()
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs every transaction, NORMAL syncs at WAL checkpoints
+        synchronous = {DURABILITY_COMMIT: "FULL", DURABILITY_NONE: "OFF"}.get(group_committer.durability, "NORMAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._collections: Dict[str, ResidentCollection] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return repr(key)
+
+    def _collection(self, name: str) -> ResidentCollection:
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+
+        with self._lock:
+            if name in self._collections:
+                return self._collections[name]
+
+            spec = get_collection_spec(name)
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            ).fetchone()
+
+            if not exists:
+                with self._conn:
+                    self._conn.execute(
+                        f'CREATE TABLE "{name}" ('
+                        "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "key TEXT NOT NULL UNIQUE, "
+                        "data BLOB NOT NULL)"
+                    )
+                    self._write_rows(name, spec, read_collection_files(spec))
+
+            rows = self._conn.execute(f'SELECT data FROM "{name}" ORDER BY seq').fetchall()
+            collection = ResidentCollection(spec, [pickle.loads(row[0]) for row in rows])
+            self._collections[name] = collection
+            return collection
+
+    def _write_rows(self, name: str, spec: CollectionSpec, items: list):
+        self._conn.executemany(
+            f'INSERT INTO "{name}" (key, data) VALUES (?, ?) '
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+            [(self._encode_key(spec.key(item)), pickle.dumps(item)) for item in items],
+        )
+
+    def _persist(self, spec: CollectionSpec, collection: ResidentCollection,
+                 changes: List[Tuple[str, Any]]) -> Optional[CommitBatch]:
+        """Write the whole batch in one transaction."""
+        name = spec.name
+        with self._lock, self._conn:
+            for op, payload in changes:
+                if op == "insert":
+                    self._write_rows(name, spec, [payload])
+                elif op == "update":
+                    self._conn.execute(
+                        f'UPDATE "{name}" SET data = ? WHERE key = ?',
+                        (pickle.dumps(payload), self._encode_key(spec.key(payload))),
+                    )
+                elif op == "delete":
+                    self._conn.execute(f'DELETE FROM "{name}" WHERE key = ?', (self._encode_key(payload),))
+                elif op == "replace":
+                    self._conn.execute(f'DELETE FROM "{name}"')
+                    self._write_rows(name, spec, payload)
+        return None
+
+    def _discard(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def close(self):
+        super().close()
+        self._conn.close()
+
+
+# ======================
+# Engine selection
+# ======================
+
+def create_storage_engine(engine_name: str) -> StorageEngine:
+    """Build the engine selected by STORAGE_ENGINE ("pickle", "memory" or "sqlite")."""
+    if engine_name == "pickle":
+        return PickleEngine()
+    if engine_name == "memory":
+        return MemoryEngine()
+    if engine_name == "sqlite":
+        return SQLiteEngine(settings.SQLITE_DB_FILE)
+    raise ValueError(f"Unknown storage engine: {engine_name}")
+
+
+storage = create_storage_engine(settings.STORAGE_ENGINE)
+atexit.register(storage.close)
@@ -0,0 +1,30 @@
+from typing import Iterable, List
+from src.storage.pair_store import PairStore
+
+
+class FollowGraph(PairStore):
+    """
+    Who follows whom: a PairStore of (follower_id, following_id) edges.
+    The forward adjacency lists who a user follows, the reverse one who follows a user.
+    """
+
+    MAGIC = b"FOLG"
+
+    def is_following(self, follower_id: int, following_id: int) -> bool:
+        return self.contains(follower_id, following_id)
+
+    def is_following_many(self, follower_id: int, following_ids: Iterable[int]) -> List[bool]:
+        """`is_following` for several users at once, in the order given."""
+        return self.contains_many(follower_id, following_ids)
+
+    def following(self, user_id: int) -> List[int]:
+        return self.targets(user_id)
+
+    def followers(self, user_id: int) -> List[int]:
+        return self.sources(user_id)
+
+    def following_count(self, user_id: int) -> int:
+        return self.out_degree(user_id)
+
+    def followers_count(self, user_id: int) -> int:
+        return self.in_degree(user_id)
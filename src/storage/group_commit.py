@@ -0,0 +1,119 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, Hashable, Optional
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Durability levels (DURABILITY setting)
+DURABILITY_COMMIT = "commit"  # writers wait until their change is written and fsynced
+DURABILITY_BATCH = "batch"  # writers return at once, each batch is written and fsynced
+DURABILITY_NONE = "none"  # writers return at once, batches are written without fsync
+DURABILITY_LEVELS = (DURABILITY_COMMIT, DURABILITY_BATCH, DURABILITY_NONE)
+
+
+class CommitBatch:
+    """Changes collected during one commit window, flushed together."""
+
+    def __init__(self):
+        self.flushes: Dict[Hashable, Callable[[bool], None]] = {}
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class GroupCommitter:
+    """
+    Coalesces bursts of writes into one flush per target.
+
+    `commit(target, flush)` registers what to write for a target (a collection file,
+    a log) in the open batch; several commits of the same target within the window
+    cost a single write. A background thread flushes the batch once the window has
+    elapsed since its first commit.
+    """
+
+    def __init__(self, window_ms: int, durability: str):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.window = window_ms / 1000
+        self.durability = durability
+        self._cond = threading.Condition()
+        self._batch: Optional[CommitBatch] = None
+        self._opened_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+        self.commits = 0
+        self.flushes = 0
+        self.batches = 0
+
+    def commit(self, target: Hashable, flush: Callable[[bool], None]) -> CommitBatch:
+        """
+        Schedule `flush(fsync)` for `target` in the open batch and return the batch.
+        Pass it to `wait` once any locks are released.
+        """
+        with self._cond:
+            if self._batch is None:
+                self._batch = CommitBatch()
+                self._opened_at = time.monotonic()
+                self._ensure_thread()
+                self._cond.notify()
+            batch = self._batch
+            batch.flushes[target] = flush
+            self.commits += 1
+        return batch
+
+    def wait(self, batch: Optional[CommitBatch]):
+        """With the "commit" durability level, block until `batch` is on disk."""
+        if batch is not None and self.durability == DURABILITY_COMMIT:
+            batch.wait()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._batch is None:
+                    self._cond.wait()
+                delay = self._opened_at + self.window - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.flush()
+
+    def flush(self):
+        """Write the open batch now (also used on shutdown)."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._batch = self._batch, None
+            if batch is None:
+                return
+
+            fsync = self.durability != DURABILITY_NONE
+            for target, flush in batch.flushes.items():
+                try:
+                    flush(fsync)
+                    self.flushes += 1
+                except Exception as e:
+                    logger.exception("Group commit of %s failed", target)
+                    batch.error = e
+
+            self.batches += 1
+            batch.done.set()
+
+    def stats(self) -> dict:
+        return {
+            "durability": self.durability,
+            "commits": self.commits,
+            "flushes": self.flushes,
+            "batches": self.batches,
+        }
+
+
+group_committer = GroupCommitter(settings.GROUP_COMMIT_WINDOW_MS, settings.DURABILITY)
@@ -0,0 +1,434 @@
+import re
+import bisect
+import threading
+import numpy as np
+from array import array
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+# ======================
+# Secondary indexes
+# ======================
+
+class Index:
+    """
+    Secondary index over one resident collection.
+    The collection calls `add` and `remove` on every change, so the index is always
+    in step with the records it was built from.
+    """
+
+    def add(self, key: Hashable, item: Any):
+        raise NotImplementedError
+
+    def remove(self, key: Hashable, item: Any):
+        raise NotImplementedError
+
+    def build(self, records: Iterable[Tuple[Hashable, Any]]):
+        """Add every (key, item) pair of a freshly loaded collection."""
+        for key, item in records:
+            self.add(key, item)
+
+    def changed(self, old: Any, new: Any) -> bool:
+        """Whether replacing `old` by `new` affects this index."""
+        return True
+
+    def snapshot(self) -> Any:
+        """Comparable copy of the index contents, used to check it against a rebuild."""
+        raise NotImplementedError
+
+
+class HashIndex(Index):
+    """Unique index: maps a value computed from each record to the record's key."""
+
+    def __init__(self, value: Callable[[Any], Hashable]):
+        self.value = value
+        self.entries: Dict[Hashable, Hashable] = {}
+
+    def add(self, key: Hashable, item: Any):
+        self.entries[self.value(item)] = key
+
+    def remove(self, key: Hashable, item: Any):
+        value = self.value(item)
+        if self.entries.get(value) == key:
+            del self.entries[value]
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self.value(old) != self.value(new)
+
+    def get(self, value: Hashable) -> Optional[Hashable]:
+        """Key of the record indexed under `value`, or None."""
+        return self.entries.get(value)
+
+    def snapshot(self) -> dict:
+        return dict(self.entries)
+
+
+class GroupIndex(Index):
+    """Non-unique index: maps a value computed from each record to the keys of every record sharing it."""
+
+    def __init__(self, group: Callable[[Any], Hashable]):
+        self.group = group
+        # Inner dicts are used as insertion-ordered sets of record keys
+        self.entries: Dict[Hashable, Dict[Hashable, None]] = {}
+
+    def add(self, key: Hashable, item: Any):
+        self.entries.setdefault(self.group(item), {})[key] = None
+
+    def remove(self, key: Hashable, item: Any):
+        group = self.group(item)
+        members = self.entries.get(group)
+        if members is None:
+            return
+        members.pop(key, None)
+        if not members:
+            del self.entries[group]
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self.group(old) != self.group(new)
+
+    def get(self, value: Hashable) -> List[Hashable]:
+        """Keys of the records indexed under `value`, in insertion order."""
+        return list(self.entries.get(value, ()))
+
+    def count(self, value: Hashable) -> int:
+        return len(self.entries.get(value, ()))
+
+    def snapshot(self) -> dict:
+        return {group: set(members) for group, members in self.entries.items()}
+
+
+class SortedGroupIndex(Index):
+    """Like GroupIndex, but keeps the keys of each group ordered by `order(item)` (then by key)."""
+
+    def __init__(self, group: Callable[[Any], Hashable], order: Callable[[Any], Any]):
+        self.group = group
+        self.order = order
+        self.entries: Dict[Hashable, List[Tuple[Any, Hashable]]] = {}
+
+    def add(self, key: Hashable, item: Any):
+        bisect.insort(self.entries.setdefault(self.group(item), []), (self.order(item), key))
+
+    def build(self, records: Iterable[Tuple[Hashable, Any]]):
+        # One sort per group instead of an insort per record, which is quadratic on large groups
+        for key, item in records:
+            self.entries.setdefault(self.group(item), []).append((self.order(item), key))
+        for members in self.entries.values():
+            members.sort()
+
+    def remove(self, key: Hashable, item: Any):
+        group = self.group(item)
+        members = self.entries.get(group)
+        if members is None:
+            return
+        entry = (self.order(item), key)
+        position = bisect.bisect_left(members, entry)
+        if position < len(members) and members[position] == entry:
+            del members[position]
+        if not members:
+            del self.entries[group]
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self.group(old) != self.group(new) or self.order(old) != self.order(new)
+
+    def get(self, value: Hashable, reverse: bool = False) -> List[Hashable]:
+        """Keys of the records indexed under `value`, in ascending order (descending if `reverse`)."""
+        members = list(self.entries.get(value, ()))
+        keys = [key for _, key in members]
+        if reverse:
+            keys.reverse()
+        return keys
+
+    def page(self, value: Hashable, before: Optional[Tuple[Any, Hashable]] = None, limit: int = 20) -> List[Hashable]:
+        """
+        Up to `limit` keys of the group in descending order, starting right below the
+        (order, key) position `before` (from the top if None). Costs O(log n + limit).
+        """
+        members = self.entries.get(value, [])
+        end = bisect.bisect_left(members, before) if before is not None else len(members)
+        return [key for _, key in reversed(members[max(0, end - limit):end])]
+
+    def count(self, value: Hashable) -> int:
+        return len(self.entries.get(value, ()))
+
+    def snapshot(self) -> dict:
+        return {group: list(members) for group, members in self.entries.items()}
+
+
+class PrefixIndex(Index):
+    """Keeps the keys of every record sorted by a string value, to find the values starting with a prefix."""
+
+    def __init__(self, value: Callable[[Any], str]):
+        self.value = value
+        self.entries: List[Tuple[str, Hashable]] = []
+
+    def add(self, key: Hashable, item: Any):
+        bisect.insort(self.entries, (self.value(item), key))
+
+    def build(self, records: Iterable[Tuple[Hashable, Any]]):
+        self.entries.extend((self.value(item), key) for key, item in records)
+        self.entries.sort()
+
+    def remove(self, key: Hashable, item: Any):
+        entry = (self.value(item), key)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self.value(old) != self.value(new)
+
+    def prefix(self, prefix: str, limit: Optional[int] = None) -> List[Hashable]:
+        """Keys of up to `limit` records whose value starts with `prefix`, in value order. Costs O(log n + limit)."""
+        entries = self.entries
+        keys = []
+        position = bisect.bisect_left(entries, (prefix,))
+        while position < len(entries) and (limit is None or len(keys) < limit):
+            value, key = entries[position]
+            if not value.startswith(prefix):
+                break
+            keys.append(key)
+            position += 1
+        return keys
+
+    def snapshot(self) -> list:
+        return list(self.entries)
+
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> List[str]:
+    """Distinct three-letter substrings of the lowercased words of `text`, each word padded with spaces."""
+    grams = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return list(grams)
+
+
+class TrigramIndex(Index):
+    """
+    Inverted index from the trigrams of a text value to the keys of the records containing
+    them, for typo-tolerant search. Record keys must be integers.
+
+    Each posting list is a sorted `array` of 32-bit keys. `similar` scores the records sharing
+    trigrams with the query; either by trigram set similarity with the whole value, or, with
+    `containment`, by the share of the query's trigrams the value contains (for long texts).
+    """
+
+    def __init__(self, value: Callable[[Any], Optional[str]], containment: bool = False):
+        self.value = lambda item: value(item) or ""
+        self.containment = containment
+        self.postings: Dict[str, array] = {}
+        self.sizes: Dict[int, int] = {}  # number of distinct trigrams of each record
+
+    def add(self, key: Hashable, item: Any):
+        grams = trigrams(self.value(item))
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = array("i", [key])
+            elif posting[-1] < key:
+                posting.append(key)
+            else:
+                position = bisect.bisect_left(posting, key)
+                if position == len(posting) or posting[position] != key:
+                    posting.insert(position, key)
+        self.sizes[key] = len(grams)
+
+    def build(self, records: Iterable[Tuple[Hashable, Any]]):
+        lists: Dict[str, List[int]] = {}
+        for key, item in records:
+            grams = trigrams(self.value(item))
+            for gram in grams:
+                lists.setdefault(gram, []).append(key)
+            self.sizes[key] = len(grams)
+        self.postings = {gram: array("i", sorted(keys)) for gram, keys in lists.items()}
+
+    def remove(self, key: Hashable, item: Any):
+        for gram in trigrams(self.value(item)):
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            position = bisect.bisect_left(posting, key)
+            if position < len(posting) and posting[position] == key:
+                del posting[position]
+            if not posting:
+                del self.postings[gram]
+        self.sizes.pop(key, None)
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self.value(old) != self.value(new)
+
+    def similar(self, query: str, limit: int, max_candidates: int, min_score: float) -> List[Tuple[int, float]]:
+        """
+        Up to `limit` (key, score) pairs scoring at least `min_score` (between 0 and 1), best first.
+
+        Posting lists are read rarest first, until they add up to `max_candidates` records; the
+        remaining (common) trigrams are only looked up for those candidates, by binary search,
+        so a query costs about the same however many records there are.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        # Copied out with tobytes: a buffer view would stop the writer from resizing the array
+        postings = [np.frombuffer(self.postings[gram].tobytes(), np.int32) for gram in grams if gram in self.postings]
+        postings.sort(key=len)
+
+        seeds, rest, seen = [], [], 0
+        for posting in postings:
+            if not seeds or seen + len(posting) <= max_candidates:
+                seeds.append(posting[:max_candidates])
+                seen += len(seeds[-1])
+            else:
+                rest.append(posting)
+        if not seeds:
+            return []
+        keys, shared = np.unique(np.concatenate(seeds), return_counts=True)
+        for posting in rest:
+            positions = np.minimum(np.searchsorted(posting, keys), len(posting) - 1)
+            shared += posting[positions] == keys
+
+        query_size = len(grams)
+        # Neither score can exceed the share of the query's trigrams found
+        keep = shared >= min_score * query_size
+        keys, shared = keys[keep], shared[keep]
+        if self.containment:
+            scores = shared / query_size
+        else:
+            sizes = np.fromiter((self.sizes.get(key, 0) for key in keys.tolist()), np.int64, len(keys))
+            scores = shared / (query_size + sizes - shared)
+        keep = scores >= min_score
+        keys, scores = keys[keep], scores[keep]
+        # Best score first, ties broken by lowest key
+        order = np.lexsort((keys, -scores))[:limit]
+        return list(zip(keys[order].tolist(), scores[order].tolist()))
+
+    def snapshot(self) -> dict:
+        return {"postings": {gram: list(posting) for gram, posting in self.postings.items()}, "sizes": dict(self.sizes)}
+
+
+class SortedMultiGroupIndex(SortedGroupIndex):
+    """Like SortedGroupIndex, but `groups(item)` puts each record in several groups (e.g. a post's categories)."""
+
+    def __init__(self, groups: Callable[[Any], Iterable[Hashable]], order: Callable[[Any], Any]):
+        super().__init__(group=None, order=order)
+        self.groups = lambda item: set(groups(item))
+
+    def add(self, key: Hashable, item: Any):
+        entry = (self.order(item), key)
+        for group in self.groups(item):
+            bisect.insort(self.entries.setdefault(group, []), entry)
+
+    def build(self, records: Iterable[Tuple[Hashable, Any]]):
+        for key, item in records:
+            entry = (self.order(item), key)
+            for group in self.groups(item):
+                self.entries.setdefault(group, []).append(entry)
+        for members in self.entries.values():
+            members.sort()
+
+    def remove(self, key: Hashable, item: Any):
+        entry = (self.order(item), key)
+        for group in self.groups(item):
+            members = self.entries.get(group)
+            if members is None:
+                continue
+            position = bisect.bisect_left(members, entry)
+            if position < len(members) and members[position] == entry:
+                del members[position]
+            if not members:
+                del self.entries[group]
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self.groups(old) != self.groups(new) or self.order(old) != self.order(new)
+
+
+class ColumnIndex(Index):
+    """
+    Columnar copy of some numeric fields of every record, one NumPy array per field,
+    for scoring many records at once with array operations. Record keys must be integers.
+
+    Each record owns a slot (the same position in every column); slots freed by
+    deletes are reused. `live` marks the slots holding a record. Columns grow by
+    doubling. Writes update the arrays in place, so readers score a `view()`, a copy
+    taken under the same lock as the writes.
+    """
+
+    def __init__(self, columns: Dict[str, Tuple[Any, Callable[[Any], Any]]], capacity: int = 1024):
+        """`columns` maps each column name to its (dtype, value function)."""
+        self.columns = columns
+        self.slots: Dict[Hashable, int] = {}
+        self._free: List[int] = []
+        self.size = 0  # slots ever used, live or free
+        self.arrays: Dict[str, np.ndarray] = {name: np.zeros(capacity, dtype) for name, (dtype, _) in columns.items()}
+        self.arrays["key"] = np.zeros(capacity, np.int64)
+        self.arrays["live"] = np.zeros(capacity, bool)
+        self._lock = threading.Lock()
+
+    def _values(self, item: Any) -> Tuple:
+        return tuple(value(item) for _, value in self.columns.values())
+
+    def _grow(self):
+        capacity = len(self.arrays["live"]) * 2
+        arrays = {}
+        for name, array in self.arrays.items():
+            grown = np.zeros(capacity, array.dtype)
+            grown[:len(array)] = array
+            arrays[name] = grown
+        self.arrays = arrays
+
+    def add(self, key: Hashable, item: Any):
+        values = self._values(item)
+        with self._lock:
+            self._add(key, values)
+
+    def _add(self, key: Hashable, values: Tuple):
+        slot = self.slots.get(key)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self.size == len(self.arrays["live"]):
+                    self._grow()
+                slot = self.size
+                self.size += 1
+            self.slots[key] = slot
+
+        arrays = self.arrays
+        for name, value in zip(self.columns, values):
+            arrays[name][slot] = value
+        arrays["key"][slot] = key
+        arrays["live"][slot] = True
+
+    def remove(self, key: Hashable, item: Any):
+        with self._lock:
+            slot = self.slots.pop(key, None)
+            if slot is not None:
+                self.arrays["live"][slot] = False
+                self._free.append(slot)
+
+    def changed(self, old: Any, new: Any) -> bool:
+        return self._values(old) != self._values(new)
+
+    def view(self) -> Dict[str, np.ndarray]:
+        """A copy of the columns (plus "key" and "live") over the used slots, taken between writes."""
+        with self._lock:
+            return {name: array[:self.size].copy() for name, array in self.arrays.items()}
+
+    def slots_of(self, keys: Iterable[Hashable], view: Dict[str, np.ndarray]) -> np.ndarray:
+        """Slots of the given keys in `view`, skipping keys without a record there."""
+        with self._lock:
+            slots = self.slots
+            found = [(slots[key], key) for key in keys if key in slots]
+        positions = np.array([slot for slot, _ in found], np.int64)
+        keys = np.array([key for _, key in found], np.int64)
+        # A slot may have been freed or reused since the view was taken
+        inside = positions < len(view["key"])
+        positions, keys = positions[inside], keys[inside]
+        return positions[view["live"][positions] & (view["key"][positions] == keys)]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            arrays = self.arrays
+            return {key: tuple(arrays[name][slot].item() for name in self.columns) for key, slot in self.slots.items()}
@@ -0,0 +1,31 @@
+from typing import Iterable, List
+from src.storage.pair_store import PairStore
+
+
+class LikeStore(PairStore):
+    """
+    Who liked what, for one kind of item (posts, comments): a PairStore of
+    (user_id, item_id) pairs.
+    """
+
+    MAGIC = b"LIKS"
+
+    def has_liked(self, user_id: int, item_id: int) -> bool:
+        return self.contains(user_id, item_id)
+
+    def has_liked_many(self, user_id: int, item_ids: Iterable[int]) -> List[bool]:
+        """`has_liked` for several items at once, in the order given."""
+        return self.contains_many(user_id, item_ids)
+
+    def likers(self, item_id: int) -> List[int]:
+        return self.sources(item_id)
+
+    def liked_by(self, user_id: int) -> List[int]:
+        return self.targets(user_id)
+
+    def count(self, item_id: int) -> int:
+        return self.in_degree(item_id)
+
+    def remove_item(self, item_id: int) -> int:
+        """Forget every like of a deleted item. Returns how many there were."""
+        return self.remove_target(item_id)
@@ -0,0 +1,472 @@
+import os
+import sys
+import logging
+import mmap
+import struct
+import bisect
+import threading
+import numpy as np
+from array import array
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from src.storage.collections import write_file_atomically
+from src.storage.group_commit import group_committer
+
+if TYPE_CHECKING:
+    from src.storage.session import StorageSession
+
+logger = logging.getLogger(__name__)
+
+# Ids are packed two per int64 as (high << 32) | low, so both must fit in 31 bits
+ID_LIMIT = 1 << 31
+LOW_MASK = (1 << 32) - 1
+
+# File header: magic, format version, byte order of the buffers (0 little, 1 big), pair count.
+# The header is 16 bytes so the int64 buffers after it stay 8-byte aligned when mapped.
+PAIR_STORE_VERSION = 1
+PAIR_STORE_HEADER = struct.Struct("<4sBB2xQ")
+
+PackedBuffer = Union[array, memoryview]
+
+
+def pack_pair(high: int, low: int) -> int:
+    if not (0 <= high < ID_LIMIT and 0 <= low < ID_LIMIT):
+        raise ValueError(f"Ids out of range for a pair store: {(high, low)}")
+    return (high << 32) | low
+
+
+# ======================
+# Sorted packed pairs
+# ======================
+
+# Changes kept aside before they are merged into the sorted buffer (and before the
+# change log is folded into a new snapshot): an eighth of the pairs, and at least MERGE_MIN
+MERGE_FRACTION = 8
+MERGE_MIN = 4096
+
+
+def merge_threshold(size: int) -> int:
+    return max(MERGE_MIN, size // MERGE_FRACTION)
+
+
+class PackedPairSet:
+    """
+    Set of (high, low) id pairs: a sorted buffer of packed int64, plus the pairs added
+    to and removed from it since the last merge, kept aside in sets grouped by high.
+    Membership is a binary search and a set lookup, and all pairs of the buffer
+    sharing `high` are one contiguous run.
+
+    A change costs a binary search; `merge` folds the pending changes into a new
+    buffer in one O(n) pass, so changes cost O(1) amortized copies instead of an
+    O(n) insert each. The buffer may be a read-only view of a mapped file.
+
+    Readers take the (buffer, added, removed) state in one read, so a merge never
+    shows them a half-swapped set. Changes must be serialized by the caller.
+    """
+
+    def __init__(self, values: Optional[PackedBuffer] = None):
+        values = values if values is not None else array("q")
+        self._state: Tuple[PackedBuffer, Dict[int, Set[int]], Dict[int, Set[int]]] = (values, {}, {})
+        self._size = len(values)
+        self.pending = 0  # pairs added or removed since the last merge
+
+    @property
+    def values(self) -> PackedBuffer:
+        """The sorted buffer, without the pending changes (`merge` first for every pair)."""
+        return self._state[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _run(values: PackedBuffer, high: int) -> Tuple[int, int]:
+        start = bisect.bisect_left(values, high << 32)
+        return start, bisect.bisect_left(values, (high + 1) << 32, start)
+
+    @staticmethod
+    def _in_buffer(values: PackedBuffer, value: int, start: int = 0, end: Optional[int] = None) -> bool:
+        end = len(values) if end is None else end
+        position = bisect.bisect_left(values, value, start, end)
+        return position < end and values[position] == value
+
+    def contains(self, high: int, low: int) -> bool:
+        value = pack_pair(high, low)
+        values, added, removed = self._state
+        if low in added.get(high, ()):
+            return True
+        if low in removed.get(high, ()):
+            return False
+        return self._in_buffer(values, value)
+
+    def contains_many(self, high: int, lows: Iterable[int]) -> List[bool]:
+        """Membership of (high, low) for each low, searching only the run of `high`."""
+        values, added, removed = self._state
+        added_lows, removed_lows = added.get(high, ()), removed.get(high, ())
+        start, end = self._run(values, high)
+        found = []
+        for low in lows:
+            value = pack_pair(high, low)
+            if low in added_lows:
+                found.append(True)
+            elif low in removed_lows:
+                found.append(False)
+            else:
+                found.append(self._in_buffer(values, value, start, end))
+        return found
+
+    def members(self, high: int) -> List[int]:
+        """Every low paired with `high`, ascending."""
+        values, added, removed = self._state
+        start, end = self._run(values, high)
+        lows = [value & LOW_MASK for value in values[start:end]]
+        removed_lows, added_lows = removed.get(high), added.get(high)
+        if removed_lows:
+            lows = [low for low in lows if low not in removed_lows]
+        if added_lows:
+            lows = sorted(lows + list(added_lows))
+        return lows
+
+    def count(self, high: int) -> int:
+        values, added, removed = self._state
+        start, end = self._run(values, high)
+        return end - start - len(removed.get(high, ())) + len(added.get(high, ()))
+
+    def add(self, high: int, low: int) -> bool:
+        value = pack_pair(high, low)
+        values, added, removed = self._state
+        removed_lows = removed.get(high)
+        if removed_lows is not None and low in removed_lows:
+            # Back in the buffer's pair
+            removed_lows.discard(low)
+            if not removed_lows:
+                del removed[high]
+            self.pending -= 1
+        elif low in added.get(high, ()) or self._in_buffer(values, value):
+            return False
+        else:
+            added.setdefault(high, set()).add(low)
+            self.pending += 1
+        self._size += 1
+        return True
+
+    def remove(self, high: int, low: int) -> bool:
+        value = pack_pair(high, low)
+        values, added, removed = self._state
+        added_lows = added.get(high)
+        if added_lows is not None and low in added_lows:
+            added_lows.discard(low)
+            if not added_lows:
+                del added[high]
+            self.pending -= 1
+        elif low in removed.get(high, ()) or not self._in_buffer(values, value):
+            return False
+        else:
+            removed.setdefault(high, set()).add(low)
+            self.pending += 1
+        self._size -= 1
+        return True
+
+    @staticmethod
+    def _packed(pairs: Dict[int, Set[int]]) -> np.ndarray:
+        packed = np.fromiter(
+            ((high << 32) | low for high, lows in pairs.items() for low in lows), dtype=np.int64
+        )
+        packed.sort()
+        return packed
+
+    def merge(self):
+        """Fold the pending changes into a new sorted buffer."""
+        values, added, removed = self._state
+        if not added and not removed:
+            return
+
+        merged = np.frombuffer(values, dtype=np.int64) if len(values) else np.empty(0, dtype=np.int64)
+        if removed:
+            # Removed pairs are all in the buffer
+            merged = np.delete(merged, np.searchsorted(merged, self._packed(removed)))
+        if added:
+            new = self._packed(added)
+            merged = np.insert(merged, np.searchsorted(merged, new), new)
+
+        buffer = array("q")
+        buffer.frombytes(merged.tobytes())
+        self._state = (buffer, {}, {})
+        self.pending = 0
+
+
+def build_pair_sets(pairs: List[Tuple[int, int]]) -> Tuple[PackedPairSet, PackedPairSet]:
+    """Build the (source, target) and (target, source) sets from (source, target) pairs."""
+    forward = PackedPairSet(array("q", sorted({pack_pair(source, target) for source, target in pairs})))
+    reverse = PackedPairSet(array("q", sorted({pack_pair(target, source) for source, target in pairs})))
+    return forward, reverse
+
+
+# ======================
+# Pair store
+# ======================
+
+class PairStore:
+    """
+    Persistent set of (source, target) id pairs, kept as two PackedPairSets:
+    (source, target) answers membership and "targets of a source", (target, source)
+    answers "sources of a target".
+
+    On disk, a snapshot holds both sorted buffers raw after a small header, and is
+    mapped back on load, so startup costs no unpickling. Changes since the snapshot
+    are appended to a log next to it, one int64 each: the packed (source, target)
+    pair when added, its complement (~pair) when removed. Once the log holds
+    `merge_threshold` changes, a new snapshot replaces both, so a commit writes what
+    changed and a full rewrite happens once per that many changes.
+
+    The first load migrates from `legacy`, which yields the (source, target) pairs
+    of the old .dat collection, when the store file does not exist yet, and writes
+    the first snapshot.
+    """
+
+    MAGIC = b"PAIR"
+
+    def __init__(self, path: str, legacy: Optional[Callable[[], Iterable[Tuple[int, int]]]] = None):
+        self.path = path
+        self.log_path = path + ".log"
+        self.legacy = legacy
+        self._forward: Optional[PackedPairSet] = None
+        self._reverse: Optional[PackedPairSet] = None
+        self._unlogged = array("q")  # changes not appended to the log yet
+        self._logged = 0  # changes in the log since the snapshot
+        self._snapshot_due = False
+        self._lock = threading.Lock()
+
+    # ----- loading -----
+
+    def _sets(self) -> Tuple[PackedPairSet, PackedPairSet]:
+        if self._forward is None:
+            with self._lock:
+                if self._forward is None:
+                    self._load()
+        return self._forward, self._reverse
+
+    def _load(self):
+        if os.path.exists(self.path):
+            forward, reverse = self._read()
+            self._reverse = PackedPairSet(reverse)
+            self._forward = PackedPairSet(forward)
+            self._replay_log()
+            return
+
+        pairs = list(self.legacy()) if self.legacy is not None else []
+        forward, self._reverse = build_pair_sets(pairs)
+        self._forward = forward
+        if pairs:
+            logger.info("Migrated %d pairs into %s", len(forward), self.path)
+        # A log without a snapshot holds the changes made since the migration
+        self._replay_log()
+        # Write the snapshot now, so later logged changes always have one to apply to
+        self._snapshot_due = True
+        group_committer.commit(self.path, self._flush)
+
+    def _read(self) -> Tuple[PackedBuffer, PackedBuffer]:
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < PAIR_STORE_HEADER.size:
+                raise ValueError(f"Truncated pair store: {self.path}")
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, big_endian, count = PAIR_STORE_HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != PAIR_STORE_VERSION:
+            raise ValueError(f"Not a {type(self).__name__} file: {self.path}")
+        if size != PAIR_STORE_HEADER.size + 2 * 8 * count:
+            raise ValueError(f"Truncated pair store: {self.path}")
+
+        view = memoryview(data)
+        start = PAIR_STORE_HEADER.size
+        buffers = [view[start:start + 8 * count], view[start + 8 * count:start + 16 * count]]
+        if big_endian == (sys.byteorder == "big"):
+            return tuple(buffer.cast("q") for buffer in buffers)
+
+        # Written on a machine with the other byte order: copy and swap
+        swapped = []
+        for buffer in buffers:
+            values = array("q")
+            values.frombytes(buffer)
+            values.byteswap()
+            swapped.append(values)
+        return tuple(swapped)
+
+    def _replay_log(self):
+        """Apply the changes logged after the snapshot (a torn change at the end is left out)."""
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        changes = array("q")
+        changes.frombytes(data[:len(data) - len(data) % 8])
+        if sys.byteorder == "big":
+            changes.byteswap()
+        for change in changes:
+            if change >= 0:
+                self._add(change >> 32, change & LOW_MASK)
+            else:
+                self._remove(~change >> 32, ~change & LOW_MASK)
+        self._logged = len(changes)
+        self._merge_if_due()
+
+    # ----- persistence -----
+
+    def _flush(self, fsync: bool):
+        with self._lock:
+            snapshot = self._snapshot_due or self._logged + len(self._unlogged) >= merge_threshold(len(self._forward))
+            if snapshot:
+                self._forward.merge()
+                self._reverse.merge()
+                forward = self._forward.values.tobytes()
+                reverse = self._reverse.values.tobytes()
+                self._unlogged, self._logged, self._snapshot_due = array("q"), 0, False
+            else:
+                changes, self._unlogged = self._unlogged, array("q")
+                self._logged += len(changes)
+
+        if not snapshot:
+            if changes:
+                self._append_log(changes, fsync)
+            return
+
+        def write(f):
+            f.write(PAIR_STORE_HEADER.pack(
+                self.MAGIC, PAIR_STORE_VERSION, sys.byteorder == "big", len(forward) // 8
+            ))
+            f.write(forward)
+            f.write(reverse)
+
+        write_file_atomically(self.path, write, fsync=fsync)
+        # Replaying the old log over the new snapshot would change nothing, so a crash here is harmless
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def _append_log(self, changes: array, fsync: bool):
+        if sys.byteorder == "big":
+            changes.byteswap()
+        with open(self.log_path, "ab") as f:
+            f.write(changes.tobytes())
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ----- reads -----
+
+    def contains(self, source: int, target: int) -> bool:
+        forward, _ = self._sets()
+        return forward.contains(source, target)
+
+    def contains_many(self, source: int, targets: Iterable[int]) -> List[bool]:
+        """`contains` for several targets of one source, in the order given."""
+        forward, _ = self._sets()
+        return forward.contains_many(source, targets)
+
+    def targets(self, source: int) -> List[int]:
+        forward, _ = self._sets()
+        return forward.members(source)
+
+    def sources(self, target: int) -> List[int]:
+        _, reverse = self._sets()
+        return reverse.members(target)
+
+    def out_degree(self, source: int) -> int:
+        forward, _ = self._sets()
+        return forward.count(source)
+
+    def in_degree(self, target: int) -> int:
+        _, reverse = self._sets()
+        return reverse.count(target)
+
+    def __len__(self) -> int:
+        forward, _ = self._sets()
+        return len(forward)
+
+    def _merged_forward(self) -> PackedBuffer:
+        forward, _ = self._sets()
+        with self._lock:
+            forward.merge()
+            return forward.values
+
+    def pairs(self) -> List[Tuple[int, int]]:
+        """Every (source, target) pair, ordered by source."""
+        return [(value >> 32, value & LOW_MASK) for value in self._merged_forward()]
+
+    def packed(self) -> bytes:
+        """Every pair packed as by `pack_pair`, ordered by source: raw native-endian int64."""
+        return self._merged_forward().tobytes()
+
+    # ----- writes -----
+
+    def _add(self, source: int, target: int) -> bool:
+        if not self._forward.add(source, target):
+            return False
+        self._reverse.add(target, source)
+        return True
+
+    def _remove(self, source: int, target: int) -> bool:
+        if not self._forward.remove(source, target):
+            return False
+        self._reverse.remove(target, source)
+        return True
+
+    def _merge_if_due(self):
+        for pairs in (self._forward, self._reverse):
+            if pairs.pending >= merge_threshold(len(pairs)):
+                pairs.merge()
+
+    def _changed(self, change: int):
+        self._unlogged.append(change)
+        self._merge_if_due()
+
+    @staticmethod
+    def _wait(batch, session: Optional["StorageSession"]):
+        # A request session waits once for all of its writes when it commits
+        if session is not None:
+            session.defer(batch)
+        else:
+            group_committer.wait(batch)
+
+    def add(self, source: int, target: int, session: Optional["StorageSession"] = None) -> bool:
+        """Add a pair. Returns False if it already existed."""
+        self._sets()
+        with self._lock:
+            if not self._add(source, target):
+                return False
+            self._changed(pack_pair(source, target))
+            batch = group_committer.commit(self.path, self._flush)
+        self._wait(batch, session)
+        return True
+
+    def remove(self, source: int, target: int, session: Optional["StorageSession"] = None) -> bool:
+        """Remove a pair. Returns False if there was none."""
+        self._sets()
+        with self._lock:
+            if not self._remove(source, target):
+                return False
+            self._changed(~pack_pair(source, target))
+            batch = group_committer.commit(self.path, self._flush)
+        self._wait(batch, session)
+        return True
+
+    def remove_target(self, target: int) -> int:
+        """Remove every pair with this target. Returns how many there were."""
+        _, reverse = self._sets()
+        with self._lock:
+            sources = reverse.members(target)
+            for source in sources:
+                self._remove(source, target)
+                self._changed(~pack_pair(source, target))
+            batch = group_committer.commit(self.path, self._flush) if sources else None
+        group_committer.wait(batch)
+        return len(sources)
+
+    def replace(self, pairs: Iterable[Tuple[int, int]]):
+        """Replace every pair at once."""
+        forward, reverse = build_pair_sets(list(pairs))
+        with self._lock:
+            self._reverse, self._forward = reverse, forward
+            self._unlogged, self._snapshot_due = array("q"), True
+            batch = group_committer.commit(self.path, self._flush)
+        group_committer.wait(batch)
@@ -0,0 +1,210 @@
+import os
+import sys
+import time
+import heapq
+import struct
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+from src.storage.collections import write_file_atomically
+from src.storage.group_commit import group_committer
+
+# File header: magic, format version, byte order of the buffer (0 little, 1 big), entry count.
+# The entries follow as (key, expiry) pairs of int64.
+REVOKED_TOKENS_VERSION = 1
+REVOKED_TOKENS_HEADER = struct.Struct("<4sBB2xQ")
+
+# Bloom filter: bits set per key (all in one 64-bit word), and words per expected key
+BLOOM_BITS_PER_KEY = 6
+BLOOM_WORDS_PER_KEY = 0.25
+
+
+def token_key(jti: str) -> int:
+    """64-bit key of a token id: its first 16 hex digits (jti are random hex strings), as a signed int64."""
+    key = int(jti[:16], 16)
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class BloomFilter:
+    """
+    Blocked Bloom filter over 64-bit keys: each key sets a few bits of a single word,
+    so a lookup reads one word. Keys are random already, so their bits are the hash.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        words = 1
+        while words < capacity * BLOOM_WORDS_PER_KEY:
+            words *= 2
+        self.words = array("Q", bytes(8 * words))
+        self.word_mask = words - 1
+
+    @staticmethod
+    def _mask(key: int) -> int:
+        mask = 0
+        # The word is picked by the low bits; the bits within it come from the high ones
+        for shift in range(64 - 6 * BLOOM_BITS_PER_KEY, 64, 6):
+            mask |= 1 << ((key >> shift) & 63)
+        return mask
+
+    def add(self, key: int):
+        self.words[key & self.word_mask] |= self._mask(key)
+
+    def might_contain(self, key: int) -> bool:
+        mask = self._mask(key)
+        return self.words[key & self.word_mask] & mask == mask
+
+
+class RevokedTokens:
+    """
+    Ids of revoked access tokens, each kept until the token expires.
+
+    A Bloom filter answers most checks (tokens that were never revoked) without touching
+    the exact set; bloom hits are confirmed in a dict. Entries are dropped once their
+    token has expired, so memory is bounded by the tokens revoked within one token
+    lifetime. The filter is sized for at least `capacity` entries and twice the live
+    ones; it is rebuilt when full, and once most of its keys have expired.
+
+    The live entries are persisted as raw (key, expiry) int64 pairs.
+    """
+
+    MAGIC = b"RVKT"
+
+    def __init__(self, path: str, capacity: int, prune_interval: float = 60.0):
+        self.path = path
+        self.capacity = capacity
+        self.prune_interval = prune_interval
+        self._expiry: Optional[Dict[int, int]] = None
+        self._expiring: List[Tuple[int, int]] = []  # heap of (expiry, key)
+        self._bloom = BloomFilter(capacity)
+        self._bloom_keys = 0  # keys added to the filter, expired ones included
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.bloom_hits = 0
+        self.revoked_hits = 0
+
+    # ----- loading -----
+
+    def _entries(self) -> Dict[int, int]:
+        if self._expiry is None:
+            with self._lock:
+                if self._expiry is None:
+                    self._load()
+        return self._expiry
+
+    def _load(self):
+        now = time.time()
+        expiry = {}
+        for key, expires_at in self._read():
+            if expires_at > now:
+                expiry[key] = expires_at
+        self._expiring = [(expires_at, key) for key, expires_at in expiry.items()]
+        heapq.heapify(self._expiring)
+        self._rebuild_bloom(expiry)
+        self._next_prune = now + self.prune_interval
+        self._expiry = expiry
+
+    def _read(self) -> List[Tuple[int, int]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if len(data) < REVOKED_TOKENS_HEADER.size:
+            raise ValueError(f"Truncated revoked tokens file: {self.path}")
+        magic, version, big_endian, count = REVOKED_TOKENS_HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != REVOKED_TOKENS_VERSION:
+            raise ValueError(f"Not a {type(self).__name__} file: {self.path}")
+        if len(data) != REVOKED_TOKENS_HEADER.size + 16 * count:
+            raise ValueError(f"Truncated revoked tokens file: {self.path}")
+
+        values = array("q")
+        values.frombytes(data[REVOKED_TOKENS_HEADER.size:])
+        if big_endian != (sys.byteorder == "big"):
+            values.byteswap()
+        return list(zip(values[0::2], values[1::2]))
+
+    def _rebuild_bloom(self, expiry: Dict[int, int]):
+        bloom = BloomFilter(max(self.capacity, 2 * len(expiry)))
+        for key in expiry:
+            bloom.add(key)
+        self._bloom, self._bloom_keys = bloom, len(expiry)
+
+    # ----- checks and revocations -----
+
+    def is_revoked(self, jti: str) -> bool:
+        expiry = self._entries()
+        if time.time() >= self._next_prune:
+            self.prune()
+        self.checks += 1
+
+        key = token_key(jti)
+        if not self._bloom.might_contain(key):
+            return False
+        self.bloom_hits += 1
+        revoked = key in expiry
+        if revoked:
+            self.revoked_hits += 1
+        return revoked
+
+    def revoke(self, jti: str, expires_at: int):
+        """Revoke the token with id `jti` until `expires_at` (its exp claim)."""
+        if expires_at <= time.time():
+            return
+        expiry = self._entries()
+        key = token_key(jti)
+        with self._lock:
+            if key not in expiry:
+                if self._bloom_keys >= self._bloom.capacity:
+                    self._rebuild_bloom(expiry)
+                expiry[key] = int(expires_at)
+                heapq.heappush(self._expiring, (int(expires_at), key))
+                self._bloom.add(key)
+                self._bloom_keys += 1
+            batch = group_committer.commit(self.path, self._flush)
+        group_committer.wait(batch)
+
+    def prune(self):
+        """Drop the entries of expired tokens."""
+        expiry = self._entries()
+        now = time.time()
+        with self._lock:
+            self._next_prune = now + self.prune_interval
+            removed = 0
+            while self._expiring and self._expiring[0][0] <= now:
+                _, key = heapq.heappop(self._expiring)
+                if expiry.pop(key, None) is not None:
+                    removed += 1
+            # Expired keys stay set in the filter; rebuild it once they are most of a full one
+            if self._bloom_keys > max(self._bloom.capacity // 2, 2 * len(expiry)):
+                self._rebuild_bloom(expiry)
+            if removed:
+                group_committer.commit(self.path, self._flush)
+
+    # ----- persistence -----
+
+    def _flush(self, fsync: bool):
+        with self._lock:
+            values = array("q")
+            for key, expires_at in self._expiry.items():
+                values.append(key)
+                values.append(expires_at)
+
+        def write(f):
+            f.write(REVOKED_TOKENS_HEADER.pack(
+                self.MAGIC, REVOKED_TOKENS_VERSION, sys.byteorder == "big", len(values) // 2
+            ))
+            f.write(values.tobytes())
+
+        write_file_atomically(self.path, write, fsync=fsync)
+
+    def stats(self) -> dict:
+        expiry = self._entries()
+        return {
+            "revoked": len(expiry),
+            "bloom_words": len(self._bloom.words),
+            "bloom_keys": self._bloom_keys,
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "revoked_hits": self.revoked_hits,
+        }
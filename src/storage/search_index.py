@@ -0,0 +1,444 @@
+import os
+import math
+import logging
+import bisect
+import time
+import zlib
+import pickle
+import threading
+import numpy as np
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from src.storage.collections import write_pickle_file
+from src.storage.group_commit import group_committer, DURABILITY_NONE
+from src.storage.indexes import WORD_PATTERN
+from src.services.ranking_service import category_bits, top_k
+
+logger = logging.getLogger(__name__)
+
+# One searchable document: (id, text, category ids)
+Document = Tuple[int, str, Optional[Iterable[int]]]
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SEGMENT_VERSION = 1
+MAX_TERM_FREQUENCY = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words of `text`."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def checksum(text: str, category_ids: Optional[Iterable[int]]) -> int:
+    """Fingerprint of a document, to tell whether the segment holds its current version."""
+    return zlib.crc32(f"{sorted(category_ids or ())}|{text}".encode())
+
+
+# ======================
+# Segments
+# ======================
+
+class Segment:
+    """
+    Immutable postings of a set of documents, numbered 0..n-1: the documents containing
+    term number t are `docs[offsets[t]:offsets[t + 1]]` (ascending), with their term
+    frequencies in `frequencies` at the same positions.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, docs: np.ndarray, frequencies: np.ndarray,
+                 ids: np.ndarray, lengths: np.ndarray, categories: np.ndarray, checksums: np.ndarray):
+        self.terms = terms
+        self.term_numbers: Dict[str, int] = {term: number for number, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.frequencies = frequencies
+        # Per document
+        self.ids = ids
+        self.lengths = lengths
+        self.categories = categories
+        self.checksums = checksums
+
+    @classmethod
+    def empty(cls) -> "Segment":
+        return cls.from_postings([], np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0, np.uint16),
+                                 np.zeros(0, np.int64), np.zeros(0, np.int32), np.zeros(0, np.int64),
+                                 np.zeros(0, np.uint32))
+
+    @classmethod
+    def from_postings(cls, terms: List[str], term_numbers: np.ndarray, docs: np.ndarray, frequencies: np.ndarray,
+                      ids: np.ndarray, lengths: np.ndarray, categories: np.ndarray, checksums: np.ndarray) -> "Segment":
+        """Group (term number, doc, frequency) postings by term; within a term they must already be in doc order."""
+        order = np.argsort(term_numbers, kind="stable")
+        offsets = np.zeros(len(terms) + 1, np.int64)
+        np.cumsum(np.bincount(term_numbers, minlength=len(terms)), out=offsets[1:])
+        return cls(terms, offsets, docs[order].astype(np.int32), frequencies[order].astype(np.uint16),
+                   ids, lengths, categories, checksums)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        number = self.term_numbers.get(term)
+        if number is None:
+            return self.docs[:0], self.frequencies[:0]
+        start, end = self.offsets[number], self.offsets[number + 1]
+        return self.docs[start:end], self.frequencies[start:end]
+
+    def state(self) -> dict:
+        return {
+            "version": SEGMENT_VERSION, "terms": self.terms, "offsets": self.offsets, "docs": self.docs,
+            "frequencies": self.frequencies, "ids": self.ids, "lengths": self.lengths,
+            "categories": self.categories, "checksums": self.checksums,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Segment":
+        return cls(state["terms"], state["offsets"], state["docs"], state["frequencies"],
+                   state["ids"], state["lengths"], state["categories"], state["checksums"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+# ======================
+# Full-text search
+# ======================
+
+class SearchIndex:
+    """
+    Inverted index over the text of documents, ranked with BM25, with an optional
+    category filter.
+
+    Postings are held in a Segment loaded from `path`, plus an in-memory tail for the
+    documents added since; a replaced or removed document is only marked dead. On load
+    the segment is reconciled with `documents()` by checksum, so only documents added or
+    changed since it was written are tokenized again. Saving merges the tail into a new
+    segment, written to the file and then swapped in, at most every `save_interval`
+    seconds and on exit.
+    """
+
+    def __init__(self, path: str, documents: Callable[[], Iterable[Document]], save_interval: float = 60.0):
+        self.path = path
+        self.documents = documents
+        self.save_interval = save_interval
+        self._segment: Optional[Segment] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.time()
+        self.searches = 0
+
+    # ----- documents -----
+
+    def load(self):
+        """Load the index now, rather than on the first search."""
+        if self._segment is None:
+            with self._lock:
+                if self._segment is None:
+                    self._load()
+
+    def _load(self):
+        segment = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") == SEGMENT_VERSION:
+                segment = Segment.from_state(state)
+        self._reset(segment or Segment.empty())
+
+        current = list(self.documents())
+        if segment is None:
+            logger.info("Building the search index of %d documents", len(current))
+            self._reset(self._tokenize_all(current))
+            self._dirty = True
+            return
+
+        seen = np.zeros(len(segment), bool)
+        changed = 0
+        for doc_id, text, category_ids in current:
+            doc = self._docs.get(doc_id)
+            if doc is not None and self._checksums[doc] == checksum(text, category_ids):
+                seen[doc] = True
+            else:
+                self._add(doc_id, text, category_ids)
+                changed += 1
+        removed = int(np.count_nonzero(self._live[:len(segment)] & ~seen))
+        for doc in np.flatnonzero(self._live[:len(segment)] & ~seen).tolist():
+            self._kill(doc)
+        if changed or removed:
+            logger.info("Search index: %d documents reindexed, %d removed since the last save", changed, removed)
+            self._dirty = True
+
+    def _reset(self, segment: Segment):
+        """Start from `segment` alone, every document in it live."""
+        size = len(segment)
+        self._segment = segment
+        self._tail: Dict[str, Tuple[array, array]] = {}
+        self._count = size
+        self._ids = segment.ids.copy()
+        self._lengths = segment.lengths.copy()
+        self._categories = segment.categories.copy()
+        self._checksums = segment.checksums.copy()
+        self._live = np.ones(size, bool)
+        self._docs: Dict[int, int] = {doc_id: doc for doc, doc_id in enumerate(segment.ids.tolist())}
+        self._live_count = size
+        self._live_length = int(segment.lengths.sum())
+
+    def _tokenize_all(self, documents: List[Document]) -> Segment:
+        terms: Dict[str, int] = {}
+        term_numbers, docs, frequencies = array("i"), array("i"), array("H")
+        lengths, categories, checksums = array("i"), array("q"), array("I")
+        for doc, (_, text, category_ids) in enumerate(documents):
+            tokens = tokenize(text)
+            for term, frequency in Counter(tokens).items():
+                term_numbers.append(terms.setdefault(term, len(terms)))
+                docs.append(doc)
+                frequencies.append(min(frequency, MAX_TERM_FREQUENCY))
+            lengths.append(len(tokens))
+            categories.append(category_bits(category_ids))
+            checksums.append(checksum(text, category_ids))
+        return Segment.from_postings(
+            list(terms), np.frombuffer(term_numbers, np.int32), np.frombuffer(docs, np.int32),
+            np.frombuffer(frequencies, np.uint16), np.array([doc_id for doc_id, _, _ in documents], np.int64),
+            np.frombuffer(lengths, np.int32).copy(), np.frombuffer(categories, np.int64).copy(),
+            np.frombuffer(checksums, np.uint32).copy(),
+        )
+
+    def _grow(self):
+        if self._count < len(self._ids):
+            return
+        capacity = max(2 * len(self._ids), 1024)
+        for name in ("_ids", "_lengths", "_categories", "_checksums", "_live"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _add(self, doc_id: int, text: str, category_ids: Optional[Iterable[int]]):
+        old = self._docs.get(doc_id)
+        if old is not None:
+            self._kill(old)
+        self._grow()
+        doc = self._count
+        self._count += 1
+
+        tokens = tokenize(text)
+        for term, frequency in Counter(tokens).items():
+            docs, frequencies = self._tail.setdefault(term, (array("i"), array("H")))
+            docs.append(doc)
+            frequencies.append(min(frequency, MAX_TERM_FREQUENCY))
+        self._ids[doc] = doc_id
+        self._lengths[doc] = len(tokens)
+        self._categories[doc] = category_bits(category_ids)
+        self._checksums[doc] = checksum(text, category_ids)
+        self._live[doc] = True
+        self._docs[doc_id] = doc
+        self._live_count += 1
+        self._live_length += len(tokens)
+
+    def _kill(self, doc: int):
+        if self._live[doc]:
+            self._live[doc] = False
+            self._live_count -= 1
+            self._live_length -= int(self._lengths[doc])
+            if self._docs.get(int(self._ids[doc])) == doc:
+                del self._docs[int(self._ids[doc])]
+
+    def add(self, doc_id: int, text: str, category_ids: Optional[Iterable[int]] = None):
+        """Index a new document, or the new version of one (the old version stops matching)."""
+        self._write(lambda: self._add(doc_id, text, category_ids))
+
+    def remove(self, doc_id: int):
+        def remove():
+            doc = self._docs.get(doc_id)
+            if doc is not None:
+                self._kill(doc)
+        self._write(remove)
+
+    def _write(self, change: Callable[[], None]):
+        now = time.time()
+        # Not loaded yet: the load will pick the change up from `documents`, which it reads
+        # only after setting the segment, so a change that sees no segment is never missed
+        if self._segment is None:
+            return
+        with self._lock:
+            change()
+            self._dirty = True
+            save = now - self._saved_at >= self.save_interval
+            if save:
+                self._saved_at = now
+
+        if save:
+            group_committer.commit(self.path, self._flush)
+
+    # ----- search -----
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        docs, frequencies = self._segment.postings(term)
+        tail = self._tail.get(term)
+        if tail is None:
+            return docs, frequencies
+        # Copied out with tobytes: a buffer view would stop later appends from resizing the array
+        return (np.concatenate((docs, np.frombuffer(tail[0].tobytes(), np.int32))),
+                np.concatenate((frequencies, np.frombuffer(tail[1].tobytes(), np.uint16))))
+
+    def search(self, query: str, limit: int, offset: int = 0,
+               category_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        (document id, score) of the best matches of `query`, best first, skipping the first
+        `offset`. With `category_ids`, only documents in at least one of them match.
+        """
+        self.load()
+        with self._lock:
+            self.searches += 1
+            if not self._live_count:
+                return []
+
+            category_mask = category_bits(category_ids) if category_ids else 0
+            average_length = max(self._live_length / self._live_count, 1.0)
+            matched_docs, matched_scores = [], []
+            for term in set(tokenize(query)):
+                docs, frequencies = self._postings(term)
+                keep = self._live[docs]
+                # Document frequency counts the live documents outside the category filter too
+                document_frequency = int(np.count_nonzero(keep))
+                if category_mask:
+                    keep &= (self._categories[docs] & np.int64(category_mask)) != 0
+                    docs, frequencies = docs[keep], frequencies[keep]
+                elif document_frequency < len(docs):
+                    docs, frequencies = docs[keep], frequencies[keep]
+                frequencies = frequencies.astype(np.float64)
+                if not len(docs):
+                    continue
+                idf = math.log(1 + (self._live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[docs] / average_length)
+                matched_docs.append(docs)
+                matched_scores.append(idf * frequencies * (BM25_K1 + 1) / (frequencies + norm))
+
+            if not matched_docs:
+                return []
+            docs, scores = self._sum_scores(matched_docs, matched_scores)
+            best = top_k(scores, offset + limit)[offset:]
+            return list(zip(self._ids[docs[best]].tolist(), scores[best].tolist()))
+
+    def _sum_scores(self, matched_docs: List[np.ndarray], matched_scores: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Total score of each document matched by any term."""
+        if len(matched_docs) == 1:
+            return matched_docs[0], matched_scores[0]
+        if sum(len(docs) for docs in matched_docs) < self._count // 16:
+            docs, positions = np.unique(np.concatenate(matched_docs), return_inverse=True)
+            return docs, np.bincount(positions, weights=np.concatenate(matched_scores))
+        # Many matches: add into a score per document number instead of sorting them
+        # (a document appears at most once in each term's postings)
+        totals = np.zeros(self._count)
+        for docs, scores in zip(matched_docs, matched_scores):
+            totals[docs] += scores
+        docs = np.flatnonzero(totals)
+        return docs, totals[docs]
+
+    # ----- persistence -----
+
+    def _snapshot(self) -> tuple:
+        """What `_merged` reads, copied out so the merge can run without the lock (call with the lock held)."""
+        count = self._count
+        tail = {term: (docs.tobytes(), frequencies.tobytes()) for term, (docs, frequencies) in self._tail.items()}
+        # Later documents are numbered from `count` on, so the columns below it never change
+        columns = (self._ids[:count], self._lengths[:count], self._categories[:count], self._checksums[:count])
+        return self._segment, count, self._live[:count].copy(), tail, columns
+
+    def _merged(self, snapshot: tuple) -> Segment:
+        """The live documents of a snapshot, renumbered, as one segment."""
+        segment, count, live, tail, (ids, lengths, categories, checksums) = snapshot
+        renumber = np.cumsum(live) - 1
+
+        tail_terms = list(tail)
+        term_numbers = dict(segment.term_numbers)
+        for term in tail_terms:
+            term_numbers.setdefault(term, len(term_numbers))
+        base_terms = np.repeat(np.arange(len(segment.terms), dtype=np.int32), np.diff(segment.offsets))
+        tail_sizes = [len(tail[term][0]) // 4 for term in tail_terms]
+        tail_term_numbers = np.repeat(np.array([term_numbers[term] for term in tail_terms], np.int32), tail_sizes)
+        tail_docs = np.frombuffer(b"".join(tail[term][0] for term in tail_terms), np.int32)
+        tail_frequencies = np.frombuffer(b"".join(tail[term][1] for term in tail_terms), np.uint16)
+
+        # Tail documents are numbered after every segment document, so each term stays in doc order
+        postings_terms = np.concatenate((base_terms, tail_term_numbers))
+        docs = np.concatenate((segment.docs, tail_docs))
+        frequencies = np.concatenate((segment.frequencies, tail_frequencies))
+        keep = live[docs]
+        postings_terms, docs, frequencies = postings_terms[keep], renumber[docs[keep]], frequencies[keep]
+
+        # Drop the terms no live document has any more
+        terms = list(term_numbers)
+        used = np.bincount(postings_terms, minlength=len(terms)) > 0
+        new_numbers = np.cumsum(used) - 1
+        return Segment.from_postings(
+            [term for term, is_used in zip(terms, used.tolist()) if is_used], new_numbers[postings_terms],
+            docs, frequencies, ids[live], lengths[live], categories[live], checksums[live],
+        )
+
+    def _install(self, snapshot: tuple, merged: Segment, merged_docs: Dict[int, int]):
+        """
+        Swap in the segment merged from `snapshot`, keeping the documents added or removed
+        since then (call with the lock held). `merged_docs` maps its ids to its documents.
+        """
+        segment, count, live = snapshot[:3]
+        if self._segment is not segment:
+            return  # Another save got there first
+        size = len(merged)
+        shift = count - size
+
+        # The merged documents that were removed since the snapshot
+        still_live = self._live[:count][live]
+        for doc in np.flatnonzero(~still_live).tolist():
+            merged_docs.pop(int(merged.ids[doc]), None)
+        # The documents added since, numbered right after the merged ones
+        for doc in range(count, self._count):
+            if self._live[doc]:
+                merged_docs[int(self._ids[doc])] = doc - shift
+
+        tail: Dict[str, Tuple[array, array]] = {}
+        for term, (docs, frequencies) in self._tail.items():
+            start = bisect.bisect_left(docs, count)
+            if start < len(docs):
+                tail[term] = (array("i", (doc - shift for doc in docs[start:])), frequencies[start:])
+
+        added = slice(count, self._count)
+        self._ids = np.concatenate((merged.ids, self._ids[added]))
+        self._lengths = np.concatenate((merged.lengths, self._lengths[added]))
+        self._categories = np.concatenate((merged.categories, self._categories[added]))
+        self._checksums = np.concatenate((merged.checksums, self._checksums[added]))
+        self._live = np.concatenate((still_live, self._live[added]))
+        self._count -= shift
+        self._segment, self._tail, self._docs = merged, tail, merged_docs
+
+    def _flush(self, fsync: bool):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = self._snapshot()
+            self._dirty = False
+
+        # Searches and writes carry on during the merge; the changes made meanwhile stay in the tail
+        merged = self._merged(snapshot)
+        write_pickle_file(self.path, merged.state(), fsync=fsync)
+        merged_docs = {doc_id: doc for doc, doc_id in enumerate(merged.ids.tolist())}
+        with self._lock:
+            self._install(snapshot, merged, merged_docs)
+
+    def save(self):
+        """Write the segment file now if anything changed since the last one."""
+        self._flush(fsync=group_committer.durability != DURABILITY_NONE)
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._segment is None:
+                return {"loaded": False, "searches": self.searches}
+            return {
+                "loaded": True,
+                "documents": self._live_count,
+                "segment_documents": len(self._segment),
+                "tail_documents": self._count - len(self._segment),
+                "terms": len(self._segment.terms) + sum(1 for term in self._tail if term not in self._segment.term_numbers),
+                "searches": self.searches,
+            }
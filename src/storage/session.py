@@ -0,0 +1,163 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from fastapi import Request
+from src.core.config import settings
+from src.storage.engines import StorageEngine, storage
+from src.storage.group_commit import CommitBatch, group_committer
+from src.storage.writer import Mutation, WriteShortcuts
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class SessionStats:
+    """Totals over every finished request session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.loads = 0
+        self.memo_hits = 0
+        self.saves = 0
+
+    def record(self, session: "StorageSession"):
+        with self._lock:
+            self.requests += 1
+            self.loads += session.loads
+            self.memo_hits += session.memo_hits
+            self.saves += session.saves
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "loads": self.loads,
+            "memo_hits": self.memo_hits,
+            "saves": self.saves,
+            "loads_per_request": self.loads / self.requests if self.requests else 0.0,
+            "saves_per_request": self.saves / self.requests if self.requests else 0.0,
+        }
+
+
+session_stats = SessionStats()
+
+
+class StorageSession(WriteShortcuts):
+    """
+    Unit of work for one request, with the same read and write methods as the engine.
+
+    Reads are memoized: a collection or record is fetched from the engine at most once
+    per request, until the request writes to that collection. Writes still go through
+    the collection writers immediately, so check-then-act sequences stay atomic, but
+    waiting for them to be durable is deferred to `commit`, once per request.
+    """
+
+    def __init__(self, engine: StorageEngine):
+        self.engine = engine
+        self._loaded: Dict[str, list] = {}
+        self._records: Dict[Tuple[str, Hashable], Any] = {}
+        self._batches: List[CommitBatch] = []
+        self.loads = 0  # reads that reached the engine
+        self.memo_hits = 0  # reads answered from this session
+        self.saves = 0  # mutations sent to the writers
+
+    # ----- reads -----
+
+    def load(self, name: str) -> list:
+        if name in self._loaded:
+            self.memo_hits += 1
+            return list(self._loaded[name])
+        self.loads += 1
+        self._loaded[name] = self.engine.load(name)
+        return list(self._loaded[name])
+
+    def get(self, name: str, key: Hashable) -> Optional[Any]:
+        record = self._records.get((name, key), MISSING)
+        if record is not MISSING:
+            self.memo_hits += 1
+            return record
+        self.loads += 1
+        record = self.engine.get(name, key)
+        self._records[(name, key)] = record
+        return record
+
+    def get_many(self, name: str, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        records = {}
+        missing = []
+        for key in keys:
+            record = self._records.get((name, key), MISSING)
+            if record is MISSING:
+                missing.append(key)
+            elif record is not None:
+                records[key] = record
+        self.memo_hits += len(records)
+
+        if missing:
+            self.loads += 1
+            found = self.engine.get_many(name, missing)
+            for key in missing:
+                self._records[(name, key)] = found.get(key)
+            records.update(found)
+        return records
+
+    def lookup(self, name: str, index: str, value: Hashable) -> Optional[Any]:
+        self.loads += 1
+        return self.engine.lookup(name, index, value)
+
+    def find(self, name: str, index: str, value: Hashable) -> list:
+        self.loads += 1
+        return self.engine.find(name, index, value)
+
+    def page(self, name: str, index: str, value: Hashable,
+             before: Optional[Tuple[Any, Hashable]] = None, limit: int = 20) -> list:
+        self.loads += 1
+        return self.engine.page(name, index, value, before, limit)
+
+    def count(self, name: str, index: str, value: Hashable) -> int:
+        self.loads += 1
+        return self.engine.count(name, index, value)
+
+    # ----- writes -----
+
+    def mutate(self, name: str, fn: Callable[[Mutation], Any]) -> Any:
+        result, batch = self.engine.submit(name, fn)
+        self.defer(batch)
+        self._forget(name)
+        return result
+
+    def defer(self, batch: Optional[CommitBatch]):
+        """Count a write and wait for its commit batch in `commit` instead of now."""
+        self.saves += 1
+        if batch is not None and batch not in self._batches:
+            self._batches.append(batch)
+
+    def _forget(self, name: str):
+        self._loaded.pop(name, None)
+        for key in [key for key in self._records if key[0] == name]:
+            del self._records[key]
+
+    def commit(self):
+        """Wait until every write of this request is as durable as the DURABILITY setting asks."""
+        batches, self._batches = self._batches, []
+        for batch in batches:
+            group_committer.wait(batch)
+
+    def stats(self) -> dict:
+        return {"loads": self.loads, "memo_hits": self.memo_hits, "saves": self.saves}
+
+
+def get_storage_session(request: Request):
+    """
+    FastAPI dependency yielding the request's StorageSession.
+    FastAPI caches dependencies per request, so every dependency asking for it shares one session.
+    """
+    session = StorageSession(storage)
+    try:
+        yield session
+    finally:
+        session.commit()
+        session_stats.record(session)
+        if settings.LOG_STORAGE_SESSIONS:
+            logger.info("%s %s: %d loads, %d memo hits, %d saves", request.method, request.url.path,
+                        session.loads, session.memo_hits, session.saves)
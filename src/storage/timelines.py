@@ -0,0 +1,249 @@
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Timeline entries sort by (created_at, post_id); the author is kept so an unfollow can prune
+TimelineEntry = Tuple[datetime, int, int]
+
+
+class Timeline:
+    """One user's home timeline: entries sorted oldest first, at most `size` of them."""
+
+    def __init__(self, entries: List[TimelineEntry], size: int, truncated: bool):
+        self.entries = entries
+        self.post_ids: Set[int] = {entry[1] for entry in entries}
+        self.size = size
+        # Older entries were dropped, so removing one leaves a gap only a rebuild can fill
+        self.truncated = truncated
+
+    def push(self, entry: TimelineEntry):
+        if entry[1] in self.post_ids:
+            return
+        bisect.insort(self.entries, entry)
+        self.post_ids.add(entry[1])
+        if len(self.entries) > self.size:
+            self.post_ids.discard(self.entries.pop(0)[1])
+            self.truncated = True
+
+    def remove(self, keep: Callable[[TimelineEntry], bool]) -> bool:
+        """Drop the entries `keep` rejects; returns whether any were dropped."""
+        entries = [entry for entry in self.entries if keep(entry)]
+        if len(entries) == len(self.entries):
+            return False
+        self.entries = entries
+        self.post_ids = {entry[1] for entry in entries}
+        return True
+
+
+# A change to one timeline; returns False when the timeline should be dropped (rebuilt on next read)
+TimelineChange = Callable[[Timeline], bool]
+
+
+class TimelineStore:
+    """
+    Precomputed home timelines (the user's own posts and those of everyone they follow).
+
+    A timeline is built on first read and then kept up to date on write: a new post is
+    pushed into the timeline of each follower of its author (fan-out on write), a follow
+    backfills the followed author's recent posts and an unfollow prunes them. Authors
+    with more than `fanout_limit` followers are never fanned out; their recent posts are
+    merged into a timeline when it is read instead.
+
+    Timelines are built without the store lock, so a build does not hold up other reads
+    and fan-outs; the changes made to a timeline while it is being built are queued and
+    replayed onto it before it is installed. Only the most recently read timelines are
+    kept in memory: at most `max_users` of them, holding at most `max_entries` entries.
+    """
+
+    def __init__(self, size: int, fanout_limit: int, max_users: int, max_entries: int,
+                 following: Callable[[int], List[int]],
+                 followers: Callable[[int], List[int]],
+                 followers_count: Callable[[int], int],
+                 recent_posts: Callable[[int, int, Optional[Tuple[datetime, int]]], List[TimelineEntry]]):
+        """
+        `recent_posts(author_id, limit, before)` returns the author's newest entries below the
+        (created_at, post_id) position `before` (or overall if None), newest first.
+        """
+        self.size = size
+        self.fanout_limit = fanout_limit
+        self.max_users = max_users
+        self.max_entries = max_entries
+        self._following = following
+        self._followers = followers
+        self._followers_count = followers_count
+        self._recent_posts = recent_posts
+        self._timelines: "OrderedDict[int, Timeline]" = OrderedDict()
+        self._entries = 0  # entries across the cached timelines
+        # Changes to replay onto the timelines being built, one list per build in progress
+        self._building: Dict[int, List[List[TimelineChange]]] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+        self.fanouts = 0
+
+    def is_celebrity(self, author_id: int) -> bool:
+        return self._followers_count(author_id) > self.fanout_limit
+
+    def _newest(self, authors: List[int], limit: int,
+                before: Optional[Tuple[datetime, int]] = None) -> List[TimelineEntry]:
+        return heapq.nlargest(limit, (
+            entry for author_id in authors for entry in self._recent_posts(author_id, limit, before)
+        ))
+
+    def _build(self, user_id: int) -> Timeline:
+        authors = [user_id] + [a for a in self._following(user_id) if not self.is_celebrity(a)]
+        entries = self._newest(authors, self.size)
+        truncated = len(entries) == self.size
+        entries.reverse()
+        return Timeline(entries, self.size, truncated)
+
+    def _timeline(self, user_id: int) -> Timeline:
+        with self._lock:
+            timeline = self._timelines.get(user_id)
+            if timeline is not None:
+                self._timelines.move_to_end(user_id)
+                self.hits += 1
+                return timeline
+            changes: List[TimelineChange] = []
+            self._building.setdefault(user_id, []).append(changes)
+
+        try:
+            timeline = self._build(user_id)
+        except BaseException:
+            with self._lock:
+                self._end_build(user_id, changes)
+            raise
+
+        with self._lock:
+            self._end_build(user_id, changes)
+            self.builds += 1
+            # Every change queued went to storage before the build read it or after, and
+            # replaying one the timeline already holds changes nothing
+            keep = all([change(timeline) for change in changes])
+            installed = self._timelines.get(user_id)
+            if installed is not None:
+                return installed  # Another read built it meanwhile
+            if keep:
+                self._timelines[user_id] = timeline
+                self._entries += len(timeline.entries)
+                self._evict()
+        return timeline
+
+    def _end_build(self, user_id: int, changes: List[TimelineChange]):
+        builds = self._building[user_id]
+        builds.remove(changes)
+        if not builds:
+            del self._building[user_id]
+
+    def _evict(self):
+        while self._timelines and (len(self._timelines) > self.max_users or self._entries > self.max_entries):
+            _, timeline = self._timelines.popitem(last=False)
+            self._entries -= len(timeline.entries)
+
+    def read(self, user_id: int, limit: int, before: Optional[Tuple[datetime, int]] = None) -> List[TimelineEntry]:
+        """
+        Up to `limit` entries of the user's timeline, newest first, starting right below the
+        (created_at, post_id) position `before`, with celebrity posts merged in.
+        """
+        timeline = self._timeline(user_id)
+        with self._lock:
+            end = bisect.bisect_left(timeline.entries, before) if before is not None else len(timeline.entries)
+            entries = timeline.entries[max(0, end - limit):end]
+            past_end = timeline.truncated and len(entries) < limit
+
+        following = self._following(user_id)
+        if past_end:
+            # Scrolled past the precomputed timeline: merge every author's posts for this page
+            return self._newest([user_id] + following, limit, before)
+
+        entries.reverse()
+        celebrities = [a for a in following if self.is_celebrity(a)]
+        if not celebrities:
+            return entries
+        merged = {entry[1]: entry for entry in entries}
+        for entry in self._newest(celebrities, limit, before):
+            merged.setdefault(entry[1], entry)
+        return heapq.nlargest(limit, merged.values())
+
+    # ----- write hooks -----
+
+    def _change(self, user_ids: List[int], change: TimelineChange):
+        """
+        Apply `change` to the users' cached timelines (dropping those it returns False for)
+        and queue it for the ones being built (call with the lock held).
+        """
+        for user_id in user_ids:
+            timeline = self._timelines.get(user_id)
+            if timeline is not None:
+                before = len(timeline.entries)
+                keep = change(timeline)
+                self._entries += len(timeline.entries) - before
+                if not keep:
+                    del self._timelines[user_id]
+                    self._entries -= len(timeline.entries)
+            for changes in self._building.get(user_id, ()):
+                changes.append(change)
+        self._evict()
+
+    def add_post(self, author_id: int, post_id: int, created_at: datetime):
+        """Fan a new post out to the author's and, unless the author is a celebrity, their followers' timelines."""
+        entry = (created_at, post_id, author_id)
+        targets = [author_id]
+        if not self.is_celebrity(author_id):
+            targets += self._followers(author_id)
+
+        def push(timeline: Timeline) -> bool:
+            timeline.push(entry)
+            self.fanouts += 1
+            return True
+
+        with self._lock:
+            self._change(targets, push)
+
+    def remove_post(self, author_id: int, post_id: int):
+        self._remove([author_id] + self._followers(author_id), lambda entry: entry[1] != post_id)
+
+    def follow(self, follower_id: int, following_id: int):
+        """Backfill the followed author's recent posts into the follower's timeline."""
+        if not self.is_celebrity(following_id):
+            self._backfill([follower_id], following_id)
+
+    def unfollow(self, follower_id: int, following_id: int):
+        self._remove([follower_id], lambda entry: entry[2] != following_id)
+        if self._followers_count(following_id) == self.fanout_limit:
+            # The author just stopped being a celebrity, so followers' timelines now hold their posts
+            self._backfill(self._followers(following_id), following_id)
+
+    def _backfill(self, user_ids: List[int], author_id: int):
+        with self._lock:
+            if not any(user_id in self._timelines or user_id in self._building for user_id in user_ids):
+                return
+        entries = self._recent_posts(author_id, self.size, None)
+
+        def push(timeline: Timeline) -> bool:
+            for entry in entries:
+                timeline.push(entry)
+            return True
+
+        with self._lock:
+            self._change(user_ids, push)
+
+    def _remove(self, user_ids: List[int], keep: Callable[[TimelineEntry], bool]):
+        def remove(timeline: Timeline) -> bool:
+            # A truncated timeline is rebuilt on next read instead, so older posts move up into the freed slots
+            return not (timeline.remove(keep) and timeline.truncated)
+
+        with self._lock:
+            self._change(user_ids, remove)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "timelines": len(self._timelines),
+            "entries": self._entries,
+            "builds": self.builds,
+            "hits": self.hits,
+            "fanouts": self.fanouts,
+        }
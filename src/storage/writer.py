@@ -0,0 +1,193 @@
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+from src.storage.collections import ResidentCollection
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+REPLACED = object()
+LAST_ID = object()
+
+
+class Mutation:
+    """
+    Handle a mutation function receives to change one collection.
+
+    Every operation is applied to the resident collection immediately, so later
+    operations in the same mutation see earlier ones. The effective changes are
+    recorded for persistence, and undone if the mutation function raises.
+    """
+
+    def __init__(self, collection: ResidentCollection):
+        self.collection = collection
+        self.changes: List[Tuple[str, Any]] = []
+        self._undo: List[Tuple[Hashable, Any]] = []
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self.collection.get(key)
+
+    def items(self) -> list:
+        return self.collection.items()
+
+    def _remember(self, key: Hashable):
+        self._undo.append((key, self.collection.records.get(key, MISSING)))
+
+    def insert(self, item: Any):
+        self._remember(self.collection.spec.key(item))
+        self.collection.insert(item)
+        self.changes.append(("insert", item))
+
+    def update(self, item: Any) -> bool:
+        key = self.collection.spec.key(item)
+        if key not in self.collection.records:
+            return False
+        self._remember(key)
+        self.collection.update(item)
+        self.changes.append(("update", item))
+        return True
+
+    def delete(self, key: Hashable) -> bool:
+        if key not in self.collection.records:
+            return False
+        self._remember(key)
+        self.collection.delete(key)
+        self.changes.append(("delete", key))
+        return True
+
+    def new_id(self) -> int:
+        """Allocate an integer key above every key the collection has held."""
+        self._undo.append((LAST_ID, self.collection.last_id))
+        self.collection.last_id += 1
+        return self.collection.last_id
+
+    def replace(self, items: list):
+        self._undo.append((REPLACED, self.collection.items()))
+        self.collection.replace(items)
+        self.changes.append(("replace", list(items)))
+
+    def rollback(self):
+        # Undo through the collection so its indexes follow
+        for key, previous in reversed(self._undo):
+            if key is REPLACED:
+                self.collection.replace(previous)
+            elif key is LAST_ID:
+                self.collection.last_id = previous
+            elif previous is MISSING:
+                self.collection.delete(key)
+            else:
+                self.collection.insert(previous)
+        self.changes = []
+
+
+class CollectionWriter:
+    """
+    The single writer of one collection.
+
+    Mutations are queued and applied in order by one thread, so a check-then-act
+    sequence (is it liked? then like it) cannot interleave with another request.
+    The thread drains whatever is queued, applies it, and persists the whole batch
+    with one call. Readers never wait for it: they read the resident collection,
+    where every change lands atomically.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        collection: Callable[[], ResidentCollection],
+        persist: Callable[[ResidentCollection, List[Tuple[str, Any]]], Any],
+        discard: Callable[[], None],
+        max_batch: int = 256,
+    ):
+        self.name = name
+        self._collection = collection
+        self._persist = persist
+        self._discard = discard
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Tuple[Callable[[Mutation], Any], Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"writer-{name}", daemon=True)
+        self._thread.start()
+        self.mutations = 0
+        self.batches = 0
+
+    def submit(self, fn: Callable[[Mutation], Any]) -> Future:
+        """Queue `fn(mutation)`; the future resolves to (result, commit batch)."""
+        future: Future = Future()
+        if threading.current_thread() is self._thread:
+            # A mutation that mutates its own collection again runs inline
+            mutation = Mutation(self._collection())
+            future.set_result((fn(mutation), self._persist(mutation.collection, mutation.changes)))
+            return future
+
+        self._queue.put((fn, future))
+        return future
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.max_batch:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(jobs)
+
+    def _apply(self, jobs: list):
+        collection = self._collection()
+        changes: List[Tuple[str, Any]] = []
+        results = []
+
+        for fn, future in jobs:
+            mutation = Mutation(collection)
+            try:
+                result = fn(mutation)
+            except BaseException as e:
+                mutation.rollback()
+                future.set_exception(e)
+                continue
+            changes.extend(mutation.changes)
+            results.append((future, result))
+
+        self.mutations += len(jobs)
+        self.batches += 1
+
+        try:
+            commit = self._persist(collection, changes) if changes else None
+        except BaseException as e:
+            logger.exception("Persisting %s failed", self.name)
+            self._discard()
+            for future, _ in results:
+                future.set_exception(e)
+            return
+
+        for future, result in results:
+            future.set_result((result, commit))
+
+
+class WriteShortcuts:
+    """Single-change writes built on `mutate`, shared by the engines and request sessions."""
+
+    def mutate(self, name: str, fn: Callable[[Mutation], Any]) -> Any:
+        raise NotImplementedError
+
+    def insert(self, name: str, item: Any):
+        """Append a record (replaces any record with the same key)."""
+        self.mutate(name, lambda mutation: mutation.insert(item))
+
+    def update(self, name: str, item: Any) -> bool:
+        """Replace the record with the same key. Returns False if there is none."""
+        return self.mutate(name, lambda mutation: mutation.update(item))
+
+    def update_many(self, name: str, items: list) -> int:
+        """Replace several records at once. Returns how many were found."""
+        return self.mutate(name, lambda mutation: sum(1 for item in items if mutation.update(item)))
+
+    def delete(self, name: str, key: Hashable) -> bool:
+        """Remove the record stored under `key`. Returns False if there is none."""
+        return self.mutate(name, lambda mutation: mutation.delete(key))
+
+    def save(self, name: str, items: list):
+        """Replace the whole collection."""
+        self.mutate(name, lambda mutation: mutation.replace(list(items)))
@@ -0,0 +1,25 @@
+import os
+import atexit
+import sys
+import tempfile
+
+# The app reads its settings when first imported and keeps its data under database/
+# relative to the working directory: point both at a scratch directory before any
+# test module imports src
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.chdir(DATA_DIR)
+os.makedirs("database")
+os.makedirs("uploads")
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("UPLOAD_DIR", "uploads/")
+os.environ.setdefault("UPLOAD_FILES_PREFIX", "/")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # Registered after the app's own exit handlers, so it runs before them: their
+    # final saves go to the scratch directory, whatever the working directory is by then
+    atexit.register(os.chdir, DATA_DIR)
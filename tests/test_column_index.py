@@ -0,0 +1,37 @@
+import numpy as np
+from src.storage.indexes import ColumnIndex
+
+
+def make_index(capacity: int = 2) -> ColumnIndex:
+    return ColumnIndex({"score": (np.int64, lambda item: item["score"])}, capacity=capacity)
+
+
+def test_a_view_is_not_changed_by_later_writes():
+    index = make_index()
+    index.add(1, {"score": 10})
+    index.add(2, {"score": 20})
+    view = index.view()
+
+    index.add(1, {"score": 11})
+    index.remove(2, {"score": 20})
+    index.add(3, {"score": 30})  # reuses the slot of 2
+    index.add(4, {"score": 40})  # grows the columns
+
+    assert view["score"].tolist() == [10, 20]
+    assert view["key"].tolist() == [1, 2]
+    assert view["live"].tolist() == [True, True]
+    assert index.snapshot() == {1: (11,), 3: (30,), 4: (40,)}
+
+
+def test_slots_of_skips_keys_without_a_record_in_the_view():
+    index = make_index()
+    for key in (1, 2, 3):
+        index.add(key, {"score": key})
+    view = index.view()
+
+    index.remove(2, {"score": 2})
+    index.add(5, {"score": 5})  # reuses the slot 2 had in the view
+    index.add(6, {"score": 6})  # not in the view at all
+
+    slots = index.slots_of([1, 2, 3, 5, 6, 7], view)
+    assert view["key"][slots].tolist() == [1, 3]
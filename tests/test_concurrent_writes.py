@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterable, List
+from src.crud.posts_and_comments_crud import create_new_post, dislike_post, get_post_by_id, like_post, post_likes
+from src.crud.users_crud import count_followers_of_user, follow, get_user_by_id, insert_new_user, unfollow
+from src.schemas.posts import PostSchema
+from src.schemas.users import UserSchema
+
+THREADS = 16
+
+
+def run_concurrently(fn: Callable, calls: Iterable[tuple]) -> List:
+    """Run `fn(*args)` for every args tuple from a pool of threads, returning the results in order."""
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(lambda args: fn(*args), calls))
+
+
+def make_users(first_id: int, count: int) -> List[int]:
+    user_ids = list(range(first_id, first_id + count))
+    for user_id in user_ids:
+        assert insert_new_user(UserSchema(
+            user_id=user_id,
+            email=f"user{user_id}@example.com",
+            username=f"user{user_id}",
+            password="hashed",
+            created_at=datetime.utcnow()
+        ))
+    return user_ids
+
+
+def make_post(user_id: int, content: str = "") -> PostSchema:
+    return create_new_post(PostSchema(
+        post_id=0,
+        user_id=user_id,
+        content=content,
+        media_url="",
+        created_at=datetime.utcnow()
+    ))
+
+
+def test_concurrent_posts_get_unique_ids():
+    [author] = make_users(1000, 1)
+
+    posts = run_concurrently(make_post, [(author, f"post number {i}") for i in range(200)])
+
+    post_ids = [post.post_id for post in posts]
+    assert len(set(post_ids)) == len(post_ids)
+    for post in posts:
+        assert get_post_by_id(post.post_id).content == post.content
+    assert get_user_by_id(author).posts_count == 200
+
+
+def test_concurrent_likes_and_dislikes():
+    [author] = make_users(2000, 1)
+    likers = make_users(2001, 100)
+    post_id = make_post(author, "liked from many threads").post_id
+
+    # Every user likes twice: only one like each may count
+    liked = run_concurrently(like_post, [(user_id, post_id) for user_id in likers * 2])
+    assert liked.count(True) == 100
+    assert get_post_by_id(post_id).likes_nbr == 100
+    assert post_likes.count(post_id) == 100
+
+    dislikers = likers[:40]
+    disliked = run_concurrently(dislike_post, [(user_id, post_id) for user_id in dislikers * 2])
+    assert disliked.count(True) == 40
+    assert get_post_by_id(post_id).likes_nbr == 60
+    assert sorted(post_likes.likers(post_id)) == likers[40:]
+
+
+def test_concurrent_follows_and_unfollows():
+    [target] = make_users(3000, 1)
+    followers = make_users(3001, 100)
+
+    followed = run_concurrently(follow, [(user_id, target) for user_id in followers * 2])
+    assert followed.count(True) == 100
+    assert get_user_by_id(target).followers_count == 100
+    assert count_followers_of_user(target) == 100
+
+    unfollowed = run_concurrently(unfollow, [(user_id, target) for user_id in followers[:40] * 2])
+    assert unfollowed.count(True) == 40
+    assert get_user_by_id(target).followers_count == 60
+    assert count_followers_of_user(target) == 60
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from conftest import ROOT
+
+FOLLOW = """
+from datetime import datetime
+from src.crud.users_crud import follow, insert_new_user, unfollow
+from src.schemas.users import UserSchema
+
+for user_id in range(5):
+    insert_new_user(UserSchema(user_id=user_id, email=f"user{user_id}@example.com", username=f"user{user_id}",
+                               password="hashed", created_at=datetime.utcnow()))
+for user_id in range(1, 5):
+    follow(user_id, 0)
+unfollow(2, 0)
+follow(0, 1)
+"""
+
+REPORT = """
+import json
+from src.crud.users_crud import follow_graph, get_user_by_id
+
+print(json.dumps({
+    "pairs": follow_graph.pairs(),
+    "counters": {user_id: get_user_by_id(user_id).followers_count for user_id in range(5)},
+    "graph": {user_id: follow_graph.followers_count(user_id) for user_id in range(5)},
+}))
+"""
+
+
+def run_app_process(script: str, data_dir, engine: str) -> str:
+    """Run `script` in a fresh process using `data_dir` as the app's working directory."""
+    env = dict(os.environ, STORAGE_ENGINE=engine, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(script)], cwd=data_dir, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.mark.parametrize("engine", ["pickle", "memory", "sqlite"])
+def test_follows_and_follower_counts_survive_a_restart(engine, tmp_path):
+    (tmp_path / "database").mkdir()
+    (tmp_path / "uploads").mkdir()
+    run_app_process(FOLLOW, tmp_path, engine)
+
+    report = json.loads(run_app_process(REPORT, tmp_path, engine).splitlines()[-1])
+    assert report["pairs"] == [[0, 1], [1, 0], [3, 0], [4, 0]]
+    assert report["graph"] == {"0": 3, "1": 1, "2": 0, "3": 0, "4": 0}
+    # The stored counters agree with the graph
+    assert report["counters"] == report["graph"]
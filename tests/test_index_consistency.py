@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from src.crud.posts_and_comments_crud import POSTS
+from src.crud.users_crud import USERS
+from src.schemas.posts import PostSchema
+from src.schemas.users import UserSchema
+from src.storage.collections import get_collection_spec, register_collection
+from src.storage.engines import create_storage_engine
+
+ENGINES = ["pickle", "memory", "sqlite"]
+WORDS = ["alice", "alina", "bob", "bobby", "carol", "dave", "eve", "photo", "travel", "music"]
+START = datetime(2024, 1, 1)
+
+
+def random_post(rng: random.Random, post_id: int) -> PostSchema:
+    return PostSchema(
+        post_id=post_id,
+        user_id=rng.randint(1, 10),
+        content=" ".join(rng.sample(WORDS, 3)),
+        media_url="",
+        # Few distinct timestamps, so the sorted indexes see ties
+        created_at=START + timedelta(minutes=rng.randint(0, 50)),
+        likes_nbr=rng.randint(0, 100),
+        comments_nbr=rng.randint(0, 10),
+        categories=rng.sample(range(1, 8), rng.randint(0, 3))
+    )
+
+
+def random_user(rng: random.Random, user_id: int) -> UserSchema:
+    return UserSchema(
+        user_id=user_id,
+        email=f"{rng.choice(WORDS)}.{user_id}@example.com",
+        username=f"{rng.choice(WORDS)}{rng.randint(0, 20)}",
+        password="hashed",
+        bio=" ".join(rng.sample(WORDS, rng.randint(0, 4))),
+        created_at=START
+    )
+
+
+# Collections with the indexes of the posts and users collections, stored apart for each engine
+CHECKED = {
+    (engine, kind): register_collection(
+        f"index_check_{engine}_{kind}", f"database/index_check_{engine}_{kind}.dat",
+        key=get_collection_spec(source).key, indexes=get_collection_spec(source).indexes
+    )
+    for engine in ENGINES
+    for kind, source in (("posts", POSTS), ("users", USERS))
+}
+RECORDS = {"posts": random_post, "users": random_user}
+
+
+def random_changes(rng: random.Random, make_record, keys: list, next_key: int):
+    """A mutation function making a few random inserts, updates and deletes."""
+    def apply(mutation):
+        for _ in range(rng.randint(1, 5)):
+            action = rng.random()
+            if action < 0.4 or not keys:
+                mutation.insert(make_record(rng, next_key + len(inserted)))
+                inserted.append(next_key + len(inserted))
+            elif action < 0.75:
+                mutation.update(make_record(rng, rng.choice(keys)))
+            else:
+                mutation.delete(rng.choice(keys))
+
+    inserted: list = []
+    return apply, inserted
+
+
+@pytest.mark.parametrize("kind", ["posts", "users"])
+@pytest.mark.parametrize("engine_name", ENGINES)
+def test_indexes_match_records_after_random_changes(engine_name, kind, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "database").mkdir()
+    name = CHECKED[engine_name, kind]
+    key = get_collection_spec(name).key
+    make_record = RECORDS[kind]
+    rng = random.Random(f"{engine_name}-{kind}")
+    storage = create_storage_engine(engine_name)
+
+    next_key = 1
+    for round_number in range(300):
+        keys = [key(record) for record in storage.load(name)]
+        apply, inserted = random_changes(rng, make_record, keys, next_key)
+        if round_number % 10 == 9:
+            # A failing mutation is rolled back, indexes included
+            def failing(mutation, apply=apply):
+                apply(mutation)
+                raise ValueError("rolled back")
+            with pytest.raises(ValueError):
+                storage.mutate(name, failing)
+        else:
+            storage.mutate(name, apply)
+            next_key += len(inserted)
+
+    assert storage.load(name)
+    assert storage.check_indexes(name) == []
+
+    records = {key(record): record for record in storage.load(name)}
+    storage.close()
+
+    # The indexes built from the persisted records agree with them too (a rolled back
+    # delete puts the record back at the end, so only the records are compared, not their order)
+    reopened = create_storage_engine(engine_name)
+    assert {key(record): record for record in reopened.load(name)} == records
+    assert reopened.check_indexes(name) == []
+    reopened.close()
@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import List
+import pytest
+from fastapi.testclient import TestClient
+from src.core.pagination import CURSOR_ENGAGEMENT, encode_cursor, make_page
+from src.core.security import create_access_token
+from src.crud.users_crud import follow
+from src.main import app
+from test_concurrent_writes import make_post, make_users
+
+client = TestClient(app)
+
+LIMIT = 3
+
+
+@pytest.fixture(scope="module")
+def author_and_viewer():
+    author, viewer = make_users(9000, 2)
+    follow(viewer, author)
+    for index in range(2 * LIMIT):
+        make_post(author, f"pagination post {index}")
+    return author, {"Authorization": "Bearer " + create_access_token({"sub": str(viewer)})}
+
+
+def read_pages(url: str, headers: dict, **params) -> List[dict]:
+    """Every page of a listing, following next_cursor from one page to the next."""
+    pages, cursor = [], None
+    while True:
+        response = client.get(url, headers=headers, params=dict(params, limit=LIMIT, cursor=cursor))
+        assert response.status_code == 200, response.text
+        page = response.json()["data"]
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_make_page_ends_on_a_full_last_page():
+    assert make_page([1, 2, 3], 3, lambda item: (datetime.utcnow(), item)).next_cursor is None
+    assert make_page([1, 2, 3, 4], 3, lambda item: (datetime.utcnow(), item)).next_cursor is not None
+
+
+def test_pages_end_exactly_at_a_page_boundary(author_and_viewer):
+    author, headers = author_and_viewer
+    pages = read_pages(f"/posts/{author}", headers)
+
+    assert [len(page["items"]) for page in pages] == [LIMIT, LIMIT]
+    post_ids = [post["post_id"] for page in pages for post in page["items"]]
+    assert post_ids == sorted(post_ids, reverse=True)
+    assert len(set(post_ids)) == 2 * LIMIT
+
+
+def test_engagement_pages_cover_the_feed_without_repeats(author_and_viewer):
+    author, headers = author_and_viewer
+    pages = read_pages("/feed", headers, rank="engagement")
+
+    assert [len(page["items"]) for page in pages] == [LIMIT, LIMIT]
+    post_ids = {post["post_id"] for page in pages for post in page["items"]}
+    assert post_ids == {post["post_id"] for page in read_pages(f"/posts/{author}", headers) for post in page["items"]}
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", encode_cursor(datetime.utcnow(), 1)[:-2]])
+def test_invalid_cursors_are_rejected(author_and_viewer, cursor):
+    author, headers = author_and_viewer
+    response = client.get(f"/posts/{author}", headers=headers, params={"limit": LIMIT, "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_cursors_are_only_accepted_by_the_listing_that_issued_them(author_and_viewer):
+    author, headers = author_and_viewer
+    recent_cursor = read_pages(f"/posts/{author}", headers)[0]["next_cursor"]
+    ranked_cursor = encode_cursor(datetime.utcnow(), LIMIT, CURSOR_ENGAGEMENT)
+
+    for url in ("/feed", "/feed/explore"):
+        assert client.get(url, headers=headers, params={"cursor": recent_cursor}).status_code == 200
+        assert client.get(url, headers=headers, params={"cursor": ranked_cursor, "rank": "engagement"}).status_code == 200
+        assert client.get(url, headers=headers, params={"cursor": ranked_cursor}).status_code == 400
+        assert client.get(url, headers=headers, params={"cursor": recent_cursor, "rank": "engagement"}).status_code == 400
+    assert client.get(f"/posts/{author}", headers=headers, params={"cursor": ranked_cursor}).status_code == 400
+
+
+def test_search_cursors_are_only_accepted_by_search(author_and_viewer):
+    author, headers = author_and_viewer
+    params = {"q": "pagination", "limit": LIMIT}
+    pages = [client.get("/posts/search", headers=headers, params=params).json()["data"]]
+    while pages[-1]["next_cursor"] is not None:
+        pages.append(client.get("/posts/search", headers=headers,
+                                params=dict(params, cursor=pages[-1]["next_cursor"])).json()["data"])
+
+    post_ids = [post["post_id"] for page in pages for post in page["items"]]
+    assert len(post_ids) == len(set(post_ids)) >= 2 * LIMIT
+    search_cursor = pages[0]["next_cursor"]
+    assert client.get(f"/posts/{author}", headers=headers, params={"cursor": search_cursor}).status_code == 400
+    assert client.get("/feed", headers=headers, params={"cursor": search_cursor, "rank": "engagement"}).status_code == 400
+    recent_cursor = read_pages(f"/posts/{author}", headers)[0]["next_cursor"]
+    assert client.get("/posts/search", headers=headers, params=dict(params, cursor=recent_cursor)).status_code == 400
@@ -0,0 +1,92 @@
+import os
+import random
+from src.storage.group_commit import group_committer
+from src.storage.like_store import LikeStore
+from src.storage.pair_store import MERGE_MIN, PairStore
+
+
+def reopened(store: PairStore) -> PairStore:
+    """A fresh store on the same files, as after a restart."""
+    group_committer.flush()
+    return type(store)(store.path)
+
+
+def test_pairs_survive_a_restart_before_the_first_snapshot(tmp_path):
+    store = PairStore(str(tmp_path / "pairs.bin"))
+    assert store.add(1, 10)
+    assert store.add(2, 10)
+    assert store.remove(2, 10)
+
+    store = reopened(store)
+    assert store.pairs() == [(1, 10)]
+    assert os.path.exists(store.path)
+
+
+def test_legacy_pairs_and_logged_changes_survive_a_restart(tmp_path):
+    path = str(tmp_path / "pairs.bin")
+    store = PairStore(path, legacy=lambda: [(1, 10), (1, 11)])
+    store.add(3, 10)
+    store.remove(1, 11)
+    group_committer.flush()
+
+    store = PairStore(path, legacy=lambda: [(9, 9)])
+    assert store.pairs() == [(1, 10), (3, 10)]
+
+
+def test_a_log_without_its_snapshot_is_replayed(tmp_path):
+    # The layout older versions left behind: changes logged, no snapshot written
+    store = PairStore(str(tmp_path / "pairs.bin"))
+    store.add(5, 6)
+    group_committer.flush()
+    store.add(7, 8)
+    group_committer.flush()
+    os.remove(store.path)
+
+    store = reopened(store)
+    assert store.pairs() == [(7, 8)]
+    assert reopened(store).pairs() == [(7, 8)]
+
+
+def test_many_changes_survive_snapshots_and_restarts(tmp_path):
+    rng = random.Random(8)
+    store = PairStore(str(tmp_path / "pairs.bin"))
+    expected = set()
+    # Enough changes to fold the log into new snapshots several times
+    for round_number in range(4):
+        for _ in range(MERGE_MIN):
+            pair = (rng.randrange(200), rng.randrange(200))
+            if rng.random() < 0.7:
+                assert store.add(*pair) == (pair not in expected)
+                expected.add(pair)
+            else:
+                assert store.remove(*pair) == (pair in expected)
+                expected.discard(pair)
+        store = reopened(store)
+        assert store.pairs() == sorted(expected)
+        assert len(store) == len(expected)
+        assert sorted(store.sources(7)) == sorted(source for source, target in expected if target == 7)
+
+
+def test_a_torn_change_at_the_end_of_the_log_is_ignored(tmp_path):
+    store = PairStore(str(tmp_path / "pairs.bin"))
+    group_committer.flush()
+    store.add(1, 2)
+    group_committer.flush()
+    with open(store.log_path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    assert reopened(store).pairs() == [(1, 2)]
+
+
+def test_likes_survive_a_restart(tmp_path):
+    likes = LikeStore(str(tmp_path / "likes.bin"))
+    for user_id in (1, 2, 3):
+        likes.add(user_id, 100)
+    likes.add(1, 200)
+    assert likes.remove_item(200) == 1
+
+    likes = reopened(likes)
+    assert likes.count(100) == 3
+    assert likes.likers(100) == [1, 2, 3]
+    assert likes.liked_by(1) == [100]
+    assert likes.has_liked_many(2, [100, 200]) == [True, False]
@@ -0,0 +1,40 @@
+import os
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from src.services.password_hashing import PasswordHasher, PasswordHasherBusy, pwd_context
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=2, max_pending=2)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hashes_made_in_the_pool_verify_anywhere(hasher):
+    hashed = asyncio.run(hasher.hash("secret"))
+
+    assert pwd_context.verify("secret", hashed)
+    assert asyncio.run(hasher.verify("secret", hashed))
+    assert not asyncio.run(hasher.verify("other", hashed))
+    assert hasher.stats()["completed"] == 3
+
+
+def test_hashes_over_the_pending_limit_are_refused_at_once(hasher):
+    async def burst():
+        return await asyncio.gather(*(hasher.hash(f"secret{n}") for n in range(6)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+
+    assert sum(isinstance(result, str) for result in results) == 2
+    assert sum(isinstance(result, PasswordHasherBusy) for result in results) == 4
+    assert hasher.stats()["rejected"] == 4
+    assert hasher.stats()["pending"] == 0
+
+
+def test_the_pool_is_replaced_after_a_worker_dies(hasher):
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(hasher._run(os._exit, 1))
+
+    assert pwd_context.verify("secret", asyncio.run(hasher.hash("secret")))
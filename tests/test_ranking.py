@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from src.services.ranking_service import TOP_K_SAMPLE, top_k
+
+
+@pytest.mark.parametrize("size", [10, 1000, 32 * TOP_K_SAMPLE])
+def test_top_k_matches_a_full_sort_with_ties_to_the_lower_position(size):
+    scores = np.random.default_rng(size).integers(0, 5, size).astype(np.float64)
+    ranked = np.lexsort((np.arange(size), -scores))
+
+    for k in (1, 3, 7, 50, size // 64, size):
+        assert top_k(scores, k).tolist() == ranked[:k].tolist()
+
+
+def test_pages_of_tied_scores_neither_repeat_nor_skip():
+    scores = np.ones(10)
+    pages = [top_k(scores, offset + 3)[offset:].tolist() for offset in range(0, 10, 3)]
+    assert sum(pages, []) == list(range(10))
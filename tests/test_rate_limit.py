@@ -0,0 +1,101 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.core.rate_limit import ConcurrencyLimiter, RateLimiter, RateLimitMiddleware, TokenBuckets
+from src.core.security import create_access_token
+
+
+def test_buckets_allow_a_burst_then_the_rate():
+    buckets = TokenBuckets(rate=2, burst=3, max_keys=100)
+
+    assert [buckets.take("a", 0.0) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("a", 0.0) == 0.5
+    assert buckets.take("b", 0.0) == 0
+    assert buckets.take("a", 0.5) == 0
+    assert buckets.take("a", 0.5) == 0.5
+    # Idle time refills up to the burst only
+    assert [buckets.take("a", 100.0) for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+def test_buckets_are_bounded_by_max_keys():
+    buckets = TokenBuckets(rate=1, burst=2, max_keys=8)
+    for second in range(100):
+        buckets.take(second, float(second) / 10)
+        assert len(buckets) <= 8
+    # The latest keys are kept, with their spent tokens
+    assert buckets.take(99, 9.9) == 0
+
+
+def test_requests_over_the_cap_wait_for_a_slot_or_are_shed():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_limit=2, queue_timeout=0.05)
+        assert await limiter.acquire() and await limiter.acquire()
+
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        assert await waiting
+        assert limiter.in_flight == 2
+
+        # Nobody leaves: the next one times out, and the ones right after it are refused without waiting
+        assert not await limiter.acquire()
+        assert not await limiter.acquire()
+        assert limiter.queued == 2 and limiter.shed == 2
+        await asyncio.sleep(0.06)
+        limiter.release(0.01)
+        assert await limiter.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_the_cap_shrinks_when_latency_rises_and_grows_back():
+    limiter = ConcurrencyLimiter(max_limit=4, queue_timeout=0.05)
+
+    def round_of(latency: float):
+        for _ in range(int(limiter.limit)):
+            limiter.in_flight += 1
+            limiter.release(latency)
+
+    round_of(0.01)
+    assert limiter.limit == 4
+    round_of(0.1)
+    assert limiter.limit == 2
+    round_of(0.1)
+    assert limiter.limit == 1
+    round_of(0.01)
+    round_of(0.01)
+    assert limiter.limit == 3
+
+
+def make_client(**limit) -> TestClient:
+    app = FastAPI()
+    app.get("/limited")(lambda: {"ok": True})
+    app.get("/free")(lambda: {"ok": True})
+    limits = dict({"user_rate": 0.001, "user_burst": 2, "route_rate": 0.001, "route_burst": 100, "concurrency": 4}, **limit)
+    app.add_middleware(RateLimitMiddleware, limiter=RateLimiter({"GET /limited": limits}, 0.05, 100))
+    return TestClient(app)
+
+
+def signed_in(user_id: int) -> dict:
+    return {"Authorization": "Bearer " + create_access_token({"sub": str(user_id)})}
+
+
+def test_each_user_gets_their_own_rate():
+    client = make_client()
+
+    assert [client.get("/limited", headers=signed_in(1)).status_code for _ in range(3)] == [200, 200, 429]
+    limited = client.get("/limited", headers=signed_in(1))
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
+    # A new token of the same user shares the bucket; other users and routes are not affected
+    assert client.get("/limited", headers=signed_in(1)).status_code == 429
+    assert client.get("/limited", headers=signed_in(2)).status_code == 200
+    assert client.get("/free", headers=signed_in(1)).status_code == 200
+    # Signed out requests are limited by client address
+    assert [client.get("/limited").status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_the_route_as_a_whole_is_limited_too():
+    client = make_client(route_burst=3)
+
+    statuses = [client.get("/limited", headers=signed_in(user_id)).status_code for user_id in range(5)]
+    assert statuses == [200, 200, 200, 503, 503]
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+import pytest
+from fastapi.testclient import TestClient
+import src.storage.revoked_tokens as revoked_tokens
+from src.core.security import create_access_token
+from src.main import app
+from src.storage.group_commit import group_committer
+from src.storage.revoked_tokens import RevokedTokens
+from test_concurrent_writes import make_users
+
+HOUR = 3600
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Time as seen by RevokedTokens, moved forward by the test."""
+    clock = SimpleNamespace(now=time.time())
+    monkeypatch.setattr(revoked_tokens, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def reopened(tokens: RevokedTokens) -> RevokedTokens:
+    group_committer.flush()
+    return RevokedTokens(tokens.path, tokens.capacity)
+
+
+def test_revoked_tokens_survive_a_restart_until_they_expire(tmp_path, clock):
+    tokens = RevokedTokens(str(tmp_path / "revoked.bin"), capacity=100)
+    short, long, never = uuid4().hex, uuid4().hex, uuid4().hex
+    tokens.revoke(short, int(clock.now) + HOUR)
+    tokens.revoke(long, int(clock.now) + 3 * HOUR)
+    tokens.revoke(never, int(clock.now) - 1)  # already expired
+
+    tokens = reopened(tokens)
+    assert [tokens.is_revoked(jti) for jti in (short, long, never)] == [True, True, False]
+
+    clock.now += 2 * HOUR
+    tokens = reopened(tokens)
+    assert [tokens.is_revoked(jti) for jti in (short, long)] == [False, True]
+    assert tokens.stats()["revoked"] == 1
+
+
+def test_expired_tokens_are_pruned_and_the_filter_rebuilt(tmp_path, clock):
+    tokens = RevokedTokens(str(tmp_path / "revoked.bin"), capacity=4, prune_interval=60)
+    revoked = [uuid4().hex for _ in range(50)]
+    for jti in revoked:
+        tokens.revoke(jti, int(clock.now) + 30)
+
+    # More keys than the filter was sized for: it grows rather than filling up
+    assert all(tokens.is_revoked(jti) for jti in revoked)
+    assert tokens.stats()["bloom_keys"] == 50
+    assert sum(tokens.is_revoked(uuid4().hex) for _ in range(1000)) == 0
+
+    clock.now += 60
+    assert not any(tokens.is_revoked(jti) for jti in revoked)
+    assert tokens.stats()["revoked"] == 0
+    assert tokens.stats()["bloom_keys"] == 0
+    assert reopened(tokens).stats()["revoked"] == 0
+
+
+def test_a_token_is_refused_after_logout():
+    client = TestClient(app)
+    user_id, = make_users(9100, 1)
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": str(user_id)})}
+    other = {"Authorization": "Bearer " + create_access_token({"sub": str(user_id)})}
+
+    assert client.get("/feed", headers=headers).status_code == 200
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get("/feed", headers=headers).status_code == 401
+    # Other sessions of the same user stay signed in
+    assert client.get("/feed", headers=other).status_code == 200
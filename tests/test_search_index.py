@@ -0,0 +1,93 @@
+import random
+from typing import Dict, List, Tuple
+import src.storage.search_index as search_index
+from src.storage.search_index import SearchIndex
+
+WORDS = [f"w{number}" for number in range(40)]
+QUERIES = ["w1 w2", "w3", "w10 w20 w30", "w39 w0"]
+
+
+class Documents:
+    """Documents of a search index, changed at random."""
+
+    def __init__(self, seed: int, count: int):
+        self.rng = random.Random(seed)
+        self.docs: Dict[int, Tuple[str, List[int]]] = {}
+        self.next_id = 0
+        for _ in range(count):
+            self.add()
+
+    def __call__(self):
+        return [(doc_id, text, category_ids) for doc_id, (text, category_ids) in self.docs.items()]
+
+    def random_doc(self) -> Tuple[str, List[int]]:
+        words = [self.rng.choice(WORDS) for _ in range(self.rng.randint(1, 8))]
+        return " ".join(words), [self.rng.randint(1, 4)]
+
+    def add(self, index: SearchIndex = None):
+        self.docs[self.next_id] = self.random_doc()
+        if index is not None:
+            index.add(self.next_id, *self.docs[self.next_id])
+        self.next_id += 1
+
+    def change(self, index: SearchIndex, count: int):
+        for _ in range(count):
+            roll = self.rng.random()
+            if roll < 0.4 or not self.docs:
+                self.add(index)
+            elif roll < 0.7:
+                doc_id = self.rng.choice(list(self.docs))
+                self.docs[doc_id] = self.random_doc()
+                index.add(doc_id, *self.docs[doc_id])
+            else:
+                doc_id = self.rng.choice(list(self.docs))
+                del self.docs[doc_id]
+                index.remove(doc_id)
+
+
+def assert_same_results(index: SearchIndex, documents: Documents, tmp_path):
+    """`index` answers every query like an index built from scratch over the current documents."""
+    fresh = SearchIndex(str(tmp_path / "fresh.dat"), documents)
+    for query in QUERIES:
+        for category_ids in (None, [2]):
+            found = index.search(query, 10 ** 6, 0, category_ids)
+            expected = fresh.search(query, 10 ** 6, 0, category_ids)
+            assert {doc_id: round(score, 9) for doc_id, score in found} == \
+                   {doc_id: round(score, 9) for doc_id, score in expected}
+    assert index.stats()["documents"] == len(documents.docs)
+
+
+def test_the_index_survives_saves_and_restarts(tmp_path):
+    path = str(tmp_path / "search.dat")
+    documents = Documents(seed=1, count=200)
+    index = SearchIndex(path, documents, save_interval=1e9)
+    index.load()
+
+    for _ in range(3):
+        documents.change(index, 50)
+        index.save()
+        documents.change(index, 20)  # left in the tail, then reconciled on load
+        index = SearchIndex(path, documents, save_interval=1e9)
+        assert_same_results(index, documents, tmp_path)
+
+
+def test_changes_made_while_the_segment_is_merged_are_kept(tmp_path, monkeypatch):
+    documents = Documents(seed=2, count=200)
+    index = SearchIndex(str(tmp_path / "search.dat"), documents, save_interval=1e9)
+    index.load()
+    documents.change(index, 50)
+
+    write = search_index.write_pickle_file
+
+    def write_while_changing(*args, **kwargs):
+        # Another request changes documents between the snapshot and the swap
+        documents.change(index, 30)
+        write(*args, **kwargs)
+
+    monkeypatch.setattr(search_index, "write_pickle_file", write_while_changing)
+    index.save()
+    assert_same_results(index, documents, tmp_path)
+
+    monkeypatch.setattr(search_index, "write_pickle_file", write)
+    index.save()
+    assert_same_results(SearchIndex(index.path, documents), documents, tmp_path)
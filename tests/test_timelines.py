@@ -0,0 +1,144 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+from src.storage.timelines import TimelineStore
+
+START = datetime(2024, 1, 1)
+
+
+class FakeNetwork:
+    """Follow graph and posts a TimelineStore reads from."""
+
+    def __init__(self):
+        self.following: Dict[int, Set[int]] = {}
+        self.posts: Dict[int, List[tuple]] = {}
+        self.next_post_id = 1
+        self.on_recent_posts = None
+
+    def followers(self, user_id: int) -> List[int]:
+        return sorted(user for user, followed in self.following.items() if user_id in followed)
+
+    def recent_posts(self, author_id: int, limit: int, before=None) -> List[tuple]:
+        if self.on_recent_posts is not None:
+            self.on_recent_posts()
+        entries = sorted((entry for entry in self.posts.get(author_id, []) if before is None or entry[:2] < before),
+                         reverse=True)
+        return entries[:limit]
+
+    def store(self, size: int = 5, fanout_limit: int = 100, max_users: int = 100, max_entries: int = 10000):
+        return TimelineStore(
+            size=size, fanout_limit=fanout_limit, max_users=max_users, max_entries=max_entries,
+            following=lambda user_id: sorted(self.following.get(user_id, ())),
+            followers=self.followers,
+            followers_count=lambda user_id: len(self.followers(user_id)),
+            recent_posts=self.recent_posts,
+        )
+
+    def post(self, author_id: int, timelines: TimelineStore = None) -> tuple:
+        entry = (START + timedelta(minutes=self.next_post_id), self.next_post_id, author_id)
+        self.next_post_id += 1
+        self.posts.setdefault(author_id, []).append(entry)
+        if timelines is not None:
+            timelines.add_post(author_id, entry[1], entry[0])
+        return entry
+
+    def follow(self, follower_id: int, following_id: int, timelines: TimelineStore = None):
+        self.following.setdefault(follower_id, set()).add(following_id)
+        if timelines is not None:
+            timelines.follow(follower_id, following_id)
+
+    def unfollow(self, follower_id: int, following_id: int, timelines: TimelineStore = None):
+        self.following[follower_id].discard(following_id)
+        if timelines is not None:
+            timelines.unfollow(follower_id, following_id)
+
+    def expected(self, user_id: int) -> List[tuple]:
+        authors = {user_id} | self.following.get(user_id, set())
+        return sorted((entry for author in authors for entry in self.posts.get(author, [])), reverse=True)
+
+
+def read_all(timelines: TimelineStore, user_id: int, limit: int) -> List[tuple]:
+    """Every page of the user's timeline, following the cursor from one page to the next."""
+    entries, before = [], None
+    while True:
+        page = timelines.read(user_id, limit, before)
+        entries += page
+        if len(page) < limit:
+            return entries
+        before = page[-1][:2]
+
+
+def test_pages_cover_the_timeline_past_its_precomputed_part():
+    network = FakeNetwork()
+    network.follow(1, 2)
+    network.follow(1, 3)
+    for author in (1, 2, 3, 4, 2, 3, 1, 2, 2, 4, 3, 1):
+        network.post(author)
+    timelines = network.store(size=5)
+
+    for limit in (1, 2, 3, 5, 7, 50):
+        assert read_all(timelines, 1, limit) == network.expected(1)
+
+
+def test_new_posts_follows_and_unfollows_update_cached_timelines():
+    network = FakeNetwork()
+    timelines = network.store(size=10)
+    network.follow(1, 2)
+    network.post(2)
+    assert timelines.read(1, 10) == network.expected(1)
+
+    network.post(2, timelines)
+    network.post(3, timelines)
+    network.follow(1, 3, timelines)
+    assert timelines.read(1, 10) == network.expected(1)
+    network.unfollow(1, 2, timelines)
+    assert timelines.read(1, 10) == network.expected(1)
+    assert timelines.stats()["builds"] == 1
+
+
+def test_celebrity_posts_are_merged_in_on_read():
+    network = FakeNetwork()
+    timelines = network.store(fanout_limit=2)
+    for follower in (1, 5, 6):
+        network.follow(follower, 9)
+    network.post(1, timelines)
+    network.post(9, timelines)
+    network.post(1, timelines)
+
+    assert timelines.read(1, 10) == network.expected(1)
+
+
+def test_changes_made_during_a_build_are_kept():
+    network = FakeNetwork()
+    network.follow(1, 2)
+    network.post(2)
+    timelines = network.store(size=10)
+    added = []
+
+    def post_while_building():
+        # Another request posts while the timeline is being built, without waiting for the build
+        network.on_recent_posts = None
+        writer = threading.Thread(target=lambda: added.append(network.post(2, timelines)))
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive()
+
+    network.on_recent_posts = post_while_building
+    timelines.read(1, 10)
+
+    assert added and added[0] in timelines.read(1, 10)
+    assert timelines.read(1, 10) == network.expected(1)
+    assert timelines.stats()["builds"] == 1
+
+
+def test_cached_entries_stay_within_the_bound():
+    network = FakeNetwork()
+    for author in range(1, 21):
+        for _ in range(5):
+            network.post(author)
+    timelines = network.store(size=5, max_entries=12)
+
+    for user_id in range(1, 21):
+        assert timelines.read(user_id, 5) == network.expected(user_id)
+        assert timelines.stats()["entries"] <= 12
+    assert timelines.stats()["timelines"] == 2